@@ -1,17 +1,54 @@
-from fastapi import FastAPI, status, Query, Request, Body, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, status, Query, Request, Body, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from src.classes.sql.common.database import Database
 from src.classes.sql.postgres import Postgres
-from src.classes.sql.common.SQLClasses import SchemaBody, SelectQuery, InsertQuery, UpdateQuery, DeleteQuery, ColumnsQuery, ExecQuery, DbConfig, FuncQuery
-from typing import Any, Annotated, List, Dict
-from src.functions import get_db_params
+from src.classes.sql.async_postgres import AsyncPostgres
+from src.classes.sql.engines import Engines
+from src.classes.sql.common.pool import PoolTimeoutError, pools
+from src.classes.sql.common.query_cache import query_cache
+from src.classes.sql.common.metadata_cache import MetadataKey, metadata_cache
+from src.classes.sql.common.result_cache import ResultCache, result_cache
+from src.classes.sql.common.single_flight import single_flight
+from src.classes.sql.common.batch import BatchError
+from src.classes.sql.common.slow_query import slow_queries
+from src.classes.sql.common.cancellation import Cancellation, QueryCancelledError
+from src.classes.sql.common.admission import AdmissionRejectedError, admission
+from src.classes.sql.common.jobs import Job, jobs
+from src.classes.sql.common.fanout import fanout
+from src.classes.sql.common.replicas import Session, replicas
+from src.classes.sql.common.transactions import TransactionSessionError, transactions
+from src.classes.sql.common.SQLClasses import SchemaBody, SelectQuery, FanoutQuery, InsertQuery, UpsertQuery, BatchQuery, BulkUpdateQuery, BulkDeleteQuery, BulkInsertQuery, UpdateQuery, DeleteQuery, ColumnsQuery, ExecQuery, DbConfig, EngineConfig, FuncQuery, MetadataInvalidation
+from typing import Any, Annotated, AsyncIterator, List, Dict
+from src.functions import get_db_params, get_engine_config, get_postgres_engine, get_response_format, get_bulk_insert_query
+from src.classes.formats import RowFormats
+from src.classes.metrics import TimedRoute, Timings, metrics
+from src.types.params import Format, SpoolFormat
+from src.classes.settings import settings
 from pydantic import BaseModel
 from pyodbc import Cursor
 from src.classes.sql.types import Row, Data
 
 # TODO: Cambiar la api para que funcione con la nueva libreria
 
-app: FastAPI = FastAPI()
+@asynccontextmanager
+async def Lifespan(app: FastAPI) -> AsyncIterator[None]:
+    
+    jobs.start()
+    pools.start()
+    
+    try:
+        yield
+    finally:
+        await jobs.close()
+        await transactions.close()
+        await pools.close_all()
+
+app: FastAPI = FastAPI(lifespan=Lifespan)
+app.router.route_class = TimedRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,96 +58,497 @@ app.add_middleware(
     allow_headers=['*']
 )
 
+@app.middleware('http')
+async def Timing(request: Request, call_next):
+    
+    if not settings.metrics.enabled:
+        return await call_next(request)
+    
+    timings = Timings.start()
+    response = await call_next(request)
+    
+    #? Phases still running while the body streams are only reflected in /metrics
+    response.headers['Server-Timing'] = timings.header()
+    
+    endpoint = getattr(request.scope.get('route'), 'path', 'unmatched')
+    body = response.body_iterator
+    
+    async def counted():
+        
+        sent = 0
+        
+        try:
+            async for chunk in body:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            metrics.record(endpoint, timings, response.status_code, sent)
+    
+    response.body_iterator = counted()
+    
+    return response
+
+@app.middleware('http')
+async def Sessions(request: Request, call_next):
+    
+    transactions.bind(request.headers.get(transactions.HEADER))
+    session = Session.start(request.headers.get(Session.HEADER))
+    response = await call_next(request)
+    
+    #? Clients send the token back so their next reads skip replicas that have not replayed the write yet
+    if session.wrote:
+        response.headers[Session.HEADER] = session.token()
+    
+    return response
+
+@app.exception_handler(PoolTimeoutError)
+def PoolTimeout(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={ "detail": str(exc) })
+
+@app.exception_handler(AdmissionRejectedError)
+def AdmissionRejected(request: Request, exc: AdmissionRejectedError):
+    
+    #? Shed requests are cheap to retry, the header tells clients to back off for a moment
+    return JSONResponse(status_code=exc.status, content={ "detail": str(exc) }, headers={ "Retry-After": "1" })
+
+@app.exception_handler(TransactionSessionError)
+def TransactionSessionFailed(request: Request, exc: TransactionSessionError):
+    return JSONResponse(status_code=exc.status, content={ "detail": str(exc) })
+
+@app.exception_handler(BatchError)
+def BatchFailed(request: Request, exc: BatchError):
+    
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={ "detail": str(exc), "index": exc.index, "results": jsonable_encoder(exc.results) }
+    )
+
+@app.exception_handler(QueryCancelledError)
+def QueryCancelled(request: Request, exc: QueryCancelledError):
+    
+    #? 499 is never read by a client that left, it only marks the request in logs and metrics
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT if exc.reason == 'timeout' else 499,
+        content={ "detail": str(exc) }
+    )
+
 #region GET
 
 @app.get("/")
 def Get():
     return { "Hello": "World" }
 
+@app.get('/metrics', response_class=PlainTextResponse)
+def Metrics() -> str:
+    return PlainTextResponse(metrics.render(pools.stats(), admission.stats()), media_type='text/plain; version=0.0.4')
+
+@app.get('/stats/pools')
+def PoolStats() -> List[Dict[str, Any]]:
+    return pools.stats()
+
+@app.get('/stats/admission')
+def AdmissionStats() -> List[Dict[str, Any]]:
+    return admission.stats()
+
+@app.get('/stats/replicas')
+def ReplicaStats() -> Dict[str, Any]:
+    return replicas.stats()
+
+@app.get('/stats/sessions')
+def TransactionStats() -> Dict[str, Any]:
+    return transactions.stats()
+
+@app.get('/stats/queries')
+def QueryStats() -> Dict[str, Any]:
+    return query_cache.stats()
+
+@app.get('/stats/metadata')
+def MetadataStats() -> Dict[str, Any]:
+    return metadata_cache.stats()
+
+@app.get('/stats/results')
+def ResultStats() -> Dict[str, Any]:
+    return result_cache.stats()
+
+@app.get('/stats/single-flight')
+def SingleFlightStats() -> Dict[str, Any]:
+    return single_flight.stats()
+
+@app.get('/stats/slow-queries')
+def SlowQueryStats() -> Dict[str, Any]:
+    return slow_queries.stats()
+
 @app.get('/execute/{command}')
-def Execute(command: str, params: DbConfig = Depends(get_db_params)):
+async def Execute(request: Request, command: str, config: EngineConfig = Depends(get_engine_config)):
+    
+    async with Engines.connect(config) as db:
+    
+        answer = await Cancellation.run(db.fetch(command), db.cancel, db.timeout, request.is_disconnected)
     
-    db = Postgres(config=params)
+    if command.lstrip().split(' ', 1)[0].lower() != 'select':
+        Session.write()
+        result_cache.invalidate(result_cache.identity(config.info))
     
-    answer = db.fetch(command)
+    #? Schema changes through raw commands drop the cached metadata of the database
+    if command.lstrip().split(' ', 1)[0].lower() in ('create', 'alter', 'drop', 'comment', 'truncate'):
+        metadata_cache.invalidate(metadata_cache.identity(config.info))
     
     return answer
 
 @app.post('/tables')
-def Tables(schema: SchemaBody = Body(..., description='Tables Schema'), params: DbConfig = Depends(get_db_params)) -> List[Row]:
-    db = Postgres(config=params)
-
-    return db.tables(schema)
+async def Tables(request: Request, schema: SchemaBody = Body(..., description='Tables Schema'), config: EngineConfig = Depends(get_engine_config)) -> List[Row]:
+    
+    async def load():
+        async with Engines.connect(await Engines.route(config), priority='high') as db:
+            return await db.tables(schema)
+    
+    entry = await metadata_cache.load(
+        MetadataKey(metadata_cache.identity(config.info), 'tables', schema.sql_schema),
+        load
+    )
+    
+    return metadata_cache.respond(request, entry)
 
 #region POST
 
 @app.post('/columns')
-def ColumnsBody(
+async def ColumnsBody(
+    request: Request,
     query: ColumnsQuery = Body(...),
-    params: DbConfig = Depends(get_db_params)
+    config: EngineConfig = Depends(get_engine_config)
 ) -> List[str] | List[Dict[str, str]]:
     
-    db = Postgres(config=params)
+    async def load():
+        async with Engines.connect(await Engines.route(config), priority='high') as db:
+            return await db.columns(query)
     
-    answer = db.columns(query)
+    entry = await metadata_cache.load(
+        MetadataKey(
+            metadata_cache.identity(config.info),
+            'columns',
+            query.table.sql_schema,
+            query.table.name,
+            query.model_dump_json()
+        ),
+        load
+    )
     
-    return answer
+    return metadata_cache.respond(request, entry)
+
+@app.post('/schema')
+async def Schema(request: Request, schema: SchemaBody = Body(SchemaBody(), description='Schema to describe'), config: EngineConfig = Depends(get_engine_config)) -> Dict[str, Any]:
+    
+    async def load():
+        async with Engines.connect(await Engines.route(config), priority='high') as db:
+            return await db.schema(schema)
+    
+    entry = await metadata_cache.load(
+        MetadataKey(metadata_cache.identity(config.info), 'schema', schema.sql_schema),
+        load
+    )
+    
+    return metadata_cache.respond(request, entry)
+
+@app.post('/metadata/invalidate')
+def InvalidateMetadata(
+    query: MetadataInvalidation = Body(MetadataInvalidation()),
+    params: DbConfig = Depends(get_db_params)
+) -> Dict[str, int]:
+    
+    return { "invalidated": metadata_cache.invalidate(metadata_cache.identity(params), query.sql_schema, query.table) }
+
+async def StreamSelect(query: SelectQuery, config: EngineConfig, batch_size: int):
+    
+    async with Engines.connect(await Engines.route(config), priority='low') as db:
+        
+        async for batch in db.stream(query, batch_size):
+            yield batch
 
 @app.post('/select')
-def BodySelect(
+async def BodySelect(
+    request: Request,
     query: SelectQuery = Body(...),
-    params: DbConfig = Depends(get_db_params)
+    config: EngineConfig = Depends(get_engine_config),
+    response_format: Format = Depends(get_response_format),
+    batch_size: int = Query(settings.stream.batch_size, gt=0, description='Rows fetched per batch when streaming'),
+    cache_ttl: float = Query(0, ge=0, description='Seconds the json answer may be served from the result cache')
 ) -> Data:
     
-    db = Postgres(config=params)
+    if response_format in RowFormats.STREAM_FORMATS:
+        return StreamingResponse(
+            RowFormats.encode(response_format, StreamSelect(query, config, batch_size)),
+            media_type=RowFormats.MEDIA_TYPES[response_format]
+        )
     
-    answer = db.select(query)
+    #? Inside a transaction session the answer may hold uncommitted rows, it is neither cached nor shared
+    #? A session that wrote must see its write, an answer cached or shared with other readers may predate it
+    session = Session.current()
+    pinned = transactions.bound() is not None or (session is not None and session.written is not None)
+    cache_ttl = 0 if pinned else cache_ttl
     
-    return answer
+    key = ResultCache.key(config.info, query, response_format, config.engine)
+    payload = result_cache.get(key) if cache_ttl else None
+    
+    async def load() -> bytes:
+        
+        tables = ResultCache.tables_of(query)
+        generation = result_cache.generation(key.identity, tables)
+        
+        async with Engines.connect(await Engines.route(config)) as db:
+            
+            abandoned = lambda: single_flight.abandoned(key)
+            
+            if response_format == 'json':
+                rows = await Cancellation.run(db.select(query), db.cancel, db.timeout, abandoned)
+            else:
+                columns, rows = await Cancellation.run(db.select_rows(query), db.cancel, db.timeout, abandoned)
+        
+        with Timings.phase('encode'):
+            
+            #? Keyset pages carry the token of the next page next to the rows
+            if response_format == 'json':
+                payload = RowFormats.json_bytes({ "rows": rows, "next": query.seek.next_token(rows) } if query.seek else rows)
+            elif query.seek:
+                payload = RowFormats.dump(response_format, columns, rows, next=query.seek.next_token(rows, columns))
+            else:
+                payload = RowFormats.dump(response_format, columns, rows)
+        
+        if cache_ttl:
+            result_cache.set(key, payload, cache_ttl, tables, generation)
+        
+        return payload
+    
+    if payload is None:
+        
+        #? Identical selects arriving together share one connection and one execution
+        payload = await load() if pinned else await single_flight.run(key, load, request.is_disconnected)
+    
+    return Response(payload, media_type=RowFormats.MEDIA_TYPES[response_format])
+
+@app.post('/fanout/select', dependencies=[Depends(get_postgres_engine)])
+async def FanoutSelect(
+    query: FanoutQuery = Body(...),
+    batch_size: int = Query(settings.stream.batch_size, gt=0, description='Rows fetched per batch from each target')
+) -> StreamingResponse:
+    
+    #? Rows arrive as each target produces them, tagged with their source and followed by one summary line per target
+    return StreamingResponse(fanout.run(query, batch_size), media_type=RowFormats.MEDIA_TYPES['ndjson'])
+
+def InvalidateResults(params: DbConfig, query: Any = None) -> None:
+    
+    Session.write()
+    
+    #? Writes without a known target table may touch anything in the database
+    result_cache.invalidate(
+        result_cache.identity(params),
+        ResultCache.table_name(query.table) if query is not None else None
+    )
+
+#region Transaction sessions
+
+@app.post('/session/begin', dependencies=[Depends(get_postgres_engine)])
+async def BeginSession(params: DbConfig = Depends(get_db_params)) -> Dict[str, Any]:
+    
+    #? The pinned connection skips replicas and the caller's own session header
+    session = await transactions.begin(params, AsyncPostgres(config=params, pinned=False))
+    
+    return session.describe(transactions.settings.idle_timeout)
+
+@app.post('/session/{session_id}/commit')
+async def CommitSession(session_id: str) -> Dict[str, Any]:
+    
+    session = await transactions.end(session_id, commit=True)
+    
+    #? Reads outside the session may have cached the rows it just replaced
+    Session.write()
+    result_cache.invalidate(result_cache.identity(session.config))
+    
+    return { "id": session.id, "state": "committed" }
+
+@app.post('/session/{session_id}/rollback')
+async def RollbackSession(session_id: str) -> Dict[str, Any]:
+    
+    session = await transactions.end(session_id, commit=False)
+    
+    return { "id": session.id, "state": "rolled back" }
+
+#region Jobs
+
+def FindJob(job_id: str, params: DbConfig) -> Job:
+    
+    job = jobs.get(job_id, Job.identity(params))
+    
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, 'Job not found or expired')
+    
+    return job
+
+@app.post('/jobs', status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(get_postgres_engine)])
+async def SubmitJob(
+    query: SelectQuery = Body(...),
+    params: DbConfig = Depends(get_db_params),
+    spool_format: SpoolFormat = Query('ndjson', alias='format', description='Format of the spooled result')
+) -> Dict[str, Any]:
+    
+    if not RowFormats.available(spool_format):
+        raise HTTPException(status.HTTP_406_NOT_ACCEPTABLE, f'{spool_format} results need pyarrow installed')
+    
+    return jobs.submit(query, params, spool_format).describe()
+
+@app.get('/jobs')
+def ListJobs(params: DbConfig = Depends(get_db_params)) -> List[Dict[str, Any]]:
+    return jobs.describe(Job.identity(params))
+
+@app.get('/jobs/{job_id}')
+def JobStatus(job_id: str, params: DbConfig = Depends(get_db_params)) -> Dict[str, Any]:
+    return FindJob(job_id, params).describe()
+
+@app.get('/jobs/{job_id}/result')
+def JobResult(job_id: str, params: DbConfig = Depends(get_db_params)) -> FileResponse:
+    
+    job = FindJob(job_id, params)
+    
+    if job.state != 'done':
+        raise HTTPException(status.HTTP_409_CONFLICT, f'Job is {job.state}')
+    
+    #? Range requests resume or split the download, servers with pathsend send the file zero-copy
+    return FileResponse(job.path, media_type=job.media_type, filename=f'{job.id}.{job.format}')
+
+@app.delete('/jobs/{job_id}')
+async def CancelJob(job_id: str, params: DbConfig = Depends(get_db_params)) -> Dict[str, Any]:
+    
+    job = await jobs.cancel(job_id, Job.identity(params))
+    
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, 'Job not found or expired')
+    
+    return job.describe()
+
+@app.post('/explain')
+async def Explain(query: SelectQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> Any:
+    
+    async with Engines.connect(config) as db:
+        return await db.explain(query)
 
 @app.post('/insert')
-def BodyInsert(query: InsertQuery = Body(...), params: DbConfig = Depends(get_db_params)) -> List[Row]:
+async def BodyInsert(query: InsertQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> List[Row]:
     
-    db = Postgres(config=params)
+    async with Engines.connect(config) as db:
     
-    answer = db.insert(query)
+        answer = await db.insert(query)
+    
+    InvalidateResults(config.info, query)
+    
+    return answer
+
+@app.post('/upsert')
+async def BodyUpsert(query: UpsertQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> List[Row]:
+    
+    async with Engines.connect(config) as db:
+    
+        answer = await db.upsert(query)
+    
+    InvalidateResults(config.info, query)
     
     return answer
 
+@app.post('/bulk-insert')
+async def BulkInsert(
+    request: Request,
+    query: BulkInsertQuery = Depends(get_bulk_insert_query),
+    config: EngineConfig = Depends(get_engine_config)
+) -> Dict[str, int]:
+    
+    async with Engines.connect(config, priority='low') as db:
+    
+        loaded = await db.bulk_insert(query, request.stream())
+    
+    InvalidateResults(config.info, query)
+    
+    return { "rows": loaded }
+
 @app.post('/call')
-def ExecClass(query: ExecQuery = Body(...), params: DbConfig = Depends(get_db_params)):
+async def ExecClass(query: ExecQuery = Body(...), config: EngineConfig = Depends(get_engine_config)):
     
-    db = Postgres(config=params)
+    async with Engines.connect(config) as db:
     
-    db.call(query)
+        await db.call(query)
+    
+    InvalidateResults(config.info)
 
 @app.post('/perform')
-def Perform(query: FuncQuery = Body(...), params: DbConfig = Depends(get_db_params)) -> List[Row]:
+async def Perform(query: FuncQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> List[Row]:
+    
+    async with Engines.connect(config) as db:
     
-    db = Postgres(config=params)
+        answer = await db.perform(query)
     
-    answer = db.perform(query)
+    InvalidateResults(config.info)
     
     return answer
 
+@app.post('/batch')
+async def BodyBatch(query: BatchQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> List[Any]:
+    
+    try:
+        async with Engines.connect(config) as db:
+            results = await db.batch(query)
+    finally:
+        
+        #? Items may have committed before a failure when the batch is not transactional
+        for item in query.items:
+            
+            if item.kind in ('insert', 'update', 'delete'):
+                InvalidateResults(config.info, item.query)
+            elif item.kind in ('call', 'perform'):
+                InvalidateResults(config.info)
+    
+    return Response(RowFormats.json_bytes(results), media_type=RowFormats.MEDIA_TYPES['json'])
+
 #region PUT
 
 @app.put('/update')
-def Update(query: UpdateQuery = Body(...), params: DbConfig = Depends(get_db_params)) -> List[Row]:
+async def Update(query: UpdateQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> List[Row]:
     
-    db = Postgres(config=params)
+    async with Engines.connect(config) as db:
     
-    answer = db.update(query)
+        answer = await db.update(query)
+    
+    InvalidateResults(config.info, query)
     
     return answer
 
+@app.put('/bulk-update')
+async def BulkUpdate(query: BulkUpdateQuery = Body(...), config: EngineConfig = Depends(get_engine_config)) -> Dict[str, int]:
+    
+    async with Engines.connect(config, priority='low') as db:
+    
+        affected = await db.bulk_update(query)
+    
+    InvalidateResults(config.info, query)
+    
+    return { "rows": affected }
+
 #region DELETE
 
 @app.delete('/delete')
-def Delete(query: DeleteQuery, params: DbConfig = Depends(get_db_params)) -> List[Row]:
+async def Delete(query: DeleteQuery, config: EngineConfig = Depends(get_engine_config)) -> List[Row]:
+    
+    async with Engines.connect(config) as db:
+    
+        answer = await db.delete(query)
+    
+    InvalidateResults(config.info, query)
+    
+    return answer
+
+@app.delete('/bulk-delete')
+async def BulkDelete(query: BulkDeleteQuery, config: EngineConfig = Depends(get_engine_config)) -> Dict[str, int]:
+    
+    async with Engines.connect(config, priority='low') as db:
     
-    db = Postgres(config=params)
+        affected = await db.bulk_delete(query)
     
-    answer = db.delete(query)
+    InvalidateResults(config.info, query)
     
-    return answer
\ No newline at end of file
+    return { "rows": affected }
\ No newline at end of file
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+from src.classes.sql.common.SQLClasses import DbConfig
+from benchmarks.runner import Baseline, Results
+
+SUITES = ('compile', 'serialize', 'endpoints')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks SQL compilation, row serialization and endpoint throughput')
+
+    parser.add_argument('suites', nargs='*', choices=SUITES, default=list(SUITES), help='Suites to run, all by default')
+    parser.add_argument('--output', default=os.path.join(HERE, 'results.json'), help='Where the results of this run are written')
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline.json'), help='Results compared against when the file exists')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Relative slowdown of the median reported as a regression')
+
+    serialize = parser.add_argument_group('serialize')
+    serialize.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000, 1_000_000], help='Result sizes')
+    serialize.add_argument('--widths', type=int, nargs='+', default=[4, 16], help='Columns per row')
+    serialize.add_argument('--max-cells', type=int, default=4_000_000, help='Skips sizes whose rows times columns exceed this')
+
+    endpoints = parser.add_argument_group('endpoints', 'Runs against a throwaway table on the given Postgres, or a stubbed driver without --server')
+    endpoints.add_argument('--server', default=os.environ.get('PYSQL_BENCH_SERVER'))
+    endpoints.add_argument('--database', default=os.environ.get('PYSQL_BENCH_DATABASE', 'postgres'))
+    endpoints.add_argument('--uid', default=os.environ.get('PYSQL_BENCH_UID', 'postgres'))
+    endpoints.add_argument('--pwd', default=os.environ.get('PYSQL_BENCH_PWD', ''))
+    endpoints.add_argument('--encrypt', default=os.environ.get('PYSQL_BENCH_ENCRYPT', 'disable'))
+    endpoints.add_argument('--requests', type=int, default=500, help='Requests per endpoint')
+    endpoints.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+    endpoints.add_argument('--seed-rows', type=int, default=10_000, help='Rows loaded into the benchmark table')
+    endpoints.add_argument('--stub-rows', type=int, default=100, help='Rows every stubbed select answers')
+
+    return parser.parse_args()
+
+def main() -> int:
+
+    args = arguments()
+    results = Results()
+
+    if 'compile' in args.suites:
+
+        from benchmarks.compilation import Compilation
+
+        Compilation.run(results)
+
+    if 'serialize' in args.suites:
+
+        from benchmarks.serialization import Serialization
+
+        Serialization.run(results, args.rows, args.widths, args.max_cells)
+
+    if 'endpoints' in args.suites:
+
+        from benchmarks.endpoints import Endpoints
+
+        stub = args.server is None
+        config = DbConfig(server=args.server or 'stub', database=args.database, uid=args.uid, pwd=args.pwd, encrypt=args.encrypt)
+
+        Endpoints(config, stub, args.requests, args.concurrency, args.stub_rows).run(results, args.seed_rows)
+
+    results.save(args.output)
+    print(f'\nResults written to {args.output}')
+
+    baseline = Baseline.load(args.baseline)
+    regressions = Baseline.compare(baseline, results, args.threshold) if baseline is not None else []
+
+    if args.save_baseline:
+        results.save(args.baseline)
+        print(f'Baseline written to {args.baseline}')
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
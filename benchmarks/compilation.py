@@ -0,0 +1,78 @@
+from typing import Any, Dict
+from src.classes.sql.common.SQLClasses import InsertQuery, SelectQuery
+from src.classes.sql.common.compiler import compilers
+from src.classes.sql.common.keyset import Keyset
+from src.classes.sql.common.query_cache import QueryShape
+from benchmarks.runner import Bench, Results
+
+def where(column: str, value: Any, comparation: str = '=', joiner: str = '') -> Dict[str, Any]:
+    return { "to_column": { "name": column }, "comparation": comparation, "value": value, "joiner": joiner }
+
+#? Request bodies as clients send them, from a plain filter to joins, grouping and keyset pages
+SHAPES: Dict[str, Dict[str, Any]] = {
+    "simple": {
+        "table": { "name": "orders" },
+        "columns": [{ "name": "id" }, { "name": "customer_id" }, { "name": "total" }],
+        "where": [where('status', 'open')]
+    },
+    "joins": {
+        "table": { "name": "orders", "subname": "o" },
+        "join": [
+            {
+                "table": { "name": "customers", "subname": "c" },
+                "on": { "table_column": { "name": "id" }, "other_table": { "name": "o" }, "other_table_column": { "name": "customer_id" } }
+            },
+            {
+                "table": { "name": "regions", "subname": "r" },
+                "type": "left",
+                "on": { "table_column": { "name": "id" }, "other_table": { "name": "c" }, "other_table_column": { "name": "region_id" } }
+            }
+        ],
+        "columns": [{ "name": "o.id" }, { "name": "c.name", "rename": "customer" }, { "name": "r.name", "rename": "region" }, { "name": "o.total" }],
+        "where": [where('o.status', 'open', joiner='and'), where('o.total', 100, '>', 'and'), where('r.code', 'EU')],
+        "order_by": { "columns": [{ "name": "o.created" }], "desc": True },
+        "offset": { "min_row": 200, "max_row": 50 }
+    },
+    "grouped": {
+        "table": { "name": "orders" },
+        "columns": [{ "name": "customer_id" }, { "name": "status" }, { "name": "count(*)", "rename": "orders" }, { "name": "sum(total)", "rename": "total" }],
+        "where": [where('created', '2024-01-01', '>=')],
+        "group_by": { "columns": [{ "name": "customer_id" }, { "name": "status" }] },
+        "having": [where('count(*)', 5, '>')],
+        "order_by": { "columns": [{ "name": "customer_id" }] }
+    },
+    "seek": {
+        "table": { "name": "orders" },
+        "columns": [{ "name": "created" }, { "name": "id" }, { "name": "total" }],
+        "where": [where('status', 'open')],
+        "seek": { "columns": [{ "name": "created" }, { "name": "id" }], "size": 100, "after": Keyset.encode(['2024-03-01', 4512]) }
+    }
+}
+
+class Compilation():
+
+    @staticmethod
+    def run(results: Results) -> None:
+
+        for shape, body in SHAPES.items():
+
+            query = SelectQuery.model_validate(body)
+
+            #? Parsing and shape keys run on every request, before any compiled text is reused
+            results.add(f'compile.{shape}.validate', **Bench.measure(lambda: SelectQuery.model_validate(body)).describe())
+            results.add(f'compile.{shape}.shape', **Bench.measure(lambda: QueryShape.select(query)).describe())
+
+            for engine, compiler in compilers.items():
+                results.add(f'compile.{shape}.{engine}.build', **Bench.measure(lambda: compiler._build_select(query)).describe())
+                results.add(f'compile.{shape}.{engine}.cached', **Bench.measure(lambda: compiler.select(query)).describe())
+
+        insert = InsertQuery.model_validate({
+            "table": { "name": "orders" },
+            "columns": ["customer_id", "status", "total"],
+            "values": [[i, 'open', i * 1.5] for i in range(100)],
+            "output": [{ "name": "id" }]
+        })
+
+        for engine, compiler in compilers.items():
+            results.add(f'compile.insert100.{engine}.build', **Bench.measure(lambda: compiler._build_insert(insert)).describe())
+            results.add(f'compile.insert100.{engine}.cached', **Bench.measure(lambda: compiler.insert(insert)).describe())
@@ -0,0 +1,159 @@
+import asyncio
+import httpx
+from psycopg import Connection, connect
+from time import perf_counter
+from typing import Any, Dict, List, NamedTuple
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.common.pool import pools
+from benchmarks.runner import Bench, Results
+from benchmarks.serialization import Serialization
+from benchmarks.stub import Stub
+
+TABLE: str = 'pysql_bench'
+
+class Scenario(NamedTuple):
+
+    name: str
+    method: str
+    path: str
+    body: Any = None
+    params: Dict[str, Any] = {}
+    database: bool = False #? Needs a real server, stubbed runs skip it
+
+COLUMNS = [{ "name": "id" }, { "name": "name" }, { "name": "qty" }, { "name": "created" }]
+
+SCENARIOS: List[Scenario] = [
+    Scenario('select.json', 'POST', '/select', { "table": { "name": TABLE }, "columns": COLUMNS, "where": [{ "to_column": { "name": "qty" }, "value": 7 }], "offset": { "min_row": 0, "max_row": 100 } }),
+    Scenario('select.compact', 'POST', '/select', { "table": { "name": TABLE }, "columns": COLUMNS, "offset": { "min_row": 0, "max_row": 1000 } }, { "format": "compact" }),
+    Scenario('select.cached', 'POST', '/select', { "table": { "name": TABLE }, "columns": COLUMNS, "offset": { "min_row": 0, "max_row": 100 } }, { "cache_ttl": 60 }),
+    Scenario('select.seek', 'POST', '/select', { "table": { "name": TABLE }, "columns": COLUMNS, "seek": { "columns": [{ "name": "id" }], "size": 100 } }),
+    Scenario('select.grouped', 'POST', '/select', { "table": { "name": TABLE }, "columns": [{ "name": "qty" }, { "name": "count(*)", "rename": "n" }], "group_by": { "columns": [{ "name": "qty" }] }, "order_by": { "columns": [{ "name": "qty" }] } }),
+    Scenario('select.ndjson', 'POST', '/select', { "table": { "name": TABLE }, "columns": COLUMNS, "offset": { "min_row": 0, "max_row": 1000 } }, { "format": "ndjson" }),
+    Scenario('select.csv', 'POST', '/select', { "table": { "name": TABLE }, "columns": COLUMNS, "offset": { "min_row": 0, "max_row": 1000 } }, { "format": "csv" }),
+    Scenario('explain', 'POST', '/explain', { "table": { "name": TABLE }, "where": [{ "to_column": { "name": "id" }, "value": 1 }] }),
+    Scenario('tables', 'POST', '/tables', { "sql_schema": "public" }),
+    Scenario('columns', 'POST', '/columns', { "table": { "name": TABLE } }),
+    Scenario('schema', 'POST', '/schema', { "sql_schema": "public" }),
+    Scenario('execute', 'GET', '/execute/select 1'),
+    Scenario('insert', 'POST', '/insert', { "table": { "name": TABLE }, "columns": ["name", "qty", "created"], "values": [["bench", 1, "2024-01-01"]], "output": [{ "name": "id" }] }),
+    Scenario('upsert', 'POST', '/upsert', { "table": { "name": TABLE }, "columns": ["id", "name", "qty", "created"], "values": [[1, "bench", 1, "2024-01-01"]], "conflict": ["id"] }),
+    Scenario('update', 'PUT', '/update', { "table": { "name": TABLE }, "column_values": { "qty": 3 }, "where": [{ "to_column": { "name": "id" }, "value": 2 }] }),
+    Scenario('delete', 'DELETE', '/delete', { "table": { "name": TABLE }, "conditions": [{ "to_column": { "name": "id" }, "value": -1 }] }),
+    Scenario('batch', 'POST', '/batch', { "items": [
+        { "kind": "select", "query": { "table": { "name": TABLE }, "columns": COLUMNS, "where": [{ "to_column": { "name": "id" }, "value": 3 }] } },
+        { "kind": "update", "query": { "table": { "name": TABLE }, "column_values": { "qty": 4 }, "where": [{ "to_column": { "name": "id" }, "value": 3 }] } }
+    ] }),
+    Scenario('bulk-insert', 'POST', '/bulk-insert', 'bench,1,2024-01-01\n' * 100, { "table": TABLE, "columns": ["name", "qty", "created"], "header": False }, database=True)
+]
+
+class Endpoints():
+
+    def __init__(self, config: DbConfig, stub: bool, requests: int, concurrency: int, stub_rows: int):
+
+        self.config = config
+        self.stub = stub
+        self.requests = requests
+        self.concurrency = concurrency
+        self.stub_rows = stub_rows
+
+    def _connect(self) -> Connection:
+        return connect(host=self.config.server, dbname=self.config.database, user=self.config.uid, password=self.config.pwd, sslmode=self.config.encrypt, autocommit=True)
+
+    def _seed(self, rows: int) -> None:
+
+        #? The table is rebuilt on every run, so each run reads and writes the same data
+        with self._connect() as connection:
+
+            connection.execute(f'DROP TABLE IF EXISTS {TABLE}')
+            connection.execute(f'CREATE TABLE {TABLE} (id serial PRIMARY KEY, name text, qty int, created date)')
+            connection.execute(
+                f"INSERT INTO {TABLE} (name, qty, created) SELECT 'name-' || g, g %% 100, date '2024-01-01' + g %% 365 FROM generate_series(1, %s) g",
+                (rows,)
+            )
+            connection.execute(f'ANALYZE {TABLE}')
+
+    def _drop(self) -> None:
+
+        with self._connect() as connection:
+            connection.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    async def _request(self, client: httpx.AsyncClient, scenario: Scenario) -> int:
+
+        params = { **self.config.model_dump(exclude_none=True), **scenario.params }
+
+        if isinstance(scenario.body, str):
+            response = await client.request(scenario.method, scenario.path, params=params, content=scenario.body, headers={ "content-type": "text/csv" })
+        else:
+            response = await client.request(scenario.method, scenario.path, params=params, json=scenario.body)
+
+        return response.status_code
+
+    async def _load(self, client: httpx.AsyncClient, scenario: Scenario) -> Dict[str, Any]:
+
+        latencies: List[float] = []
+        errors: List[int] = []
+        remaining = iter(range(self.requests))
+
+        async def worker() -> None:
+
+            for _ in remaining:
+
+                started = perf_counter()
+                status = await self._request(client, scenario)
+
+                latencies.append(perf_counter() - started)
+
+                if status >= 400:
+                    errors.append(status)
+
+        #? A few requests first, so pools, caches and compiled statements are warm like in production
+        for _ in range(min(10, self.requests)):
+            await self._request(client, scenario)
+
+        started = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        elapsed = perf_counter() - started
+
+        return {
+            "median": Bench.percentile(latencies, 0.5),
+            "best": min(latencies),
+            "p95": Bench.percentile(latencies, 0.95),
+            "p99": Bench.percentile(latencies, 0.99),
+            "runs": len(latencies),
+            "loops": 1,
+            "throughput": round(len(latencies) / elapsed, 1),
+            "errors": len(errors),
+            **({ "status": sorted(set(errors)) } if errors else {})
+        }
+
+    async def _run(self, results: Results) -> None:
+
+        from app import app
+
+        mode = 'stub' if self.stub else 'postgres'
+
+        #? In-process ASGI calls skip the network, what is measured is the service itself
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url='http://bench', timeout=None) as client:
+
+            for scenario in SCENARIOS:
+
+                if scenario.database and self.stub:
+                    continue
+
+                results.add(f'endpoint.{mode}.{scenario.name}', **await self._load(client, scenario))
+
+        await pools.close_all()
+
+    def run(self, results: Results, seed_rows: int) -> None:
+
+        if self.stub:
+            _, rows = Serialization.rows(self.stub_rows, 4)
+            Stub.install(self.config, ['id', 'name', 'qty', 'created'], rows)
+
+            return asyncio.run(self._run(results))
+
+        try:
+            self._seed(seed_rows)
+            asyncio.run(self._run(results))
+        finally:
+            self._drop()
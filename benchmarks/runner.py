@@ -0,0 +1,154 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+class Stats(NamedTuple):
+
+    median: float #? Seconds per operation, the figure compared against the baseline
+    best: float
+    p95: float
+    runs: int
+    loops: int
+
+    def describe(self) -> Dict[str, Any]:
+        return { "median": self.median, "best": self.best, "p95": self.p95, "runs": self.runs, "loops": self.loops }
+
+class Bench():
+
+    @staticmethod
+    def percentile(samples: List[float], fraction: float) -> float:
+
+        ordered = sorted(samples)
+
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    @staticmethod
+    def _loops(work: Callable[[], Any], min_sample: float) -> int:
+
+        loops = 1
+
+        #? Fast operations run in batches so timer resolution does not dominate a sample
+        while True:
+
+            started = perf_counter()
+
+            for _ in range(loops):
+                work()
+
+            if perf_counter() - started >= min_sample or loops >= 1_000_000:
+                return loops
+
+            loops *= 10
+
+    @staticmethod
+    def measure(work: Callable[[], Any], repeat: int = 7, min_sample: float = 0.01) -> Stats:
+
+        loops = Bench._loops(work, min_sample)
+        samples: List[float] = []
+
+        for _ in range(repeat):
+
+            started = perf_counter()
+
+            for _ in range(loops):
+                work()
+
+            samples.append((perf_counter() - started) / loops)
+
+        return Stats(statistics.median(samples), min(samples), Bench.percentile(samples, 0.95), repeat, loops)
+
+class Results():
+
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, name: str, **values: Any) -> None:
+
+        self.entries[name] = values
+
+        extra = ', '.join(
+            f"{key}={Baseline.human(value) if key == 'p99' else value}"
+            for key, value in values.items() if key not in ('median', 'best', 'p95', 'runs', 'loops')
+        )
+
+        print(f"{name:<56} {Baseline.human(values['median']):>10}  p95 {Baseline.human(values['p95']):>10}{f'  {extra}' if extra else ''}", flush=True)
+
+    @staticmethod
+    def _commit() -> Optional[str]:
+
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except Exception:
+            return None
+
+    def document(self) -> Dict[str, Any]:
+
+        return {
+            "meta": {
+                "created": time(),
+                "commit": self._commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count()
+            },
+            "results": self.entries
+        }
+
+    def save(self, path: str) -> None:
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        with open(path, 'w') as output:
+            json.dump(self.document(), output, indent=2, sort_keys=True)
+
+class Baseline():
+
+    @staticmethod
+    def human(seconds: float) -> str:
+
+        for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+
+            if seconds >= scale:
+                return f'{seconds / scale:.3f}{unit}'
+
+        return f'{seconds / 1e-9:.1f}ns'
+
+    @staticmethod
+    def load(path: str) -> Optional[Dict[str, Any]]:
+
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as source:
+            return json.load(source)
+
+    @staticmethod
+    def compare(baseline: Dict[str, Any], results: Results, threshold: float) -> List[str]:
+
+        regressions: List[str] = []
+        previous = baseline.get('results', {})
+
+        print(f"\nAgainst baseline {baseline.get('meta', {}).get('commit') or '(unknown commit)'}, threshold {threshold:.0%}")
+
+        for name, values in results.entries.items():
+
+            before = previous.get(name)
+
+            #? Entries missing on either side are new or retired benchmarks, not regressions
+            if before is None or not before.get('median'):
+                continue
+
+            ratio = values['median'] / before['median']
+            verdict = 'REGRESSION' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else ''
+
+            print(f'{name:<56} {Baseline.human(before["median"]):>10} -> {Baseline.human(values["median"]):>10}  {ratio - 1:+7.1%}  {verdict}')
+
+            if verdict == 'REGRESSION':
+                regressions.append(name)
+
+        return regressions
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, List, Tuple
+from src.classes.formats import RowFormats
+from src.classes.sql.async_postgres import AsyncPostgres
+from src.classes.sql.types import Row
+from src.classes.settings import settings
+from benchmarks.runner import Bench, Results
+from benchmarks.stub import StubCursor
+
+#? Column kinds cycle with the width, so wider rows mix every type the encoders special-case
+KINDS: List[Callable[[int], Any]] = [
+    lambda i: i,
+    lambda i: f'name-{i}',
+    lambda i: i * 0.25,
+    lambda i: date(2024, 1, 1) + timedelta(days=i % 365),
+    lambda i: None if i % 3 else f'note {i}',
+    lambda i: bool(i % 2),
+    lambda i: Decimal(i) / 100,
+    lambda i: datetime(2024, 1, 1) + timedelta(seconds=i)
+]
+
+DISTINCT: int = 1000 #? Values repeat every this many rows, keeping a million-row result affordable in memory
+
+class Serialization():
+
+    @staticmethod
+    def rows(count: int, width: int) -> Tuple[List[str], List[Row]]:
+
+        columns = [f'c{column}' for column in range(width)]
+        values = [[KINDS[column % len(KINDS)](i) for i in range(DISTINCT)] for column in range(width)]
+
+        samples = list(zip(*values))
+
+        return columns, [samples[i % DISTINCT] for i in range(count)]
+
+    @staticmethod
+    async def _batches(columns: List[str], rows: List[Row]) -> AsyncIterator[Tuple[List[str], List[Row]]]:
+
+        size = settings.stream.batch_size
+
+        for start in range(0, max(len(rows), 1), size):
+            yield columns, rows[start:start + size]
+
+    @staticmethod
+    async def _stream(response_format: str, columns: List[str], rows: List[Row]) -> int:
+
+        sent = 0
+
+        async for chunk in RowFormats.encode(response_format, Serialization._batches(columns, rows)):
+            sent += len(chunk)
+
+        return sent
+
+    @staticmethod
+    def run(results: Results, counts: List[int], widths: List[int], max_cells: int) -> None:
+
+        loop = asyncio.new_event_loop()
+
+        try:
+            for width in widths:
+
+                for count in counts:
+
+                    if count * width > max_cells:
+                        print(f'serialize.{count}x{width} skipped, {count * width} cells is over --max-cells {max_cells}')
+                        continue
+
+                    columns, rows = Serialization.rows(count, width)
+                    name = f'serialize.{count}x{width}'
+                    repeat = 7 if count * width <= 1_000_000 else 3
+
+                    #? The same dict building AsyncPostgres runs on every json select
+                    dicts = loop.run_until_complete(AsyncPostgres._serialize_rows(StubCursor(columns, rows)))
+
+                    cases = {
+                        'dicts': lambda: loop.run_until_complete(AsyncPostgres._serialize_rows(StubCursor(columns, rows))),
+                        'json': lambda: RowFormats.json_bytes(dicts),
+                        'compact': lambda: RowFormats.dump('compact', columns, rows),
+                        'columnar': lambda: RowFormats.dump('columnar', columns, rows),
+                        'ndjson': lambda: loop.run_until_complete(Serialization._stream('ndjson', columns, rows)),
+                        'csv': lambda: loop.run_until_complete(Serialization._stream('csv', columns, rows))
+                    }
+
+                    if RowFormats.available('arrow'):
+                        cases['arrow'] = lambda: RowFormats.dump('arrow', columns, rows)
+
+                    for case, work in cases.items():
+                        results.add(f'{name}.{case}', **Bench.measure(work, repeat=repeat).describe())
+
+                    del dicts, rows
+        finally:
+            loop.close()
@@ -0,0 +1,134 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.common.pool import PoolKey, pools
+from src.classes.sql.postgres import PostgresQueries
+from src.classes.sql.types import Row
+
+class StubColumn(NamedTuple):
+    name: str
+
+class StubCursor():
+
+    def __init__(self, columns: Optional[List[str]], rows: List[Row], connection: Optional['StubConnection'] = None):
+
+        self.connection = connection
+        self.load(columns, rows)
+
+    def load(self, columns: Optional[List[str]], rows: List[Row]) -> None:
+
+        self.description = [StubColumn(name) for name in columns] if columns is not None else None
+        self._rows = rows
+        self._position = 0
+        self.rowcount = len(rows) if columns is not None else 1
+
+    async def execute(self, query: str, vars: Any = None) -> 'StubCursor':
+
+        self.load(*self.connection.answer(query))
+
+        return self
+
+    async def fetchall(self) -> List[Row]:
+
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+
+        return rows
+
+    async def fetchmany(self, size: int) -> List[Row]:
+
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+
+        return rows
+
+    async def fetchone(self) -> Optional[Row]:
+
+        rows = await self.fetchmany(1)
+
+        return rows[0] if rows else None
+
+    async def close(self) -> None: ...
+
+    async def __aenter__(self) -> 'StubCursor':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None: ...
+
+class StubConnection():
+
+    #? Answers every statement from memory, so endpoint runs measure the service and not the database
+    def __init__(self, columns: List[str], rows: List[Row]):
+
+        self.columns = columns
+        self.rows = rows
+        self.closed = False
+
+    def answer(self, query: str) -> Tuple[Optional[List[str]], List[Row]]:
+
+        if query is PostgresQueries.TABLES_QUERY:
+            return ['table_name'], [('pysql_bench',)]
+
+        if query is PostgresQueries.COLUMNS_QUERY:
+            return ['column_name', 'data_type'], [(column, 'text') for column in self.columns]
+
+        if query is PostgresQueries.SCHEMA_QUERY:
+            return ['schema'], [([],)]
+
+        statement = query.lstrip().split(None, 1)[0].upper()
+
+        if statement == 'EXPLAIN':
+            return ['QUERY PLAN'], [([{ "Plan": { "Node Type": "Stub" } }],)]
+
+        if statement == 'SELECT':
+            return self.columns, self.rows
+
+        if 'RETURNING' in query.upper():
+            return self.columns[:1], [row[:1] for row in self.rows[:1]]
+
+        return None, []
+
+    def cursor(self, name: Optional[str] = None) -> StubCursor:
+        return StubCursor(None, [], self)
+
+    async def execute(self, query: str, vars: Any = None) -> StubCursor:
+        return await self.cursor().execute(query, vars)
+
+    @asynccontextmanager
+    async def transaction(self, force_rollback: bool = False) -> AsyncIterator[None]:
+        yield
+
+    async def cancel_safe(self) -> None: ...
+
+class StubPool():
+
+    def __init__(self, columns: List[str], rows: List[Row]):
+
+        self.connection = StubConnection(columns, rows)
+        self.checkouts = 0
+
+    async def acquire(self) -> StubConnection:
+
+        self.checkouts += 1
+
+        return self.connection
+
+    async def release(self, connection: StubConnection) -> None: ...
+
+    def prune(self) -> int:
+        return 0
+
+    async def close(self) -> None: ...
+
+    def stats(self) -> Dict[str, Any]:
+        return { "size": 1, "idle": 1, "in_use": 0, "waiting": 0, "checkouts": self.checkouts, "timeouts": 0, "wait_time": 0 }
+
+class Stub():
+
+    @staticmethod
+    def install(config: DbConfig, columns: List[str], rows: List[Row], port: int = 5432) -> StubPool:
+
+        #? Registered under the key AsyncPostgres builds, so it is found before any real pool is created
+        key = PoolKey.from_config('postgres-async', config.model_copy(update={ "server": f'{config.server}:{port}' }))
+
+        return pools.get(key, lambda: StubPool(columns, rows))
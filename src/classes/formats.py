@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+from base64 import b64encode
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from src.classes.sql.types import Row
+from src.types.params import Format, BulkFormat
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+RowBatch = Tuple[List[str], List[Row]]
+
+class RowFormats():
+
+    MEDIA_TYPES: Dict[Format, str] = {
+        'json': 'application/json',
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv',
+        'compact': 'application/vnd.pysql.compact+json',
+        'columnar': 'application/vnd.pysql.columnar+json',
+        'arrow': 'application/vnd.apache.arrow.stream'
+    }
+
+    #? Formats sent while rows are still being read, the others are built from the whole result
+    STREAM_FORMATS: Tuple[Format, ...] = ('ndjson', 'csv')
+
+    @staticmethod
+    def json_default(value: Any) -> Any:
+
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+
+        if isinstance(value, timedelta):
+            return value.total_seconds()
+
+        if isinstance(value, Decimal):
+            return float(value)
+
+        if isinstance(value, UUID):
+            return str(value)
+
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return b64encode(bytes(value)).decode()
+
+        raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+    BULK_MEDIA_TYPES: Dict[BulkFormat, str] = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson'
+    }
+
+    @staticmethod
+    def negotiate_body(content_type: str) -> Optional[BulkFormat]:
+
+        for name, media_type in RowFormats.BULK_MEDIA_TYPES.items():
+
+            if media_type in content_type:
+                return name
+
+        return None
+
+    @staticmethod
+    def json_bytes(value: Any) -> bytes:
+
+        if orjson is not None:
+            return orjson.dumps(value, default=RowFormats.json_default)
+
+        return json.dumps(value, default=RowFormats.json_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+    @staticmethod
+    def available(response_format: Format) -> bool:
+        return response_format != 'arrow' or pyarrow is not None
+
+    @staticmethod
+    def negotiate(accept: str) -> Format:
+
+        for name, media_type in RowFormats.MEDIA_TYPES.items():
+
+            if name != 'json' and media_type in accept:
+                return name
+
+        return 'json'
+
+    @staticmethod
+    async def ndjson(batches: AsyncIterator[RowBatch]) -> AsyncIterator[bytes]:
+
+        dumps = RowFormats.json_bytes
+
+        async for columns, rows in batches:
+            yield b''.join(dumps(dict(zip(columns, row))) + b'\n' for row in rows)
+
+    @staticmethod
+    async def csv(batches: AsyncIterator[RowBatch]) -> AsyncIterator[bytes]:
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        header_sent = False
+
+        async for columns, rows in batches:
+
+            if not header_sent:
+                writer.writerow(columns)
+                header_sent = True
+
+            writer.writerows(rows)
+
+            yield buffer.getvalue().encode()
+
+            buffer.seek(0)
+            buffer.truncate()
+
+    @staticmethod
+    def encode(response_format: Format, batches: AsyncIterator[RowBatch]) -> AsyncIterator[bytes]:
+
+        if response_format == 'csv':
+            return RowFormats.csv(batches)
+
+        return RowFormats.ndjson(batches)
+
+    #region Whole results
+
+    @staticmethod
+    def compact(columns: List[str], rows: List[Row], **extra: Any) -> bytes:
+        return RowFormats.json_bytes({ "columns": columns, "rows": rows, **extra })
+
+    @staticmethod
+    def columnar(columns: List[str], rows: List[Row], **extra: Any) -> bytes:
+
+        data = { column: list(values) for column, values in zip(columns, zip(*rows)) } if rows else { column: [] for column in columns }
+
+        #? Extra keys could collide with column names, so the columns move under "data"
+        return RowFormats.json_bytes({ "data": data, **extra } if extra else data)
+
+    @staticmethod
+    def arrow(columns: List[str], rows: List[Row], **extra: Any) -> bytes:
+
+        data = { column: list(values) for column, values in zip(columns, zip(*rows)) } if rows else { column: [] for column in columns }
+        table = pyarrow.table(data, metadata={ key: str(value) for key, value in extra.items() if value is not None })
+
+        sink = pyarrow.BufferOutputStream()
+
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def dump(response_format: Format, columns: List[str], rows: List[Row], **extra: Any) -> bytes:
+
+        if response_format == 'arrow':
+            return RowFormats.arrow(columns, rows, **extra)
+
+        if response_format == 'columnar':
+            return RowFormats.columnar(columns, rows, **extra)
+
+        return RowFormats.compact(columns, rows, **extra)
+
+    #region Parsing
+
+    @staticmethod
+    async def lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+
+        pending = b''
+
+        async for chunk in chunks:
+
+            *complete, pending = (pending + chunk).split(b'\n')
+
+            if complete:
+                yield [line.decode() for line in complete]
+
+        if pending.strip():
+            yield [pending.decode()]
+
+    @staticmethod
+    async def csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[List[str]]]:
+
+        record: Optional[str] = None
+
+        async for lines in RowFormats.lines(chunks):
+
+            complete: List[str] = []
+
+            for line in lines:
+
+                record = line if record is None else f'{record}\n{line}'
+
+                #? An odd number of quotes means a quoted field continues on the next line
+                if record.count('"') % 2 == 0:
+                    complete.append(record)
+                    record = None
+
+            rows = [row for row in csv.reader(complete) if row]
+
+            if rows:
+                yield rows
+
+        if record is not None:
+            yield [row for row in csv.reader([record]) if row]
+
+    @staticmethod
+    async def ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Dict[str, Any]]]:
+
+        async for lines in RowFormats.lines(chunks):
+
+            records = [json.loads(line) for line in lines if line.strip()]
+
+            if records:
+                yield records
@@ -0,0 +1,228 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+from threading import Lock
+from fastapi.routing import APIRoute
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from src.classes.sql.common.SQLClasses import Table
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Timings():
+
+    def __init__(self):
+
+        self.started = perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.table: Optional[str] = None
+        self.rows: int = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.started
+
+    def header(self) -> str:
+
+        entries = [*self.phases.items(), ('total', self.elapsed())]
+
+        return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in entries)
+
+    @staticmethod
+    def current() -> Optional['Timings']:
+        return _current.get()
+
+    @staticmethod
+    def start() -> 'Timings':
+
+        timings = Timings()
+        _current.set(timings)
+
+        return timings
+
+    @staticmethod
+    @contextmanager
+    def phase(name: str) -> Iterator[None]:
+
+        timings = _current.get()
+
+        if timings is None:
+            yield
+            return
+
+        started = perf_counter()
+
+        try:
+            yield
+        finally:
+            timings.add(name, perf_counter() - started)
+
+    @staticmethod
+    def count_rows(rows: int) -> None:
+
+        timings = _current.get()
+
+        if timings is not None:
+            timings.rows += rows
+
+    @staticmethod
+    def _parsed(kwargs: Dict[str, Any]) -> None:
+
+        timings = _current.get()
+
+        if timings is None:
+            return
+
+        #? Everything before the endpoint body runs is request parsing and dependency resolution
+        timings.add('parse', timings.elapsed())
+
+        table = getattr(kwargs.get('query'), 'table', None)
+
+        if isinstance(table, Table):
+            timings.table = table.qualified()
+
+    @staticmethod
+    def wrap(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+
+        if iscoroutinefunction(endpoint):
+
+            @wraps(endpoint)
+            async def timed(*args: Any, **kwargs: Any) -> Any:
+                Timings._parsed(kwargs)
+                return await endpoint(*args, **kwargs)
+
+            return timed
+
+        @wraps(endpoint)
+        def timed_sync(*args: Any, **kwargs: Any) -> Any:
+            Timings._parsed(kwargs)
+            return endpoint(*args, **kwargs)
+
+        return timed_sync
+
+_current: ContextVar[Optional[Timings]] = ContextVar('pysql_timings', default=None)
+
+class TimedRoute(APIRoute):
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, Timings.wrap(endpoint), **kwargs)
+
+class Histogram():
+
+    BUCKETS: List[float] = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+    def __init__(self):
+
+        self.counts: List[int] = [0] * (len(self.BUCKETS) + 1)
+        self.sum: float = 0
+        self.count: int = 0
+
+    def observe(self, seconds: float) -> None:
+
+        self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+class Metrics():
+
+    def __init__(self):
+
+        self._lock = Lock()
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+
+        with self._lock:
+
+            series = self._histograms.setdefault(name, {})
+            key = tuple(labels.items())
+
+            if key not in series:
+                series[key] = Histogram()
+
+            series[key].observe(seconds)
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+
+        with self._lock:
+
+            series = self._counters.setdefault(name, {})
+            key = tuple(labels.items())
+
+            series[key] = series.get(key, 0) + value
+
+    def record(self, endpoint: str, timings: Timings, status: int, sent: int) -> None:
+
+        elapsed = timings.elapsed()
+
+        self.observe('pysql_request_duration_seconds', elapsed, endpoint=endpoint, status=str(status))
+
+        for phase, seconds in timings.phases.items():
+            self.observe('pysql_phase_duration_seconds', seconds, endpoint=endpoint, phase=phase)
+
+        if timings.table:
+            self.observe('pysql_table_duration_seconds', elapsed, table=timings.table)
+
+        self.increment('pysql_rows_total', timings.rows, endpoint=endpoint)
+        self.increment('pysql_response_bytes_total', sent, endpoint=endpoint)
+
+    @staticmethod
+    def _labels(labels: Labels, *extra: Tuple[str, str]) -> str:
+
+        escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs = [*labels, *extra]
+
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+    def render(self, pool_stats: List[Dict[str, Any]], admission_stats: List[Dict[str, Any]] = []) -> str:
+
+        lines: List[str] = []
+
+        with self._lock:
+
+            for name, series in self._histograms.items():
+
+                lines.append(f'# TYPE {name} histogram')
+
+                for labels, histogram in series.items():
+
+                    cumulative = 0
+
+                    for bound, count in zip([*Histogram.BUCKETS, '+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{self._labels(labels, ("le", str(bound)))} {cumulative}')
+
+                    lines.append(f'{name}_sum{self._labels(labels)} {histogram.sum}')
+                    lines.append(f'{name}_count{self._labels(labels)} {histogram.count}')
+
+            for name, series in self._counters.items():
+
+                lines.append(f'# TYPE {name} counter')
+
+                for labels, value in series.items():
+                    lines.append(f'{name}{self._labels(labels)} {value}')
+
+        gauges = { 'size': 'pysql_pool_connections', 'in_use': 'pysql_pool_in_use', 'idle': 'pysql_pool_idle', 'waiting': 'pysql_pool_waiting' }
+        counters = { 'checkouts': 'pysql_pool_checkouts_total', 'timeouts': 'pysql_pool_timeouts_total', 'wait_time': 'pysql_pool_wait_seconds_total' }
+
+        queues = { 'active': 'pysql_admission_active', 'queued': 'pysql_admission_queue_depth' }
+
+        for stats, kind, sources in ((gauges, 'gauge', pool_stats), (counters, 'counter', pool_stats), (queues, 'gauge', admission_stats)):
+
+            for field, name in stats.items():
+
+                lines.append(f'# TYPE {name} {kind}')
+
+                for pool in sources:
+
+                    labels = tuple((label, str(pool[label])) for label in ('engine', 'server', 'database'))
+                    lines.append(f'{name}{self._labels(labels)} {pool.get(field, 0)}')
+
+        return '\n'.join(lines) + '\n'
+
+metrics: Metrics = Metrics()
@@ -0,0 +1,219 @@
+import os
+import tempfile
+from pydantic import BaseModel, Json
+from typing import Any, Dict, List, Type, TypeVar
+
+SettingsModel = TypeVar('SettingsModel', bound=BaseModel)
+
+def _from_env(model: Type[SettingsModel], prefix: str) -> SettingsModel:
+
+    values: Dict[str, Any] = {}
+
+    for name in model.model_fields.keys():
+
+        env_value = os.environ.get(f'{prefix}{name.upper()}')
+
+        if env_value is not None:
+            values[name] = env_value
+
+    return model(**values)
+
+class PoolSettings(BaseModel):
+
+    min_size: int = 1
+    max_size: int = 10
+    max_idle: float = 300 #? Seconds an idle connection is kept above min_size
+    max_lifetime: float = 3600 #? Seconds before a connection is recycled
+    checkout_timeout: float = 30 #? Seconds to wait for a free connection
+    health_check_interval: float = 30 #? Idle seconds before a checkout pings the server
+    prune_interval: float = 30 #? Seconds between sweeps closing idle and expired connections
+
+    @classmethod
+    def from_env(cls) -> 'PoolSettings':
+        return _from_env(cls, 'PYSQL_POOL_')
+
+class ExecutorSettings(BaseModel):
+
+    max_workers: int = 32 #? Threads running blocking drivers behind the async interface
+
+    @classmethod
+    def from_env(cls) -> 'ExecutorSettings':
+        return _from_env(cls, 'PYSQL_EXECUTOR_')
+
+class StreamSettings(BaseModel):
+
+    batch_size: int = 1000 #? Rows fetched per round-trip from a server-side cursor
+
+    @classmethod
+    def from_env(cls) -> 'StreamSettings':
+        return _from_env(cls, 'PYSQL_STREAM_')
+
+class QueryCacheSettings(BaseModel):
+
+    max_size: int = 512 #? Compiled statements kept per dialect, 0 disables the cache
+
+    @classmethod
+    def from_env(cls) -> 'QueryCacheSettings':
+        return _from_env(cls, 'PYSQL_QUERY_CACHE_')
+
+class StatementSettings(BaseModel):
+
+    max_size: int = 100 #? Prepared statements kept per connection, 0 disables preparing
+    threshold: int = 5 #? Executions of the same statement before it is prepared
+
+    @classmethod
+    def from_env(cls) -> 'StatementSettings':
+        return _from_env(cls, 'PYSQL_STATEMENTS_')
+
+class BulkSettings(BaseModel):
+
+    chunk_size: int = 5000 #? Rows sent per statement by bulk inserts, updates and deletes
+
+    @classmethod
+    def from_env(cls) -> 'BulkSettings':
+        return _from_env(cls, 'PYSQL_BULK_')
+
+class MetadataSettings(BaseModel):
+
+    ttl: float = 60 #? Seconds /tables and /columns answers are served from memory
+    max_size: int = 10000
+
+    @classmethod
+    def from_env(cls) -> 'MetadataSettings':
+        return _from_env(cls, 'PYSQL_METADATA_')
+
+class ResultCacheSettings(BaseModel):
+
+    max_bytes: int = 64 * 1024 * 1024 #? Encoded /select results kept in memory
+    max_ttl: float = 300 #? Upper bound for the cache_ttl a request may ask for
+
+    @classmethod
+    def from_env(cls) -> 'ResultCacheSettings':
+        return _from_env(cls, 'PYSQL_RESULT_CACHE_')
+
+class MetricsSettings(BaseModel):
+
+    enabled: bool = True #? Phase timings, Server-Timing headers and /metrics
+
+    @classmethod
+    def from_env(cls) -> 'MetricsSettings':
+        return _from_env(cls, 'PYSQL_METRICS_')
+
+class SlowQuerySettings(BaseModel):
+
+    threshold: float = 1 #? Seconds before a select or update is logged, 0 disables the log
+    path: str = 'slow_queries.log'
+    max_bytes: int = 10 * 1024 * 1024 #? Size at which the log rotates
+    backup_count: int = 5
+    explain: bool = False #? Capture the plan of slow statements on a separate connection
+
+    @classmethod
+    def from_env(cls) -> 'SlowQuerySettings':
+        return _from_env(cls, 'PYSQL_SLOW_QUERY_')
+
+class TimeoutSettings(BaseModel):
+
+    statement: float = 0 #? Default seconds a statement may run, 0 leaves it unlimited
+    disconnect_poll: float = 0.5 #? Seconds between checks for a client that went away
+
+    @classmethod
+    def from_env(cls) -> 'TimeoutSettings':
+        return _from_env(cls, 'PYSQL_TIMEOUT_')
+
+class AdmissionSettings(BaseModel):
+
+    max_concurrency: int = 10 #? Statements running at once per database, 0 disables admission control
+    max_queue: int = 100 #? Requests waiting per database before new ones are shed with 429
+    queue_timeout: float = 10 #? Seconds a request may wait for a slot before it is shed with 503
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionSettings':
+        return _from_env(cls, 'PYSQL_ADMISSION_')
+
+class JobSettings(BaseModel):
+
+    workers: int = 4 #? Jobs running at once, the rest wait their turn
+    max_pending: int = 100 #? Queued and running jobs before new submissions get 429
+    path: str = os.path.join(tempfile.gettempdir(), 'pysql-jobs') #? Directory holding the spool files
+    ttl: float = 3600 #? Seconds a finished job and its spool file are kept
+    reap_interval: float = 60 #? Seconds between sweeps of expired jobs and orphaned spool files
+
+    @classmethod
+    def from_env(cls) -> 'JobSettings':
+        return _from_env(cls, 'PYSQL_JOBS_')
+
+class FanoutSettings(BaseModel):
+
+    concurrency: int = 8 #? Targets of one /fanout/select queried at once
+    timeout: float = 30 #? Default seconds each target may take, 0 leaves it unlimited
+    buffer: int = 16 #? Row batches held per request before slow readers hold back the targets
+
+    @classmethod
+    def from_env(cls) -> 'FanoutSettings':
+        return _from_env(cls, 'PYSQL_FANOUT_')
+
+class ReplicaServer(BaseModel):
+
+    server: str
+    weight: float = 1 #? Share of the reads relative to the other replicas
+
+class ReplicaSettings(BaseModel):
+
+    servers: Json[Dict[str, List[ReplicaServer]]] = {} #? JSON object from "primary/database" to its replicas
+    max_lag: float = 10 #? Seconds behind the primary before a replica stops serving reads
+    health_check_interval: float = 5 #? Seconds between replica checks
+
+    @classmethod
+    def from_env(cls) -> 'ReplicaSettings':
+        return _from_env(cls, 'PYSQL_REPLICA_')
+
+class TransactionSettings(BaseModel):
+
+    idle_timeout: float = 60 #? Seconds a transaction session may sit unused before it is rolled back
+    max_sessions: int = 50 #? Open transaction sessions, each pins a pooled connection
+
+    @classmethod
+    def from_env(cls) -> 'TransactionSettings':
+        return _from_env(cls, 'PYSQL_TRANSACTION_')
+
+class Settings(BaseModel):
+
+    pool: PoolSettings = PoolSettings()
+    executor: ExecutorSettings = ExecutorSettings()
+    stream: StreamSettings = StreamSettings()
+    query_cache: QueryCacheSettings = QueryCacheSettings()
+    statements: StatementSettings = StatementSettings()
+    bulk: BulkSettings = BulkSettings()
+    metadata: MetadataSettings = MetadataSettings()
+    result_cache: ResultCacheSettings = ResultCacheSettings()
+    metrics: MetricsSettings = MetricsSettings()
+    slow_query: SlowQuerySettings = SlowQuerySettings()
+    timeout: TimeoutSettings = TimeoutSettings()
+    admission: AdmissionSettings = AdmissionSettings()
+    jobs: JobSettings = JobSettings()
+    fanout: FanoutSettings = FanoutSettings()
+    replicas: ReplicaSettings = ReplicaSettings()
+    transactions: TransactionSettings = TransactionSettings()
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        return cls(
+            pool=PoolSettings.from_env(),
+            executor=ExecutorSettings.from_env(),
+            stream=StreamSettings.from_env(),
+            query_cache=QueryCacheSettings.from_env(),
+            statements=StatementSettings.from_env(),
+            bulk=BulkSettings.from_env(),
+            metadata=MetadataSettings.from_env(),
+            result_cache=ResultCacheSettings.from_env(),
+            metrics=MetricsSettings.from_env(),
+            slow_query=SlowQuerySettings.from_env(),
+            timeout=TimeoutSettings.from_env(),
+            admission=AdmissionSettings.from_env(),
+            jobs=JobSettings.from_env(),
+            fanout=FanoutSettings.from_env(),
+            replicas=ReplicaSettings.from_env(),
+            transactions=TransactionSettings.from_env()
+        )
+
+settings: Settings = Settings.from_env()
@@ -0,0 +1,545 @@
+import asyncio
+from contextlib import AsyncExitStack
+import csv
+import json
+from uuid import uuid4
+from time import monotonic, perf_counter
+from psycopg import AsyncConnection, AsyncCursor, AsyncCopy
+from psycopg.errors import QueryCanceled
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
+from src.classes.sql.common.SQLClasses import *
+from src.classes.sql.types import Row, Data
+from src.types.params import ListOrTuple, Priority
+from src.classes.sql.common.pool import PoolKey, PoolTimeoutError, pools
+from src.classes.sql.postgres import PostgresQueries
+from src.classes.formats import RowFormats
+from src.classes.sql.common.schema_snapshot import SchemaSnapshot
+from src.classes.sql.common.batch import Batch, BatchError
+from src.classes.metrics import Timings
+from src.classes.sql.common.slow_query import slow_queries
+from src.classes.sql.common.cancellation import QueryCancelledError
+from src.classes.sql.common.admission import admission
+from src.classes.sql.common.transactions import TransactionSession, TransactionSessionError, transactions
+from src.classes.settings import PoolSettings, StatementSettings, settings
+
+class AsyncPostgresPool():
+
+    def __init__(self, pool_settings: PoolSettings, statement_settings: StatementSettings = settings.statements, **connect_params: Any):
+
+        self.settings = pool_settings
+        self.statement_settings = statement_settings
+
+        #? psycopg prepares hot statements per connection and drops them when the connection is recycled
+        prepare_threshold = statement_settings.threshold if statement_settings.max_size > 0 else None
+
+        self._pool = AsyncConnectionPool(
+            kwargs={ **connect_params, "autocommit": True, "prepare_threshold": prepare_threshold },
+            configure=self._configure,
+            min_size=pool_settings.min_size,
+            max_size=pool_settings.max_size,
+            max_idle=pool_settings.max_idle,
+            max_lifetime=pool_settings.max_lifetime,
+            timeout=pool_settings.checkout_timeout,
+            check=AsyncConnectionPool.check_connection,
+            open=False
+        )
+
+        self._opened: bool = False
+        self._lock = asyncio.Lock()
+        self._checkouts: int = 0
+        self._wait_time: float = 0
+        self._timeouts: int = 0
+
+    async def _configure(self, db_connection: AsyncConnection) -> None:
+
+        if self.statement_settings.max_size > 0:
+            db_connection.prepared_max = self.statement_settings.max_size
+
+    async def _open(self) -> None:
+
+        if self._opened:
+            return
+
+        async with self._lock:
+
+            if not self._opened:
+                await self._pool.open()
+                self._opened = True
+
+    async def acquire(self) -> AsyncConnection:
+
+        await self._open()
+
+        started = monotonic()
+
+        try:
+            db_connection = await self._pool.getconn()
+        except PoolTimeout as error:
+            self._timeouts += 1
+            raise PoolTimeoutError(str(error)) from error
+
+        self._checkouts += 1
+        self._wait_time += monotonic() - started
+
+        return db_connection
+
+    async def release(self, db_connection: AsyncConnection) -> None:
+        await self._pool.putconn(db_connection)
+
+    def prune(self) -> int:
+        return 0 #? psycopg_pool evicts idle connections from its own worker
+
+    async def close(self) -> None:
+
+        if self._opened:
+            await self._pool.close()
+
+    def stats(self) -> Dict[str, Any]:
+
+        pool_stats = self._pool.get_stats()
+
+        size = pool_stats.get('pool_size', 0)
+        idle = pool_stats.get('pool_available', 0)
+
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": pool_stats.get('requests_waiting', 0),
+            "min_size": self.settings.min_size,
+            "max_size": self.settings.max_size,
+            "checkouts": self._checkouts,
+            "waits": pool_stats.get('requests_queued', 0),
+            "wait_time": round(self._wait_time, 6),
+            "timeouts": self._timeouts,
+            "created": pool_stats.get('connections_num', 0),
+            "discarded": pool_stats.get('connections_lost', 0) + pool_stats.get('returns_bad', 0),
+            "failed_checks": pool_stats.get('connections_errors', 0)
+        }
+
+class AsyncPostgres(PostgresQueries):
+
+    _connection: AsyncConnection
+    _pool: AsyncPostgresPool
+
+    def __init__(self, *, config: DbConfig, port: int = 5432, priority: Priority = 'normal', pinned: bool = True):
+
+        key = PoolKey.from_config(
+            'postgres-async',
+            config.model_copy(update={ "server": f'{config.server}:{port}' })
+        )
+
+        self._key = key
+        self._priority: Priority = priority
+        self._admission = AsyncExitStack()
+        self._pinned = pinned #? Work outliving the request, like jobs, never joins the caller's transaction session
+
+        self._pool = pools.get(
+            key,
+            lambda: AsyncPostgresPool(
+                settings.pool,
+                dbname=config.database,
+                user=config.uid,
+                password=config.pwd,
+                host=config.server,
+                port=port,
+                sslmode=config.encrypt,
+                **self._timeout_options()
+            )
+        )
+
+        self.timeout: Optional[float] = config.statement_timeout or settings.timeout.statement or None
+        self._override_timeout = bool(config.statement_timeout)
+
+    async def __aenter__(self) -> 'AsyncPostgres':
+
+        session = transactions.bound() if self._pinned else None
+
+        if session is not None:
+            return await self._join(session)
+
+        #? Waits in the per-database queue before taking a pooled connection, so spikes never pile up connects
+        await self._admission.enter_async_context(admission.admit(self._key, self._priority))
+
+        try:
+            with Timings.phase('connect'):
+                self._connection = await self._pool.acquire()
+        except BaseException:
+            await self._admission.aclose()
+            raise
+
+        if self._override_timeout:
+
+            try:
+                await self._connection.execute("SELECT set_config('statement_timeout', %s, false)", (str(int(self.timeout * 1000)),))
+            except BaseException:
+                await self.close() #? Gives back the connection and the admission slot
+                raise
+
+        return self
+
+    async def _join(self, session: TransactionSession) -> 'AsyncPostgres':
+
+        if session.db._key != self._key:
+            raise TransactionSessionError(409, 'The transaction session belongs to another database or user')
+
+        await session.lock.acquire()
+
+        #? The session only holds its connection between requests, each one queues for an admission slot of its own
+        try:
+            await self._admission.enter_async_context(admission.admit(self._key, self._priority))
+        except BaseException:
+            session.lock.release()
+            raise
+
+        self._session = session
+        self._connection = session.db._connection
+
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+
+        session = self.__dict__.pop('_session', None)
+
+        #? The pinned connection stays with its session until commit, rollback or the idle timeout
+        if session is not None:
+
+            self.__dict__.pop('_connection', None)
+
+            session.touch()
+
+            try:
+                await self._admission.aclose()
+            finally:
+                session.lock.release()
+
+            return
+
+        db_connection = self.__dict__.pop('_connection', None)
+
+        if db_connection is None:
+            return
+
+        if self._override_timeout and not db_connection.closed:
+
+            try:
+                await db_connection.execute('RESET statement_timeout')
+            except Exception:
+                pass #? The pool checks the connection and discards it when broken
+
+        try:
+            await self._pool.release(db_connection)
+        finally:
+            await self._admission.aclose()
+
+    async def begin(self) -> None:
+        await self._connection.execute('BEGIN')
+
+    async def detach(self) -> None:
+        await self._admission.aclose() #? Keeps the connection for a transaction session, gives back the admission slot
+
+    async def commit(self) -> None:
+        await self._connection.execute('COMMIT')
+
+    async def rollback(self) -> None:
+        await self._connection.execute('ROLLBACK')
+
+    async def cancel(self) -> None:
+
+        db_connection = self.__dict__.get('_connection')
+
+        if db_connection is not None:
+            await db_connection.cancel_safe()
+
+    @staticmethod
+    async def _serialize_rows(cursor: AsyncCursor) -> Data:
+
+        if cursor.description is None:
+            return [{}]
+
+        column_names = [
+            column.name
+            for column in cursor.description
+        ]
+
+        with Timings.phase('fetch'):
+            rows = await cursor.fetchall()
+
+        Timings.count_rows(len(rows))
+
+        with Timings.phase('serialize'):
+            return [dict(zip(column_names, row)) for row in rows]
+
+    async def execute(self, query: str, vars: ListOrTuple = ()) -> AsyncCursor:
+
+        db_cursor = self._connection.cursor()
+
+        try:
+            with Timings.phase('execute'):
+                await db_cursor.execute(query, vars or None)
+        except QueryCanceled as error:
+            raise QueryCancelledError('timeout') from error
+
+        return db_cursor
+
+    async def fetch(self, query: str, vars: ListOrTuple = ()) -> List[Row]:
+
+        cursor = await self.execute(query, vars)
+
+        try:
+            return await cursor.fetchall() if cursor.description else []
+        finally:
+            await cursor.close()
+
+    async def tables(self, schema: SchemaBody = SchemaBody()) -> List[Row]:
+
+        return await self.fetch(self.TABLES_QUERY, (schema.sql_schema,))
+
+    async def columns(self, query: ColumnsQuery) -> List[Dict[str, str]]:
+
+        all_columns = await self.fetch(
+            self.COLUMNS_QUERY,
+            (query.table.sql_schema, query.table.name)
+        )
+
+        return self._dump_table_columns(all_columns)
+
+    async def schema(self, schema: SchemaBody = SchemaBody()) -> Dict[str, Any]:
+
+        snapshot = await self.fetch(self.SCHEMA_QUERY, (schema.sql_schema,))
+
+        return SchemaSnapshot.compact(schema.sql_schema, snapshot[0][0])
+
+    async def _side_explain(self, request: str, params: ListOrTuple) -> Any:
+
+        #? Plans are read on another pooled connection, the one serving the request may be reused already
+        db_connection = await self._pool.acquire()
+
+        try:
+            async with db_connection.cursor() as cursor:
+
+                await cursor.execute(f'EXPLAIN (FORMAT JSON) {request}', params or None)
+
+                return (await cursor.fetchone())[0]
+        finally:
+            await self._pool.release(db_connection)
+
+    def _watch(self, request: str, params: ListOrTuple, rows: int, started: float) -> None:
+
+        duration = perf_counter() - started
+
+        if slow_queries.is_slow(duration):
+            slow_queries.capture(request, params, rows, duration, lambda: self._side_explain(request, params))
+
+    async def explain(self, query: SelectQuery) -> Any:
+
+        request, params = self._compile_select(query)
+
+        rows = await self.fetch(f'EXPLAIN (FORMAT JSON) {request}', params)
+
+        return rows[0][0]
+
+    async def select(self, query: SelectQuery) -> Data:
+
+        request, params = self._compile_select(query)
+        started = perf_counter()
+
+        cursor = await self.execute(request, params)
+
+        try:
+            rows = await self._serialize_rows(cursor)
+        finally:
+            await cursor.close()
+
+        self._watch(request, params, len(rows), started)
+
+        return rows
+
+    async def select_rows(self, query: SelectQuery) -> Tuple[List[str], List[Row]]:
+
+        request, params = self._compile_select(query)
+        started = perf_counter()
+
+        cursor = await self.execute(request, params)
+
+        try:
+
+            with Timings.phase('fetch'):
+                rows = await cursor.fetchall()
+
+            Timings.count_rows(len(rows))
+
+            columns = [column.name for column in cursor.description]
+        finally:
+            await cursor.close()
+
+        self._watch(request, params, len(rows), started)
+
+        return columns, rows
+
+    async def stream(self, query: SelectQuery, batch_size: int = settings.stream.batch_size) -> AsyncIterator[Tuple[List[str], List[Row]]]:
+
+        request, params = self._compile_select(query)
+
+        #? Server-side cursors only live inside a transaction
+        async with self._connection.transaction(force_rollback=True):
+
+            async with self._connection.cursor(name=f'pysql_{uuid4().hex}') as cursor:
+
+                await cursor.execute(request, params or None)
+
+                column_names = [column.name for column in cursor.description]
+
+                #? The first batch is sent even when empty so encoders can write headers
+                rows = await cursor.fetchmany(batch_size)
+                Timings.count_rows(len(rows))
+
+                yield column_names, rows
+
+                while rows := await cursor.fetchmany(batch_size):
+                    Timings.count_rows(len(rows))
+                    yield column_names, rows
+
+    async def insert(self, query: InsertQuery) -> List[Row]:
+        return await self.fetch(*self._compile_insert(query))
+
+    async def _copy_csv(self, query: BulkInsertQuery, chunks: AsyncIterator[bytes]) -> int:
+
+        head = b''
+        columns = query.columns
+
+        #? Without explicit columns the header line names them, COPY skips it afterwards
+        if not columns and query.header:
+
+            async for chunk in chunks:
+
+                head += chunk
+
+                if b'\n' in head:
+                    break
+
+            columns = next(csv.reader([head.split(b'\n', 1)[0].decode()]), [])
+
+        async with self._connection.cursor() as cursor:
+
+            async with cursor.copy(self._compile_copy(query, columns)) as copy:
+
+                if head:
+                    await copy.write(head)
+
+                async for chunk in chunks:
+                    await copy.write(chunk)
+
+            return cursor.rowcount
+
+    @staticmethod
+    async def _write_records(copy: AsyncCopy, columns: List[str], records: List[Dict[str, Any]]) -> None:
+
+        for record in records:
+            await copy.write_row(tuple(
+                json.dumps(value) if isinstance(value, dict) else value
+                for value in (record.get(column) for column in columns)
+            ))
+
+    async def _copy_ndjson(self, query: BulkInsertQuery, chunks: AsyncIterator[bytes]) -> int:
+
+        batches = RowFormats.ndjson_rows(chunks)
+
+        #? Without explicit columns the keys of the first record name them
+        first = await anext(batches, None)
+
+        if first is None:
+            return 0
+
+        columns = query.columns or list(first[0].keys())
+
+        async with self._connection.cursor() as cursor:
+
+            async with cursor.copy(self._compile_copy(query, columns)) as copy:
+
+                await self._write_records(copy, columns, first)
+
+                async for records in batches:
+                    await self._write_records(copy, columns, records)
+
+            return cursor.rowcount
+
+    async def bulk_insert(self, query: BulkInsertQuery, chunks: AsyncIterator[bytes]) -> int:
+
+        if query.format == 'csv':
+            return await self._copy_csv(query, chunks)
+
+        return await self._copy_ndjson(query, chunks)
+
+    async def update(self, query: UpdateQuery) -> List[Row]:
+
+        request, params = self._compile_update(query)
+        started = perf_counter()
+
+        cursor = await self.execute(request, params)
+
+        try:
+            rows = await cursor.fetchall() if cursor.description else []
+            affected = cursor.rowcount
+        finally:
+            await cursor.close()
+
+        self._watch(request, params, affected, started)
+
+        return rows
+
+    async def delete(self, query: DeleteQuery) -> List[Row]:
+        return await self.fetch(*self._compile_delete(query))
+
+    async def upsert(self, query: UpsertQuery) -> List[Row]:
+
+        answer: List[Row] = []
+
+        async with self._connection.transaction():
+
+            for rows in query.chunks(max(1, min(settings.bulk.chunk_size, self.MAX_PARAMS // len(query.columns)))):
+                answer.extend(await self.fetch(*self._compile_upsert(query, rows)))
+
+        return answer
+
+    async def _bulk_apply(self, compile: Callable[[Any, List[Dict[str, Any]]], Tuple[str, List[Any]]], query: KeyedRows) -> int:
+
+        affected = 0
+
+        async with self._connection.transaction():
+
+            for rows in query.chunks(settings.bulk.chunk_size):
+
+                cursor = await self.execute(*compile(query, rows))
+                affected += cursor.rowcount
+                await cursor.close()
+
+        return affected
+
+    async def bulk_update(self, query: BulkUpdateQuery) -> int:
+        return await self._bulk_apply(self._compile_bulk_update, query)
+
+    async def bulk_delete(self, query: BulkDeleteQuery) -> int:
+        return await self._bulk_apply(self._compile_bulk_delete, query)
+
+    async def call(self, query: ExecQuery):
+        await self.fetch(*self._compile_call(query))
+
+    async def perform(self, query: FuncQuery) -> List[Row]:
+        return await self.fetch(*self._compile_perform(query))
+
+    async def batch(self, query: BatchQuery) -> List[Any]:
+
+        if not query.transaction:
+            return await Batch.run(self, query.items)
+
+        try:
+            async with self._connection.transaction():
+                return await Batch.run(self, query.items)
+        except BatchError as error:
+            error.results = []
+            raise
@@ -0,0 +1,17 @@
+from src.classes.sql.common.async_database import AsyncDatabase
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.common.pool import PoolKey
+from src.classes.sql.sqlserver import SQLServer
+from src.classes.settings import settings
+from src.types.params import Priority
+
+class AsyncSQLServer(AsyncDatabase):
+
+    def __init__(self, config: DbConfig, autocommit: bool = True, priority: Priority = 'normal'):
+        super().__init__(
+            lambda: SQLServer(config=config, autocommit=autocommit),
+            PoolKey.from_config(SQLServer.DRIVER, config),
+            priority
+        )
+
+        self.timeout = config.statement_timeout or settings.timeout.statement or None
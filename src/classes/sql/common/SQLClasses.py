@@ -1,10 +1,11 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from fastapi import Query
-from typing import Annotated, Any, Literal, List, Tuple, Dict
-from src.types.params import Engine, ListOrTuple, EncryptValues
+from typing import Annotated, Any, Literal, List, Tuple, Dict, Union
+from src.types.params import Engine, ListOrTuple, EncryptValues, BulkFormat
 import time
 from threading import Thread
 from src.classes.sql.types.join import JoinTypes
+from src.classes.sql.common.keyset import Keyset
 
 # def example():
     
@@ -21,6 +22,7 @@ class DbConfig(BaseModel):
     uid: Annotated[str, Query(...)]
     pwd: Annotated[str, Query(...)]
     encrypt: Annotated[EncryptValues, Query(...)]
+    statement_timeout: Annotated[float|None, Query(None)] = None #? Seconds, falls back to PYSQL_TIMEOUT_STATEMENT
 
 class EngineConfig(BaseModel):
     
@@ -37,6 +39,9 @@ class Table(SchematicObject):
     subname: str|None = None
     columns: tuple[str, ...] = ()
     
+    def qualified(self) -> str:
+        return f'{self.sql_schema}.{self.name}'.lower() if self.sql_schema else self.name.lower()
+    
 class Function(SchematicObject):
     return_type: Any|None = None
 
@@ -92,6 +97,30 @@ class Offset(BaseModel):
     min_row: int
     max_row: int|None = None
 
+class Seek(BaseModel):
+    
+    columns: list[Column] = Field(..., min_length=1) #? Ordering key, must be unique across rows
+    after: str|None = None #? Continuation token of the previous page
+    size: int = Field(100, gt=0)
+    desc: bool = False
+    
+    @model_validator(mode='after')
+    def check_token(self) -> 'Seek':
+        
+        if self.after is not None and len(self.values()) != len(self.columns):
+            raise ValueError('Continuation token does not match the seek columns')
+        
+        return self
+    
+    def keys(self) -> List[str]:
+        return [column.rename or column.name.split('.')[-1] for column in self.columns]
+    
+    def values(self) -> List[Any]:
+        return Keyset.decode(self.after) if self.after is not None else []
+    
+    def next_token(self, rows: List[Any], columns: List[str]|None = None) -> str|None:
+        return Keyset.next_token(self.keys(), self.size, rows, columns)
+
 class SelectQuery(BaseModel):
     table: Table
     join: list[Join] = []
@@ -101,6 +130,27 @@ class SelectQuery(BaseModel):
     having: list[Having] = []
     group_by: Group_By|None = None
     offset: Offset|None = None
+    seek: Seek|None = None #? Keyset pagination, replaces order_by and offset
+    
+    @model_validator(mode='after')
+    def check_seek_columns(self) -> 'SelectQuery':
+        
+        #? The next token is read from the last row, so every key must be selected
+        if self.seek is None or not self.columns or any(column.name == '*' or column.name.endswith('.*') for column in self.columns):
+            return self
+        
+        selected = {column.rename or column.name.split('.')[-1] for column in self.columns}
+        missing = [key for key in self.seek.keys() if key not in selected]
+        
+        if missing:
+            raise ValueError(f"Seek columns must be selected: {', '.join(missing)}")
+        
+        return self
+
+class FanoutQuery(BaseModel):
+    query: SelectQuery
+    targets: list[DbConfig] = Field(..., min_length=1) #? Databases sharing the schema of the query
+    timeout: float|None = Field(None, gt=0) #? Seconds per target, falls back to PYSQL_FANOUT_TIMEOUT
 
 class InsertQuery(BaseModel):
     table: Table
@@ -108,6 +158,45 @@ class InsertQuery(BaseModel):
     values: List[ListOrTuple]
     output: list[Column] = []
 
+class UpsertQuery(InsertQuery):
+    
+    conflict: list[str] = Field(..., min_length=1) #? Unique key deciding between insert and update
+    update_columns: list[str]|None = None #? None updates every non-key column, [] leaves existing rows untouched
+    
+    @model_validator(mode='after')
+    def check_columns(self) -> 'UpsertQuery':
+        
+        if not set(self.conflict) <= set(self.columns):
+            raise ValueError('Upserts need the conflict key among the columns')
+        
+        if any(len(row) != len(self.columns) for row in self.values):
+            raise ValueError('Every row must hold a value per column')
+        
+        return self
+    
+    def updated(self) -> List[str]:
+        return [column for column in self.columns if column not in self.conflict] if self.update_columns is None else self.update_columns
+    
+    def chunks(self, size: int) -> List[List[ListOrTuple]]:
+        
+        positions = [self.columns.index(column) for column in self.conflict]
+        unique: Dict[Tuple[Any, ...], ListOrTuple] = {}
+        
+        #? A statement may touch a row once, the last value of a repeated key wins
+        for row in self.values:
+            unique.pop(key := tuple(row[position] for position in positions), None)
+            unique[key] = row
+        
+        rows = list(unique.values())
+        
+        return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+class BulkInsertQuery(BaseModel):
+    table: Table
+    columns: list[str] = []
+    format: BulkFormat = 'csv'
+    header: bool = True #? First CSV line holds the column names
+
 class UpdateQuery(BaseModel):
     table: Table
     column_values: dict[str, Any]
@@ -131,6 +220,43 @@ class DeleteQuery(BaseModel):
     table: Table
     conditions: list[Where] = []
 
+class KeyedRows(BaseModel):
+    
+    table: Table
+    keys: list[str] = Field(..., min_length=1) #? Columns matching each row to the table
+    rows: list[dict[str, Any]] = Field(..., min_length=1)
+    
+    @model_validator(mode='after')
+    def check_rows(self) -> 'KeyedRows':
+        
+        columns = set(self.rows[0])
+        
+        if any(set(row) != columns for row in self.rows):
+            raise ValueError('Every row must have the same columns')
+        
+        if not set(self.keys) <= columns:
+            raise ValueError('Every row must hold the key columns')
+        
+        return self
+    
+    def columns(self) -> List[str]:
+        return [column for column in self.rows[0] if column not in self.keys]
+    
+    def chunks(self, size: int) -> List[List[dict[str, Any]]]:
+        return [self.rows[start:start + size] for start in range(0, len(self.rows), size)]
+
+class BulkUpdateQuery(KeyedRows):
+    
+    @model_validator(mode='after')
+    def check_columns(self) -> 'BulkUpdateQuery':
+        
+        if not self.columns():
+            raise ValueError('Rows hold no column to update')
+        
+        return self
+
+class BulkDeleteQuery(KeyedRows): ...
+
 class ColumnsQuery(BaseModel):
     table: Table = Field(..., description='Table')
     return_columns_types: bool = Field(True, description='Show Column Types')
@@ -146,4 +272,41 @@ class FuncQuery(ParameterQuery):
     func: Function
     
 class SchemaBody(BaseModel):
-    sql_schema: str = 'public'
\ No newline at end of file
+    sql_schema: str = 'public'
+
+class MetadataInvalidation(BaseModel):
+    sql_schema: str|None = None #? None drops every schema of the database
+    table: str|None = None
+
+class SelectItem(BaseModel):
+    kind: Literal['select']
+    query: SelectQuery
+
+class InsertItem(BaseModel):
+    kind: Literal['insert']
+    query: InsertQuery
+
+class UpdateItem(BaseModel):
+    kind: Literal['update']
+    query: UpdateQuery
+
+class DeleteItem(BaseModel):
+    kind: Literal['delete']
+    query: DeleteQuery
+
+class CallItem(BaseModel):
+    kind: Literal['call']
+    query: ExecQuery
+
+class PerformItem(BaseModel):
+    kind: Literal['perform']
+    query: FuncQuery
+
+BatchItem = Annotated[
+    Union[SelectItem, InsertItem, UpdateItem, DeleteItem, CallItem, PerformItem],
+    Field(discriminator='kind')
+]
+
+class BatchQuery(BaseModel):
+    items: list[BatchItem]
+    transaction: bool = True #? All items commit together or none does
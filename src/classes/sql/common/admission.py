@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+from contextlib import asynccontextmanager
+from itertools import count
+from time import monotonic
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from src.classes.sql.common.pool import PoolKey
+from src.classes.metrics import Timings, metrics
+from src.classes.settings import AdmissionSettings, settings
+from src.types.params import Priority
+
+class AdmissionRejectedError(Exception):
+
+    def __init__(self, status: int, detail: str):
+
+        super().__init__(detail)
+
+        self.status = status #? 429 when the queue is full, 503 when the wait timed out
+
+class Gate():
+
+    PRIORITIES: Dict[Priority, int] = { 'high': 0, 'normal': 1, 'low': 2 }
+
+    def __init__(self, settings: AdmissionSettings):
+
+        self.settings = settings
+
+        self._active: int = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = [] #? (priority, arrival, waiter)
+        self._arrivals = count()
+
+        self._admitted: int = 0
+        self._queued: int = 0
+        self._rejected: int = 0
+        self._timeouts: int = 0
+        self._wait_time: float = 0
+
+    def _waiting(self) -> int:
+        return sum(1 for *_, waiter in self._queue if not waiter.done())
+
+    async def acquire(self, priority: Priority) -> float:
+
+        if self._active < self.settings.max_concurrency and not self._waiting():
+
+            self._active += 1
+            self._admitted += 1
+
+            return 0
+
+        if self._waiting() >= self.settings.max_queue:
+            self._rejected += 1
+            raise AdmissionRejectedError(429, 'Too many requests waiting for this database')
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (self.PRIORITIES[priority], next(self._arrivals), waiter))
+
+        self._queued += 1
+        started = monotonic()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.settings.queue_timeout)
+        except asyncio.TimeoutError:
+
+            #? The slot may have been handed over right as the wait expired
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+
+            self._timeouts += 1
+            raise AdmissionRejectedError(503, 'Timed out waiting for a free slot on this database')
+        except BaseException:
+
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+
+            raise
+
+        waited = monotonic() - started
+
+        self._admitted += 1
+        self._wait_time += waited
+
+        return waited
+
+    def release(self) -> None:
+
+        #? The slot passes straight to the most urgent waiter, so the active count never drops in between
+        while self._queue:
+
+            *_, waiter = heapq.heappop(self._queue)
+
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+
+        return {
+            "active": self._active,
+            "queued": self._waiting(),
+            "max_concurrency": self.settings.max_concurrency,
+            "max_queue": self.settings.max_queue,
+            "admitted": self._admitted,
+            "waits": self._queued,
+            "wait_time": round(self._wait_time, 6),
+            "rejected": self._rejected,
+            "timeouts": self._timeouts
+        }
+
+class Admission():
+
+    def __init__(self, settings: AdmissionSettings):
+
+        self.settings = settings
+        self._gates: Dict[PoolKey, Gate] = {}
+
+    @asynccontextmanager
+    async def admit(self, key: PoolKey, priority: Priority = 'normal') -> AsyncIterator[None]:
+
+        if self.settings.max_concurrency <= 0:
+            yield
+            return
+
+        gate = self._gates.get(key)
+
+        if gate is None:
+            gate = self._gates[key] = Gate(self.settings)
+
+        try:
+            with Timings.phase('queue'):
+                waited = await gate.acquire(priority)
+        except AdmissionRejectedError as error:
+            metrics.increment('pysql_admission_rejected_total', status=str(error.status), priority=priority)
+            raise
+
+        metrics.observe('pysql_admission_wait_seconds', waited, priority=priority)
+
+        try:
+            yield
+        finally:
+            gate.release()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{ **key.describe(), **gate.stats() } for key, gate in self._gates.items()]
+
+admission: Admission = Admission(settings.admission)
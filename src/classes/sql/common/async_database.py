@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pyodbc import Cursor
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Callable, List, Dict, Optional, Tuple, TypeVar
+from src.classes.sql.common.database import Database
+from src.classes.sql.common.SQLClasses import *
+from src.classes.sql.types import Row, Data
+from src.classes.formats import RowFormats
+from src.classes.sql.common.batch import Batch, BatchError
+from src.classes.sql.common.pool import PoolKey
+from src.classes.sql.common.admission import admission
+from src.classes.settings import settings
+from src.types.params import Priority
+
+Result = TypeVar('Result')
+
+executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=settings.executor.max_workers,
+    thread_name_prefix='pysql-db'
+)
+
+class AsyncDatabase():
+
+    _database: Database
+
+    def __init__(self, factory: Callable[[], Database], key: Optional[PoolKey] = None, priority: Priority = 'normal'):
+
+        self._factory = factory
+        self._key = key #? Admission is skipped without a key
+        self._priority: Priority = priority
+        self._admission = AsyncExitStack()
+        self.timeout: Optional[float] = None #? Seconds before the statement is cancelled from the event loop
+
+    @staticmethod
+    async def _run(func: Callable[..., Result], *args: Any) -> Result:
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context() #? Executor threads do not inherit it, the request timings would miss every phase
+
+        return await loop.run_in_executor(executor, partial(context.run, func, *args))
+
+    @staticmethod
+    def _fetch_rows(cursor: Cursor) -> List[Row]:
+        return [tuple(row) for row in cursor.fetchall()] if cursor.description else []
+
+    async def __aenter__(self) -> 'AsyncDatabase':
+
+        if self._key is not None:
+            await self._admission.enter_async_context(admission.admit(self._key, self._priority))
+
+        try:
+            self._database = await self._run(self._factory)
+        except BaseException:
+            await self._admission.aclose()
+            raise
+
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+
+        database = self.__dict__.pop('_database', None)
+
+        try:
+            if database is not None:
+                await self._run(database.close)
+        finally:
+            await self._admission.aclose()
+
+    async def fetch(self, query: str, vars: List[Any]|tuple = ()) -> List[Row]:
+        return await self._run(lambda: self._fetch_rows(self._database.execute(query, *([vars] if vars else []))))
+
+    async def _bulk_rows(self, query: BulkInsertQuery, chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[List[str], List[Row]]]:
+
+        columns = query.columns
+
+        if query.format == 'ndjson':
+
+            async for records in RowFormats.ndjson_rows(chunks):
+
+                columns = columns or list(records[0].keys())
+
+                yield columns, [tuple(record.get(column) for column in columns) for record in records]
+
+            return
+
+        header_pending = query.header
+
+        async for rows in RowFormats.csv_rows(chunks):
+
+            if header_pending:
+                header_pending = False
+                columns = columns or rows[0]
+                rows = rows[1:]
+
+            #? Empty CSV fields load as NULL, like COPY does on Postgres
+            yield columns, [tuple(value if value != '' else None for value in row) for row in rows]
+
+    async def bulk_insert(self, query: BulkInsertQuery, chunks: AsyncIterator[bytes]) -> int:
+
+        chunk_size = settings.bulk.chunk_size
+        pending: List[Row] = []
+        columns: List[str] = query.columns
+        loaded = 0
+
+        #? The whole load commits at once, the pool rolls back on failure
+        await self._run(self._database.begin)
+
+        async for columns, rows in self._bulk_rows(query, chunks):
+
+            pending.extend(rows)
+
+            while len(pending) >= chunk_size:
+                loaded += await self._run(self._database.bulk_insert, query, columns, pending[:chunk_size])
+                del pending[:chunk_size]
+
+        if pending:
+            loaded += await self._run(self._database.bulk_insert, query, columns, pending)
+
+        await self._run(self._database.commit)
+
+        return loaded
+
+    async def tables(self, schema: SchemaBody) -> List[Row]:
+        return [(table,) for table in await self._run(self._database.tables, schema)]
+
+    async def columns(self, query: ColumnsQuery) -> List[Dict[str, str]]:
+        return await self._run(self._database.columns, query)
+
+    async def schema(self, schema: SchemaBody) -> Dict[str, Any]:
+        return await self._run(self._database.schema, schema)
+
+    async def cancel(self) -> None:
+
+        #? Called from the event loop while the statement runs on an executor thread
+        self._database.cancel()
+
+    async def select(self, query: SelectQuery) -> Data:
+        return await self._run(self._database.select, query)
+
+    async def select_rows(self, query: SelectQuery) -> Tuple[List[str], List[Row]]:
+        return await self._run(self._database.select_rows, query)
+
+    async def stream(self, query: SelectQuery, batch_size: int = settings.stream.batch_size) -> AsyncIterator[Tuple[List[str], List[Row]]]:
+
+        batches = self._database.stream(query, batch_size)
+
+        #? Each batch is pulled on an executor thread, the generator itself never blocks the loop
+        try:
+            while (batch := await self._run(next, batches, None)) is not None:
+                yield batch
+        finally:
+            await self._run(batches.close)
+
+    async def explain(self, query: SelectQuery) -> Any:
+        return await self._run(self._database.explain, query)
+
+    async def insert(self, query: InsertQuery) -> List[Row]:
+        return await self._run(lambda: self._fetch_rows(self._database.insert(query)))
+
+    async def update(self, query: UpdateQuery) -> List[Row]:
+        return await self._run(lambda: self._fetch_rows(self._database.update(query)))
+
+    async def delete(self, query: DeleteQuery) -> List[Row]:
+        return await self._run(lambda: self._fetch_rows(self._database.delete(query)))
+
+    async def upsert(self, query: UpsertQuery) -> List[Row]:
+
+        answer: List[Row] = []
+
+        await self._run(self._database.begin)
+
+        for rows in query.chunks(max(1, min(settings.bulk.chunk_size, self._database.MAX_PARAMS // len(query.columns)))):
+            answer.extend(await self._run(lambda: self._fetch_rows(self._database.upsert(query, rows))))
+
+        await self._run(self._database.commit)
+
+        return answer
+
+    async def _bulk_apply(self, apply: Callable[[Any, List[Dict[str, Any]]], int], query: KeyedRows) -> int:
+
+        #? Chunks stay under the parameter limit of a single statement
+        chunk_size = max(1, min(settings.bulk.chunk_size, self._database.MAX_PARAMS // len(query.rows[0])))
+        affected = 0
+
+        await self._run(self._database.begin)
+
+        for rows in query.chunks(chunk_size):
+            affected += await self._run(apply, query, rows)
+
+        await self._run(self._database.commit)
+
+        return affected
+
+    async def bulk_update(self, query: BulkUpdateQuery) -> int:
+        return await self._bulk_apply(self._database.bulk_update, query)
+
+    async def bulk_delete(self, query: BulkDeleteQuery) -> int:
+        return await self._bulk_apply(self._database.bulk_delete, query)
+
+    async def call(self, query: ExecQuery):
+        await self._run(lambda: self._fetch_rows(self._database.procedure(query)))
+
+    async def perform(self, query: FuncQuery) -> List[Row]:
+        return await self._run(lambda: self._fetch_rows(self._database.perform(query)))
+
+    async def batch(self, query: BatchQuery) -> List[Any]:
+
+        if not query.transaction:
+            return await Batch.run(self, query.items)
+
+        #? The pool rolls back on release when the commit is never reached
+        await self._run(self._database.begin)
+
+        try:
+            results = await Batch.run(self, query.items)
+        except BatchError as error:
+            error.results = []
+            raise
+
+        await self._run(self._database.commit)
+
+        return results
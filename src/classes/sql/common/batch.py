@@ -0,0 +1,27 @@
+from typing import Any, List
+from src.classes.sql.common.SQLClasses import BatchItem
+
+class BatchError(Exception):
+
+    def __init__(self, index: int, error: Exception, results: List[Any]):
+
+        super().__init__(f'Batch item {index} failed: {error}')
+
+        self.index = index
+        self.results = results #? Items that already ran, empty when they were rolled back
+
+class Batch():
+
+    @staticmethod
+    async def run(db: Any, items: List[BatchItem]) -> List[Any]:
+
+        results: List[Any] = []
+
+        for index, item in enumerate(items):
+
+            try:
+                results.append(await getattr(db, item.kind)(item.query))
+            except Exception as error:
+                raise BatchError(index, error, results) from error
+
+        return results
@@ -0,0 +1,72 @@
+import asyncio
+from time import monotonic
+from typing import Any, Awaitable, Callable, Literal, Optional, TypeVar
+from src.classes.settings import settings
+
+T = TypeVar('T')
+
+CancelReason = Literal['timeout', 'disconnected']
+
+class QueryCancelledError(Exception):
+
+    def __init__(self, reason: CancelReason):
+
+        super().__init__('Statement timed out' if reason == 'timeout' else 'Client disconnected')
+
+        self.reason = reason
+
+class Cancellation():
+
+    @staticmethod
+    async def run(
+        work: Awaitable[T],
+        cancel: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+        abandoned: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> T:
+
+        task = asyncio.ensure_future(work)
+        deadline = monotonic() + timeout if timeout else None
+
+        while True:
+
+            poll = settings.timeout.disconnect_poll
+
+            if deadline is not None:
+                poll = max(min(poll, deadline - monotonic()), 0)
+
+            try:
+                done, _ = await asyncio.wait({ task }, timeout=poll)
+            except asyncio.CancelledError:
+
+                #? The caller itself was cancelled, the statement must not keep running behind it
+                await Cancellation._stop(task, cancel)
+                raise
+
+            if done:
+                return task.result()
+
+            if deadline is not None and monotonic() >= deadline:
+                reason: CancelReason = 'timeout'
+            elif abandoned is not None and await abandoned():
+                reason = 'disconnected'
+            else:
+                continue
+
+            await Cancellation._stop(task, cancel)
+
+            raise QueryCancelledError(reason)
+
+    @staticmethod
+    async def _stop(task: asyncio.Future, cancel: Callable[[], Awaitable[Any]]) -> None:
+
+        #? The server stops the statement, the task then fails and releases its connection cleanly
+        try:
+            await cancel()
+        except Exception:
+            task.cancel()
+
+        try:
+            await task
+        except BaseException:
+            pass
@@ -0,0 +1,268 @@
+from itertools import chain
+from typing import Any, Dict, List, Tuple
+from src.classes.sql.common.SQLClasses import Column, DeleteQuery, Having, InsertQuery, Offset, SchematicObject, Seek, SelectQuery, UpdateQuery, Where
+from src.classes.sql.common.query_cache import QueryShape, query_cache
+from src.classes.metrics import Timings
+from src.types.params import Engine
+
+Compiled = Tuple[str, List[Any]]
+
+class Dialect():
+
+    NAME: Engine
+    PLACEHOLDER: str
+
+    #region Names
+
+    @staticmethod
+    def table(schematic_object: SchematicObject) -> str:
+        return f"{f'{schematic_object.sql_schema}.' if schematic_object.sql_schema else ''}{schematic_object.name}"
+
+    @staticmethod
+    def column(column: Column) -> str:
+
+        #? Columns may carry expressions like count(*), so names are emitted as given, never quoted
+        return f'{column.name} as {column.rename}' if column.rename else column.name
+
+    def columns(self, columns: List[Column]) -> str:
+        return ', '.join(self.column(column) for column in columns)
+
+    def placeholders(self, count: int) -> str:
+        return ', '.join([self.PLACEHOLDER] * count)
+
+    #region Keyset
+
+    def seek(self, seek: Seek) -> str: ...
+
+    def seek_params(self, values: List[Any]) -> List[Any]:
+        return values
+
+    #region Pagination
+
+    def limit(self) -> str: ...
+
+    def offset(self, offset: Offset, ordered: bool) -> str: ...
+
+    def offset_params(self, offset: Offset) -> List[Any]: ...
+
+    #region Returning
+
+    def output(self, columns: List[Column]) -> str:
+        return '' #? Clause between the target and the values or conditions
+
+    def returning(self, columns: List[Column]) -> str:
+        return '' #? Clause closing the statement
+
+class PostgresDialect(Dialect):
+
+    NAME: Engine = 'postgres'
+    PLACEHOLDER: str = '%s'
+
+    def seek(self, seek: Seek) -> str:
+
+        keys = ', '.join(column.name for column in seek.columns)
+
+        return f"({keys}) {'<' if seek.desc else '>'} ({self.placeholders(len(seek.columns))})"
+
+    def limit(self) -> str:
+        return 'LIMIT %s'
+
+    def offset(self, offset: Offset, ordered: bool) -> str:
+        return 'LIMIT %s OFFSET %s' if offset.max_row else 'OFFSET %s'
+
+    def offset_params(self, offset: Offset) -> List[Any]:
+        return [offset.max_row, offset.min_row] if offset.max_row else [offset.min_row]
+
+    def returning(self, columns: List[Column]) -> str:
+        return f'RETURNING {self.columns(columns)}' if columns else ''
+
+class SQLServerDialect(Dialect):
+
+    NAME: Engine = 'sqlserver'
+    PLACEHOLDER: str = '?'
+
+    def seek(self, seek: Seek) -> str:
+
+        #? No row-value comparison here, (a, b) > (x, y) expands to a > x or (a = x and b > y)
+        comparation = '<' if seek.desc else '>'
+        branches: List[str] = []
+
+        for i, column in enumerate(seek.columns):
+
+            equals = [f'{previous.name} = ?' for previous in seek.columns[:i]]
+            branches.append(f"({' and '.join([*equals, f'{column.name} {comparation} ?'])})")
+
+        return f"({' or '.join(branches)})"
+
+    def seek_params(self, values: List[Any]) -> List[Any]:
+        return [value for i in range(len(values)) for value in values[:i + 1]]
+
+    def limit(self) -> str:
+        return 'offset 0 rows fetch next ? rows only'
+
+    def offset(self, offset: Offset, ordered: bool) -> str:
+
+        #? OFFSET needs an ORDER BY, ordering by a constant keeps the table order
+        order = '' if ordered else 'order by (select null) '
+
+        return f"{order}offset ? rows{' fetch next ? rows only' if offset.max_row else ''}"
+
+    def offset_params(self, offset: Offset) -> List[Any]:
+        return [offset.min_row, offset.max_row] if offset.max_row else [offset.min_row]
+
+    def output(self, columns: List[Column]) -> str:
+        return f"output {', '.join(f'inserted.{self.column(column)}' for column in columns)}" if columns else ''
+
+class QueryCompiler():
+
+    def __init__(self, dialect: Dialect):
+        self.dialect = dialect
+
+    def _conditions(self, wheres: List[Where]|List[Having]) -> str:
+
+        last = len(wheres) - 1
+
+        return ' '.join(
+            f"{where.to_column.name} {where.comparation} {self.dialect.PLACEHOLDER}{f' {where.joiner}' if i < last else ''}"
+            for i, where in enumerate(wheres)
+        )
+
+    #region Builders
+
+    def _build_select(self, query: SelectQuery) -> str:
+
+        dialect = self.dialect
+        seek_after = query.seek is not None and query.seek.after is not None
+
+        clauses: List[str] = [
+            f"SELECT {dialect.columns(query.columns) if query.columns else '*'}",
+            f"FROM {dialect.table(query.table)} {query.table.subname or ''}".rstrip(),
+            *(join.Get().strip() for join in query.join)
+        ]
+
+        conditions = [f'({self._conditions(query.where)})'] if query.where else []
+
+        if seek_after:
+            conditions.append(dialect.seek(query.seek))
+
+        if conditions:
+            clauses.append(f"WHERE {' AND '.join(conditions)}")
+
+        if query.group_by:
+            clauses.append(f'GROUP BY {dialect.columns(query.group_by.columns)}')
+
+        if query.having:
+            clauses.append(f'HAVING {self._conditions(query.having)}')
+
+        #? Keyset pages order by their key, explicit ordering and offsets only apply without one
+        if query.seek:
+
+            direction = 'DESC' if query.seek.desc else 'ASC'
+
+            clauses.append(f"ORDER BY {', '.join(f'{column.name} {direction}' for column in query.seek.columns)}")
+            clauses.append(dialect.limit())
+
+        else:
+
+            if query.order_by:
+                clauses.append(f"ORDER BY {dialect.columns(query.order_by.columns)} {'DESC' if query.order_by.desc else 'ASC'}")
+
+            if query.offset:
+                clauses.append(dialect.offset(query.offset, query.order_by is not None))
+
+        return '\n'.join(clauses)
+
+    def _build_insert(self, query: InsertQuery) -> str:
+
+        dialect = self.dialect
+        columns = f" ({', '.join(query.columns)})" if query.columns else ''
+        row = f'({dialect.placeholders(len(query.values[0]) if query.values else 0)})' #? Every row takes the width of the first, as in the shape key
+
+        clauses: List[str] = [
+            f'INSERT INTO {dialect.table(query.table)}{columns}',
+            dialect.output(query.output),
+            'VALUES ' + ', '.join(row for _ in query.values),
+            dialect.returning(query.output)
+        ]
+
+        return '\n'.join(filter(None, clauses))
+
+    def _build_update(self, query: UpdateQuery) -> str:
+
+        dialect = self.dialect
+
+        clauses: List[str] = [
+            f'UPDATE {dialect.table(query.table)}',
+            f"SET {', '.join(f'{column} = {dialect.PLACEHOLDER}' for column in query.column_values)}",
+            dialect.output(query.output),
+            f'WHERE {self._conditions(query.where)}' if query.where else '',
+            dialect.returning(query.output)
+        ]
+
+        return '\n'.join(filter(None, clauses))
+
+    def _build_delete(self, query: DeleteQuery) -> str:
+
+        clauses: List[str] = [
+            f'DELETE FROM {self.dialect.table(query.table)}',
+            f'WHERE {self._conditions(query.conditions)}' if query.conditions else ''
+        ]
+
+        return '\n'.join(filter(None, clauses))
+
+    #region Compiled statements
+
+    #? Text is built once per query shape and dialect, only the parameters are rebuilt per call
+
+    def select_params(self, query: SelectQuery) -> List[Any]:
+
+        params = [where.value for where in query.where]
+
+        if query.seek is not None and query.seek.after is not None:
+            params.extend(self.dialect.seek_params(query.seek.values()))
+
+        params.extend(having.value for having in query.having)
+
+        if query.seek:
+            params.append(query.seek.size)
+        elif query.offset:
+            params.extend(self.dialect.offset_params(query.offset))
+
+        return params
+
+    def select(self, query: SelectQuery) -> Compiled:
+
+        with Timings.phase('compile'):
+
+            request = query_cache.get((self.dialect.NAME, *QueryShape.select(query)), lambda: self._build_select(query))
+
+            return request, self.select_params(query)
+
+    def insert(self, query: InsertQuery) -> Compiled:
+
+        with Timings.phase('compile'):
+
+            request = query_cache.get((self.dialect.NAME, *QueryShape.insert(query)), lambda: self._build_insert(query))
+
+            return request, list(chain(*query.values))
+
+    def update(self, query: UpdateQuery) -> Compiled:
+
+        with Timings.phase('compile'):
+
+            request = query_cache.get((self.dialect.NAME, *QueryShape.update(query)), lambda: self._build_update(query))
+
+            return request, QueryShape.update_params(query)
+
+    def delete(self, query: DeleteQuery) -> Compiled:
+
+        with Timings.phase('compile'):
+
+            request = query_cache.get((self.dialect.NAME, *QueryShape.delete(query)), lambda: self._build_delete(query))
+
+            return request, QueryShape.delete_params(query)
+
+compilers: Dict[Engine, QueryCompiler] = {
+    'postgres': QueryCompiler(PostgresDialect()),
+    'sqlserver': QueryCompiler(SQLServerDialect())
+}
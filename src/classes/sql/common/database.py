@@ -1,52 +1,130 @@
 import pyodbc
+from math import ceil
 from pyodbc import Connection, Cursor, connect
-from typing import Any, List, Dict
+from typing import Any, Iterator, List, Dict, Tuple
 from src.classes.sql.common.SQLClasses import *
 from src.types.params import ListOrTuple
-from src.classes.sql.types import Data, ProcedureParams
+from src.classes.sql.types import Data, ProcedureParams, Row
+from src.classes.sql.common.pool import ConnectionPool, PoolKey, pools
+from src.classes.settings import PoolSettings, settings
+from src.classes.sql.common.cancellation import QueryCancelledError
+from src.classes.metrics import Timings
+
+class ODBCPool(ConnectionPool[Connection]):
+
+    def __init__(self, pool_settings: PoolSettings, connection_string: str):
+        
+        super().__init__(pool_settings)
+        
+        self._connection_string = connection_string
+    
+    def _connect(self) -> Connection:
+        return connect(self._connection_string, autocommit=True)
+    
+    def _close(self, connection: Connection) -> None:
+        connection.close()
+    
+    def _is_closed(self, connection: Connection) -> bool:
+        return bool(getattr(connection, 'closed', False))
+    
+    def _ping(self, connection: Connection) -> bool:
+        
+        connection.execute('SELECT 1').fetchall()
+        
+        return True
+    
+    def _reset(self, connection: Connection) -> bool:
+        
+        if not connection.autocommit:
+            connection.rollback()
+            connection.autocommit = True
+        
+        connection.timeout = 0
+        
+        #? A cached cursor left mid-result by an abandoned stream would keep a non-MARS connection busy, draining keeps it prepared
+        for cursor in self.statements(connection).handles():
+            
+            cursor.cancel()
+            
+            while cursor.nextset():
+                pass
+        
+        return True
+    
+    def _unprepare(self, connection: Connection, handle: Cursor) -> None:
+        handle.close()
 
 class Database():
 
     _connection: Connection
+    _pool: ODBCPool
+    
+    MAX_PARAMS: int = 2000 #? SQL Server takes 2100 parameters per statement
 
     def __init__(self, config: DbConfig, driver: str, autocommit: bool = True):
         
-        self._connection = connect(
-            f'DRIVER={driver};'
-            f'SERVER={config.server};'
-            f'DATABASE={config.database};'
-            f'UID={config.uid};'
-            f'PWD={config.pwd};'
-            f'Encrypt={config.encrypt};'
-            f'TrustServerCertificate=true;'
-            'Connection Timeout=60;',
-            autocommit=autocommit
+        self._pool = pools.get(
+            PoolKey.from_config(driver, config),
+            lambda: ODBCPool(
+                settings.pool,
+                f'DRIVER={driver};'
+                f'SERVER={config.server};'
+                f'DATABASE={config.database};'
+                f'UID={config.uid};'
+                f'PWD={config.pwd};'
+                f'Encrypt={config.encrypt};'
+                f'TrustServerCertificate=true;'
+                'Connection Timeout=60;'
+            )
         )
+        
+        with Timings.phase('connect'):
+            self._connection = self._pool.acquire()
+        
+        self._cursor: Cursor|None = None
+        
+        #? Query timeout in whole seconds for every statement on the connection, 0 waits forever so fractions round up
+        self._connection.timeout = ceil(config.statement_timeout or settings.timeout.statement)
+        
+        if not autocommit:
+            self._connection.autocommit = False
     
-    @staticmethod
-    def _serialize_rows(cursor: Cursor) -> List[Dict]:
-        column_names = [column[0] for column in cursor.description]
-
-        result = [dict(zip(column_names, row)) for row in cursor.fetchall()]
-
-        return result
+    def __enter__(self) -> 'Database':
+        return self
     
-    def _where_to_text(self, where: Where) -> str:
-        return f"{where.to_column.name} {where.comparation} ?"
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
     
-    def _wheres_to_text(self, wheres: List[Where]|List[Having], params: List[Any]) -> str:
+    def close(self) -> None:
         
-        text: str = ''
+        connection = self.__dict__.pop('_connection', None)
+        cursor, self._cursor = self._cursor, None
         
-        cantity = len(wheres)
+        if connection is not None:
             
-        for i in range(cantity):
-            where = wheres[i]
+            #? Cached cursors are drained by the pool, a one-off cursor still holding rows is dropped before the connection is shared
+            if cursor is not None and cursor not in self._pool.statements(connection).handles():
+                
+                try:
+                    cursor.close()
+                except pyodbc.Error:
+                    pass
             
-            text += f" {self._where_to_text(where)} {where.joiner if i < cantity-1 else ''}"
-            params.append(where.value)
-        
-        return text
+            self._pool.release(connection)
+    
+    @staticmethod
+    def _serialize_rows(cursor: Cursor) -> List[Dict]:
+        column_names = [column[0] for column in cursor.description]
+
+        with Timings.phase('fetch'):
+            rows = cursor.fetchall()
+
+        Timings.count_rows(len(rows))
+
+        with Timings.phase('serialize'):
+            result = [dict(zip(column_names, row)) for row in rows]
+
+        return result
     
     @staticmethod
     def _dump_column(column: Column) -> str:
@@ -69,24 +147,90 @@ class Database():
         
         return f"{f'{table.sql_schema}.' if table.sql_schema else ''}{table.name}" 
 
+    def begin(self):
+        self._connection.autocommit = False
+
     def commit(self):
         self._connection.commit()
 
     def execute(self, query: str, *params: list[Any]|tuple[Any]) -> Cursor:
-        cursor = self._connection.execute(query, *params)
+        
+        statements = self._pool.statements(self._connection)
+        
+        #? pyodbc keeps the prepared handle while a cursor re-executes the same text
+        cursor = statements.get(query)
+        
+        if cursor is None:
+            cursor = self._connection.cursor()
+            
+            if statements.is_hot(query):
+                statements.add(query, cursor)
+        
+        self._cursor = cursor
+        
+        try:
+            with Timings.phase('execute'):
+                cursor.execute(query, *params)
+        except pyodbc.Error as error:
+            
+            #? HYT00 is the query timeout, HY008 a statement cancelled from another thread
+            if error.args and error.args[0] in ('HYT00', 'HY008'):
+                raise QueryCancelledError('timeout') from error
+            
+            raise
 
         return cursor
     
-    def tables(self) -> list[str]: ...
+    def cancel(self) -> None:
+        
+        if self._cursor is not None:
+            self._cursor.cancel()
+    
+    def bulk_insert(self, query: BulkInsertQuery, columns: List[str], rows: List[ListOrTuple]) -> int:
+        
+        cursor = self._connection.cursor()
+        cursor.fast_executemany = True
+        
+        #? Without named columns the rows fill the table columns in order
+        target = f" ({', '.join(columns)})" if columns else ''
+        width = len(columns) or len(rows[0])
+        
+        try:
+            cursor.executemany(
+                f"insert into {self._dump_table(query.table)}{target} values ({', '.join('?' for _ in range(width))})",
+                rows
+            )
+        finally:
+            cursor.close()
+        
+        return len(rows)
+    
+    def tables(self, schema: SchemaBody) -> list[str]: ...
     
     def columns(self, query: ColumnsQuery) -> List[Dict[str, str]]: ...
     
+    def schema(self, schema: SchemaBody) -> Dict[str, Any]: ...
+    
     def select(self, query: SelectQuery) -> Data: ...
     
+    def select_rows(self, query: SelectQuery) -> Tuple[List[str], List[Row]]: ...
+    
+    def stream(self, query: SelectQuery, batch_size: int) -> Iterator[Tuple[List[str], List[Row]]]: ...
+    
+    def explain(self, query: SelectQuery) -> Any: ...
+    
     def insert(self, query: InsertQuery) -> Cursor: ...
     
     def update(self, query: UpdateQuery) -> Cursor: ...
     
+    def upsert(self, query: UpsertQuery, rows: List[ListOrTuple]) -> Cursor: ...
+    
+    def bulk_update(self, query: BulkUpdateQuery, rows: List[Dict[str, Any]]) -> int: ...
+    
     def delete(self, query: DeleteQuery) -> Cursor: ...
     
-    def procedure(self, query: ExecQuery) -> Cursor: ...
\ No newline at end of file
+    def bulk_delete(self, query: BulkDeleteQuery, rows: List[Dict[str, Any]]) -> int: ...
+    
+    def procedure(self, query: ExecQuery) -> Cursor: ...
+    
+    def perform(self, query: FuncQuery) -> Cursor: ...
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+from time import perf_counter
+from typing import Any, AsyncIterator, Dict, List, Optional
+from src.classes.formats import RowFormats
+from src.classes.sql.common.SQLClasses import DbConfig, FanoutQuery, SelectQuery
+from src.classes.sql.common.cancellation import Cancellation, QueryCancelledError
+from src.classes.sql.async_postgres import AsyncPostgres
+from src.classes.settings import FanoutSettings, settings
+
+class Fanout():
+
+    def __init__(self, settings: FanoutSettings):
+        self.settings = settings
+
+    @staticmethod
+    def source(config: DbConfig) -> str:
+        return f'{config.server}/{config.database}'
+
+    async def _target(self, index: int, query: SelectQuery, config: DbConfig, timeout: Optional[float], batch_size: int, workers: asyncio.Semaphore, lines: asyncio.Queue) -> None:
+
+        source = self.source(config)
+        summary: Dict[str, Any] = { "target": index, "source": source, "status": "ok", "rows": 0 }
+
+        connection: Optional[AsyncPostgres] = None
+
+        async def pump() -> None:
+
+            nonlocal connection
+
+            async with AsyncPostgres(config=config, priority='low', pinned=False) as db:
+
+                connection = db
+
+                async for columns, rows in db.stream(query, batch_size):
+
+                    summary["rows"] += len(rows)
+
+                    await lines.put(b''.join(
+                        RowFormats.json_bytes({ "target": index, "source": source, "row": dict(zip(columns, row)) }) + b'\n'
+                        for row in rows
+                    ))
+
+        async def cancel() -> None:
+
+            #? Before a connection is up there is no statement to cancel, the wait itself is dropped
+            if connection is None:
+                raise QueryCancelledError('timeout')
+
+            await connection.cancel()
+
+        started = perf_counter()
+
+        try:
+            async with workers:
+                await Cancellation.run(pump(), cancel, timeout)
+        except QueryCancelledError as error:
+            summary.update(status=error.reason, error=str(error))
+        except Exception as error:
+            summary.update(status='failed', error=str(error))
+
+        summary["elapsed"] = round(perf_counter() - started, 6)
+
+        #? One summary per target, after its rows, so partial failures are reported in the same stream
+        await lines.put(RowFormats.json_bytes(summary) + b'\n')
+
+    async def run(self, fanout: FanoutQuery, batch_size: int) -> AsyncIterator[bytes]:
+
+        timeout = fanout.timeout or self.settings.timeout or None
+        workers = asyncio.Semaphore(self.settings.concurrency)
+        lines: asyncio.Queue = asyncio.Queue(self.settings.buffer)
+
+        tasks: List[asyncio.Task] = [
+            asyncio.create_task(self._target(index, fanout.query, config, timeout, batch_size, workers, lines))
+            for index, config in enumerate(fanout.targets)
+        ]
+
+        done = asyncio.gather(*tasks)
+
+        try:
+            while not (done.done() and lines.empty()):
+
+                getter = asyncio.ensure_future(lines.get())
+
+                await asyncio.wait({ getter, done }, return_when=asyncio.FIRST_COMPLETED)
+
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+        finally:
+
+            #? A client that stops reading cancels the targets still running
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+fanout: Fanout = Fanout(settings.fanout)
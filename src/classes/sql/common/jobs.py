@@ -0,0 +1,326 @@
+import asyncio
+import os
+from time import time
+from uuid import uuid4
+from typing import Any, Dict, List, Literal, Optional
+from src.classes.formats import RowFormats, pyarrow
+from src.classes.metrics import Timings
+from src.classes.sql.common.SQLClasses import DbConfig, SelectQuery
+from src.classes.sql.common.admission import AdmissionRejectedError
+from src.classes.sql.common.pool import PoolKey
+from src.classes.sql.async_postgres import AsyncPostgres
+from src.classes.settings import JobSettings, settings
+from src.types.params import SpoolFormat
+
+JobState = Literal['queued', 'running', 'done', 'failed', 'cancelled']
+
+class Job():
+
+    def __init__(self, query: SelectQuery, config: DbConfig, spool_format: SpoolFormat, directory: str):
+
+        self.id: str = uuid4().hex
+        self.query = query
+        self.config = config
+        self.owner = Job.identity(config) #? Only the same credentials may see, download or cancel the job
+        self.format: SpoolFormat = spool_format
+        self.path = os.path.join(directory, f'{self.id}.{spool_format}')
+
+        self.state: JobState = 'queued'
+        self.error: Optional[str] = None
+        self.rows: int = 0
+        self.bytes: int = 0
+        self.created: float = time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+        self.task: Optional[asyncio.Task] = None
+        self.db: Optional[AsyncPostgres] = None #? Open connection while running, used to cancel the statement server-side
+
+    @staticmethod
+    def identity(config: DbConfig) -> PoolKey:
+        return PoolKey.from_config('jobs', config)
+
+    @property
+    def media_type(self) -> str:
+        return RowFormats.MEDIA_TYPES[self.format]
+
+    def describe(self) -> Dict[str, Any]:
+
+        return {
+            "id": self.id,
+            "state": self.state,
+            "format": self.format,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+class Jobs():
+
+    def __init__(self, settings: JobSettings):
+
+        self.settings = settings
+        self._jobs: Dict[str, Job] = {}
+        self._workers: Optional[asyncio.Semaphore] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    def _pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.state in ('queued', 'running'))
+
+    def submit(self, query: SelectQuery, config: DbConfig, spool_format: SpoolFormat) -> Job:
+
+        self.prune()
+
+        if self._pending() >= self.settings.max_pending:
+            raise AdmissionRejectedError(429, 'Too many jobs queued')
+
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(self.settings.workers)
+
+        os.makedirs(self.settings.path, exist_ok=True)
+
+        job = Job(query, config, spool_format, self.settings.path)
+
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+
+        return job
+
+    def get(self, job_id: str, owner: PoolKey) -> Optional[Job]:
+
+        self.prune()
+
+        job = self._jobs.get(job_id)
+
+        #? Someone else's job answers like a missing one, ids of other users are not confirmed
+        return job if job is not None and job.owner == owner else None
+
+    def describe(self, owner: PoolKey) -> List[Dict[str, Any]]:
+
+        self.prune()
+
+        return [job.describe() for job in self._jobs.values() if job.owner == owner]
+
+    async def _run(self, job: Job) -> None:
+
+        #? Jobs outlive the request that submitted them, their phases must not land in its timings
+        Timings.start()
+
+        async with self._workers:
+
+            job.state = 'running'
+            job.started = time()
+
+            partial = f'{job.path}.part'
+
+            try:
+                async with AsyncPostgres(config=job.config, priority='low', pinned=False) as db:
+
+                    job.db = db
+
+                    try:
+                        await self._spool(job, db.stream(job.query, settings.stream.batch_size), partial)
+                    finally:
+                        job.db = None
+
+                os.replace(partial, job.path)
+
+                job.state = 'done'
+
+            except asyncio.CancelledError:
+                job.state = 'cancelled'
+            except Exception as error:
+                job.state = 'failed'
+                job.error = str(error)
+            finally:
+
+                job.finished = time()
+
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+    async def _spool(self, job: Job, batches: Any, path: str) -> None:
+
+        async def counted():
+
+            async for columns, rows in batches:
+                job.rows += len(rows)
+                yield columns, rows
+
+        if job.format == 'arrow':
+            return await self._spool_arrow(job, counted(), path)
+
+        with open(path, 'wb') as spool:
+
+            async for chunk in RowFormats.encode(job.format, counted()):
+                await asyncio.to_thread(spool.write, chunk)
+                job.bytes += len(chunk)
+
+    async def _spool_arrow(self, job: Job, batches: Any, path: str) -> None:
+
+        writer = None
+        schema = None
+
+        try:
+            async for columns, rows in batches:
+
+                data = { column: list(values) for column, values in zip(columns, zip(*rows)) } if rows else { column: [] for column in columns }
+
+                table = pyarrow.table(data)
+
+                if writer is None:
+                    schema = table.schema
+                    writer = pyarrow.ipc.new_stream(path, schema)
+
+                elif table.schema != schema:
+
+                    #? A column that was all NULL so far is typed null, a later value widens it
+                    promoted = pyarrow.unify_schemas([schema, table.schema], promote_options='permissive')
+
+                    if promoted != schema:
+                        writer.close()
+                        writer = await asyncio.to_thread(self._promote, path, promoted)
+                        schema = promoted
+
+                    table = table.cast(schema)
+
+                await asyncio.to_thread(writer.write_table, table)
+        finally:
+
+            if writer is not None:
+                writer.close()
+
+        job.bytes = os.path.getsize(path)
+
+    @staticmethod
+    def _promote(path: str, schema: Any) -> Any:
+
+        #? The stream format fixes its schema up front, the batches already spooled are rewritten with the wider one
+        previous = f'{path}.old'
+        os.replace(path, previous)
+
+        writer = pyarrow.ipc.new_stream(path, schema)
+
+        try:
+            with pyarrow.ipc.open_stream(previous) as reader:
+
+                for batch in reader:
+                    writer.write_table(pyarrow.Table.from_batches([batch]).cast(schema))
+        except BaseException:
+            writer.close()
+            raise
+        finally:
+            os.remove(previous)
+
+        return writer
+
+    async def cancel(self, job_id: str, owner: PoolKey) -> Optional[Job]:
+
+        job = self.get(job_id, owner)
+
+        if job is None:
+            return None
+
+        return await self._cancel(job)
+
+    async def _cancel(self, job: Job) -> Job:
+
+        self._jobs.pop(job.id, None)
+
+        if job.state in ('queued', 'running'):
+
+            db = job.db
+
+            if db is not None:
+
+                try:
+                    await db.cancel()
+                except Exception:
+                    pass
+
+            job.task.cancel()
+
+            try:
+                await job.task
+            except BaseException:
+                pass
+
+            job.state = 'cancelled'
+
+        self._discard(job)
+
+        return job
+
+    @staticmethod
+    def _discard(job: Job) -> None:
+
+        if os.path.exists(job.path):
+            os.remove(job.path)
+
+    def prune(self) -> int:
+
+        expired = [
+            job for job in self._jobs.values()
+            if job.finished is not None and time() - job.finished > self.settings.ttl
+        ]
+
+        for job in expired:
+            self._discard(self._jobs.pop(job.id))
+
+        return len(expired)
+
+    def sweep(self) -> int:
+
+        owned = {os.path.basename(job.path) for job in self._jobs.values()}
+        removed = 0
+
+        try:
+            names = os.listdir(self.settings.path)
+        except FileNotFoundError:
+            return 0
+
+        for name in names:
+
+            path = os.path.join(self.settings.path, name)
+
+            if name.removesuffix('.part') in owned:
+                continue
+
+            #? Other processes may spool to the same directory, their files are only removed once they would have expired
+            try:
+                if time() - os.path.getmtime(path) > self.settings.ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+
+        return removed
+
+    def start(self) -> None:
+
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+
+        #? Results expire even when nobody calls the jobs endpoints, and files left by a restart are cleared
+        while True:
+
+            self.prune()
+            self.sweep()
+
+            await asyncio.sleep(self.settings.reap_interval)
+
+    async def close(self) -> None:
+
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+        for job in list(self._jobs.values()):
+            await self._cancel(job)
+
+jobs: Jobs = Jobs(settings.jobs)
@@ -0,0 +1,38 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any, List, Optional
+from src.classes.formats import RowFormats
+from src.classes.sql.types import Data
+
+class Keyset():
+
+    @staticmethod
+    def encode(values: List[Any]) -> str:
+
+        payload = json.dumps(values, default=RowFormats.json_default, separators=(',', ':'))
+
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode(token: str) -> List[Any]:
+
+        try:
+            values = json.loads(urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        except ValueError:
+            raise ValueError('Invalid continuation token')
+
+        if not isinstance(values, list):
+            raise ValueError('Invalid continuation token')
+
+        return values
+
+    @staticmethod
+    def next_token(keys: List[str], size: int, rows: Data, columns: Optional[List[str]] = None) -> Optional[str]:
+
+        #? A short page is the last one
+        if len(rows) < size:
+            return None
+
+        last = rows[-1] if columns is None else dict(zip(columns, rows[-1]))
+
+        return Keyset.encode([last[key] for key in keys])
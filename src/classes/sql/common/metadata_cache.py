@@ -0,0 +1,146 @@
+import hashlib
+import json
+from collections import OrderedDict
+from time import monotonic
+from threading import Lock
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.common.pool import PoolKey
+from src.classes.settings import settings
+
+class MetadataKey(NamedTuple):
+
+    identity: PoolKey
+    kind: str
+    sql_schema: str
+    table: Optional[str] = None #? None for entries covering the whole schema
+    detail: str = ''
+
+class MetadataEntry(NamedTuple):
+
+    value: Any
+    etag: str
+    expires: float
+
+class MetadataCache():
+
+    def __init__(self, ttl: float, max_size: int):
+
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = Lock()
+        self._entries: OrderedDict[MetadataKey, MetadataEntry] = OrderedDict()
+        self._hits: int = 0
+        self._misses: int = 0
+        self._not_modified: int = 0
+        self._invalidations: int = 0
+
+    @staticmethod
+    def identity(config: DbConfig) -> PoolKey:
+        return PoolKey.from_config('metadata', config)
+
+    @staticmethod
+    def _etag(value: Any) -> str:
+
+        payload = json.dumps(value, default=str, sort_keys=True, separators=(',', ':'))
+
+        return f'"{hashlib.sha1(payload.encode()).hexdigest()}"'
+
+    def get(self, key: MetadataKey) -> Optional[MetadataEntry]:
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is None or entry.expires <= monotonic():
+
+                if entry is not None:
+                    del self._entries[key]
+
+                self._misses += 1
+
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+            return entry
+
+    def set(self, key: MetadataKey, value: Any) -> MetadataEntry:
+
+        value = jsonable_encoder(value)
+        entry = MetadataEntry(value, self._etag(value), monotonic() + self.ttl)
+
+        with self._lock:
+
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return entry
+
+    async def load(self, key: MetadataKey, loader: Callable[[], Awaitable[Any]]) -> MetadataEntry:
+
+        entry = self.get(key)
+
+        if entry is None:
+            entry = self.set(key, await loader())
+
+        return entry
+
+    def invalidate(self, identity: PoolKey, sql_schema: Optional[str] = None, table: Optional[str] = None) -> int:
+
+        with self._lock:
+
+            stale = [
+                key for key in self._entries.keys()
+                if key.identity == identity
+                and (sql_schema is None or key.sql_schema == sql_schema)
+                and (table is None or key.table in (table, None)) #? Schema-wide entries list the table too
+            ]
+
+            for key in stale:
+                del self._entries[key]
+
+            self._invalidations += len(stale)
+
+        return len(stale)
+
+    def respond(self, request: Request, entry: MetadataEntry) -> Response:
+
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f'private, max-age={max(int(entry.expires - monotonic()), 0)}'
+        }
+
+        if_none_match = request.headers.get('if-none-match', '')
+
+        if if_none_match.strip() == '*' or entry.etag in [tag.strip() for tag in if_none_match.split(',')]:
+
+            with self._lock:
+                self._not_modified += 1
+
+            return Response(status_code=304, headers=headers)
+
+        return JSONResponse(content=entry.value, headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "not_modified": self._not_modified,
+                "invalidations": self._invalidations
+            }
+
+metadata_cache: MetadataCache = MetadataCache(settings.metadata.ttl, settings.metadata.max_size)
@@ -0,0 +1,395 @@
+import asyncio
+import hashlib
+import inspect
+from time import monotonic
+from threading import Condition, Lock
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Generic, List, NamedTuple, Optional, Protocol, Tuple, TypeVar
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.common.statement_cache import StatementCache
+from src.classes.settings import PoolSettings, StatementSettings, settings as app_settings
+
+TConnection = TypeVar('TConnection')
+
+class PoolTimeoutError(Exception):
+    pass
+
+class PoolKey(NamedTuple):
+
+    engine: str
+    server: str
+    database: str
+    uid: str
+    encrypt: str
+    secret: str #? Digest of the password, so different credentials never share a pool
+
+    @staticmethod
+    def from_config(engine: str, config: DbConfig) -> 'PoolKey':
+
+        return PoolKey(
+            engine=engine,
+            server=config.server,
+            database=config.database,
+            uid=config.uid,
+            encrypt=config.encrypt,
+            secret=hashlib.sha256(config.pwd.encode()).hexdigest()
+        )
+
+    def describe(self) -> Dict[str, str]:
+
+        return {
+            "engine": self.engine,
+            "server": self.server,
+            "database": self.database,
+            "uid": self.uid,
+            "encrypt": self.encrypt
+        }
+
+class ManagedPool(Protocol):
+
+    def prune(self) -> int: ...
+
+    def close(self) -> Optional[Awaitable[None]]: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+class ConnectionPool(Generic[TConnection]):
+
+    def __init__(self, settings: PoolSettings, statement_settings: StatementSettings = app_settings.statements):
+
+        self.settings = settings
+        self.statement_settings = statement_settings
+
+        self._condition = Condition(Lock())
+        self._idle: Deque[Tuple[TConnection, float]] = deque() #? (connection, released at)
+        self._born: Dict[int, float] = {}
+        self._size: int = 0
+        self._waiting: int = 0
+        self._closed: bool = False
+
+        self._checkouts: int = 0
+        self._waits: int = 0
+        self._wait_time: float = 0
+        self._timeouts: int = 0
+        self._created: int = 0
+        self._discarded: int = 0
+        self._failed_checks: int = 0
+
+        self._statements: Dict[int, StatementCache] = {}
+        self._statement_totals: Dict[str, int] = { "hits": 0, "prepares": 0, "evictions": 0 }
+
+    #region Driver hooks
+
+    def _connect(self) -> TConnection: ...
+
+    def _close(self, connection: TConnection) -> None: ...
+
+    def _is_closed(self, connection: TConnection) -> bool:
+        return False
+
+    def _ping(self, connection: TConnection) -> bool:
+        return True
+
+    def _reset(self, connection: TConnection) -> bool:
+        return True
+
+    def _unprepare(self, connection: TConnection, handle: Any) -> None: ...
+
+    #region Statements
+
+    def statements(self, connection: TConnection) -> StatementCache:
+
+        cache = self._statements.get(id(connection))
+
+        if cache is None:
+
+            cache = StatementCache(
+                self.statement_settings.max_size,
+                self.statement_settings.threshold,
+                lambda handle: self._unprepare(connection, handle)
+            )
+
+            self._statements[id(connection)] = cache
+
+        return cache
+
+    def _drop_statements(self, connection: TConnection) -> None:
+
+        cache = self._statements.pop(id(connection), None)
+
+        if cache is None:
+            return
+
+        #? Prepared statements die with their connection, keep their counters for stats
+        for name, value in cache.stats().items():
+
+            if name in self._statement_totals:
+                self._statement_totals[name] += value
+
+    #region Checkout
+
+    def _expired(self, connection: TConnection, now: float) -> bool:
+        return now - self._born.get(id(connection), now) > self.settings.max_lifetime
+
+    def _healthy(self, connection: TConnection, idle_since: float) -> bool:
+
+        if self._is_closed(connection):
+            return False
+
+        if monotonic() - idle_since < self.settings.health_check_interval:
+            return True
+
+        try:
+            return self._ping(connection)
+        except Exception:
+            return False
+
+    def _reserve(self, deadline: float) -> Tuple[Optional[TConnection], float]:
+
+        with self._condition:
+
+            waiting = False
+
+            try:
+                while True:
+
+                    if self._closed:
+                        raise PoolTimeoutError('Connection pool is closed')
+
+                    if self._idle:
+                        return self._idle.pop()
+
+                    if self._size < self.settings.max_size:
+                        self._size += 1
+                        return None, 0
+
+                    remaining = deadline - monotonic()
+
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f'No connection available after {self.settings.checkout_timeout}s '
+                            f'({self._size} in use)'
+                        )
+
+                    if not waiting:
+                        waiting = True
+                        self._waiting += 1
+                        self._waits += 1
+
+                    self._condition.wait(remaining)
+            finally:
+                if waiting:
+                    self._waiting -= 1
+
+    def acquire(self, timeout: Optional[float] = None) -> TConnection:
+
+        started = monotonic()
+        deadline = started + (self.settings.checkout_timeout if timeout is None else timeout)
+
+        while True:
+
+            connection, idle_since = self._reserve(deadline)
+
+            if connection is None:
+
+                try:
+                    connection = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+
+                with self._condition:
+                    self._born[id(connection)] = monotonic()
+                    self._created += 1
+
+                break
+
+            if self._healthy(connection, idle_since) and not self._expired(connection, monotonic()):
+                break
+
+            with self._condition:
+                self._failed_checks += 1
+
+            self._discard(connection)
+
+        with self._condition:
+            self._checkouts += 1
+            self._wait_time += monotonic() - started
+
+        return connection
+
+    def release(self, connection: TConnection) -> None:
+
+        try:
+            reusable = not self._is_closed(connection) and self._reset(connection)
+        except Exception:
+            reusable = False
+
+        if not reusable or self._closed or self._expired(connection, monotonic()):
+            self._discard(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, monotonic()))
+            self._condition.notify()
+
+        self.prune()
+
+    #region Maintenance
+
+    def _forget(self, connection: Optional[TConnection] = None) -> None:
+
+        with self._condition:
+            self._size -= 1
+
+            if connection is not None:
+                self._born.pop(id(connection), None)
+                self._discarded += 1
+
+            self._condition.notify()
+
+    def _discard(self, connection: TConnection) -> None:
+
+        self._forget(connection)
+
+        with self._condition:
+            self._drop_statements(connection)
+
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+
+    def prune(self) -> int:
+
+        now = monotonic()
+        evicted: List[TConnection] = []
+
+        with self._condition:
+
+            #? Oldest idle connections live at the left of the deque
+            while self._idle and self._size - len(evicted) > self.settings.min_size:
+
+                connection, idle_since = self._idle[0]
+
+                if now - idle_since <= self.settings.max_idle and not self._expired(connection, now):
+                    break
+
+                self._idle.popleft()
+                evicted.append(connection)
+
+        for connection in evicted:
+            self._discard(connection)
+
+        return len(evicted)
+
+    def close(self) -> None:
+
+        with self._condition:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._condition.notify_all()
+
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self) -> Dict[str, Any]:
+
+        with self._condition:
+
+            statements = dict(self._statement_totals)
+            statements["prepared"] = 0
+
+            for cache in list(self._statements.values()):
+                for name, value in cache.stats().items():
+                    statements[name] += value
+
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "min_size": self.settings.min_size,
+                "max_size": self.settings.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time": round(self._wait_time, 6),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "failed_checks": self._failed_checks,
+                "statements": statements
+            }
+
+class PoolRegistry():
+
+    def __init__(self):
+
+        self._lock = Lock()
+        self._pools: Dict[PoolKey, ManagedPool] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def get(self, key: PoolKey, builder: Callable[[], ManagedPool]) -> Any:
+
+        pool = self._pools.get(key)
+
+        if pool is not None:
+            return pool
+
+        with self._lock:
+
+            pool = self._pools.get(key)
+
+            if pool is None:
+                pool = builder()
+                self._pools[key] = pool
+
+        return pool
+
+    def prune(self) -> int:
+        return sum(pool.prune() for pool in list(self._pools.values()))
+
+    def start(self) -> None:
+
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+
+        #? Releases only evict on the way back, without traffic idle connections would stay open
+        while True:
+
+            await asyncio.sleep(app_settings.pool.prune_interval)
+
+            try:
+                await asyncio.to_thread(self.prune) #? Closing sync connections blocks on the network
+            except Exception:
+                pass
+
+    async def close_all(self) -> None:
+
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+
+        for pool in pools:
+
+            closing = pool.close()
+
+            if inspect.isawaitable(closing):
+                await closing
+
+    def stats(self) -> List[Dict[str, Any]]:
+
+        return [
+            {**key.describe(), **pool.stats()}
+            for key, pool in list(self._pools.items())
+        ]
+
+pools: PoolRegistry = PoolRegistry()
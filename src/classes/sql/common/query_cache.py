@@ -0,0 +1,149 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+from src.classes.sql.common.SQLClasses import Column, DeleteQuery, Having, InsertQuery, Join, SelectQuery, Table, UpdateQuery, Where
+from src.classes.settings import settings
+
+ShapeKey = Tuple[Hashable, ...]
+
+class QueryShape():
+
+    #? Keys are plain tuples of the fields that reach the SQL text, values never take part in them
+
+    @staticmethod
+    def _values(wheres: List[Where]|List[Having]) -> List[Any]:
+        return [where.value for where in wheres]
+
+    @staticmethod
+    def _table(table: Table) -> ShapeKey:
+        return (table.sql_schema, table.name, table.subname)
+
+    @staticmethod
+    def _columns(columns: List[Column]) -> ShapeKey:
+        return tuple((column.name, column.rename) for column in columns)
+
+    @staticmethod
+    def _conditions(wheres: List[Where]|List[Having]) -> ShapeKey:
+        return tuple((where.to_column.name, where.comparation, where.joiner) for where in wheres)
+
+    @staticmethod
+    def _join(join: Join) -> ShapeKey:
+
+        on = join.on
+
+        return (join.type, *QueryShape._table(join.table), on.table_column.name, on.comparation, on.other_table.name, on.other_table_column.name)
+
+    @staticmethod
+    def select(query: SelectQuery) -> ShapeKey:
+
+        order_by, group_by, seek = query.order_by, query.group_by, query.seek
+
+        return (
+            'select',
+            QueryShape._table(query.table),
+            tuple(QueryShape._join(join) for join in query.join),
+            QueryShape._columns(query.columns),
+            QueryShape._conditions(query.where),
+            QueryShape._columns(group_by.columns) if group_by else None,
+            QueryShape._conditions(query.having),
+            (QueryShape._columns(order_by.columns), order_by.desc) if order_by else None,
+            (True, bool(query.offset.max_row)) if query.offset else None,
+            (tuple(column.name for column in seek.columns), seek.desc, seek.after is not None) if seek else None
+        )
+
+    @staticmethod
+    def insert(query: InsertQuery) -> ShapeKey:
+
+        #? Rows only change the text through their count and width
+        return (
+            'insert',
+            QueryShape._table(query.table),
+            tuple(query.columns),
+            QueryShape._columns(query.output),
+            len(query.values),
+            len(query.values[0]) if query.values else 0
+        )
+
+    @staticmethod
+    def update(query: UpdateQuery) -> ShapeKey:
+
+        return (
+            'update',
+            QueryShape._table(query.table),
+            tuple(query.column_values.keys()),
+            QueryShape._conditions(query.where),
+            QueryShape._columns(query.output)
+        )
+
+    @staticmethod
+    def update_params(query: UpdateQuery) -> List[Any]:
+        return [*query.column_values.values(), *QueryShape._values(query.where)]
+
+    @staticmethod
+    def delete(query: DeleteQuery) -> ShapeKey:
+        return ('delete', QueryShape._table(query.table), QueryShape._conditions(query.conditions))
+
+    @staticmethod
+    def delete_params(query: DeleteQuery) -> List[Any]:
+        return QueryShape._values(query.conditions)
+
+class QueryCache():
+
+    def __init__(self, max_size: int):
+
+        self.max_size = max_size
+
+        self._lock = Lock()
+        self._entries: OrderedDict[Hashable, str] = OrderedDict()
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+
+    def get(self, key: Hashable, build: Callable[[], str]) -> str:
+
+        with self._lock:
+
+            request = self._entries.get(key)
+
+            if request is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+
+                return request
+
+            self._misses += 1
+
+        request = build()
+
+        with self._lock:
+
+            self._entries[key] = request
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+        return request
+
+    def clear(self) -> None:
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+
+        with self._lock:
+
+            lookups = self._hits + self._misses
+
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0
+            }
+
+query_cache: QueryCache = QueryCache(settings.query_cache.max_size)
@@ -0,0 +1,188 @@
+import asyncio
+import random
+from contextvars import ContextVar
+from time import time
+from typing import Any, Dict, List, Optional, Tuple
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.async_postgres import AsyncPostgres
+from src.classes.sql.common.transactions import transactions
+from src.classes.settings import ReplicaServer, ReplicaSettings, settings
+
+class Session():
+
+    HEADER: str = 'X-PySQL-Session'
+
+    def __init__(self, token: Optional[str]):
+
+        self.written: Optional[float] = self.decode(token)
+        self.wrote: bool = False
+
+    @staticmethod
+    def decode(token: Optional[str]) -> Optional[float]:
+
+        try:
+            return float(token) if token else None
+        except ValueError:
+            return None
+
+    def token(self) -> str:
+        return repr(self.written)
+
+    @staticmethod
+    def start(token: Optional[str]) -> 'Session':
+
+        session = Session(token)
+        _session.set(session)
+
+        return session
+
+    @staticmethod
+    def current() -> Optional['Session']:
+        return _session.get()
+
+    @staticmethod
+    def write() -> None:
+
+        session = _session.get()
+
+        if session is not None:
+            session.written = time()
+            session.wrote = True
+
+_session: ContextVar[Optional[Session]] = ContextVar('pysql_session', default=None)
+
+class ReplicaState():
+
+    def __init__(self, replica: ReplicaServer):
+
+        self.replica = replica
+        self.healthy: bool = False
+        self.lag: float = 0
+        self.checked: float = 0
+        self.error: Optional[str] = None
+
+    def serves(self, max_lag: float, written: Optional[float]) -> bool:
+
+        if not self.healthy or self.lag > max_lag:
+            return False
+
+        #? The replica had replayed everything up to checked - lag, a session write after that is not there yet
+        return written is None or self.checked - self.lag >= written
+
+    def describe(self) -> Dict[str, Any]:
+
+        return {
+            "server": self.replica.server,
+            "weight": self.replica.weight,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "checked": self.checked,
+            "error": self.error
+        }
+
+class Replicas():
+
+    #? An idle primary sends no new transactions, so a replica that replayed all it received is not lagging
+    LAG_QUERY: str = '''
+        SELECT pg_is_in_recovery(),
+            CASE
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+            END
+    '''
+
+    def __init__(self, settings: ReplicaSettings):
+
+        self.settings = settings
+        self._states: Dict[Tuple[str, str], List[ReplicaState]] = {}
+        self._checks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+        self._routed: int = 0
+        self._primary: int = 0
+
+    @staticmethod
+    def logical(config: DbConfig) -> Tuple[str, str]:
+        return (config.server, config.database)
+
+    def _replicas(self, config: DbConfig) -> List[ReplicaState]:
+
+        key = self.logical(config)
+        states = self._states.get(key)
+
+        if states is None:
+            states = self._states[key] = [ReplicaState(replica) for replica in self.settings.servers.get('/'.join(key), [])]
+
+        return states
+
+    async def _check(self, config: DbConfig, state: ReplicaState) -> None:
+
+        try:
+            async with AsyncPostgres(config=config.model_copy(update={ "server": state.replica.server }), priority='high', pinned=False) as db:
+                (in_recovery, lag), = await asyncio.wait_for(db.fetch(self.LAG_QUERY), self.settings.health_check_interval)
+
+            state.healthy = bool(in_recovery) #? A promoted replica no longer follows this primary
+            state.lag = float(lag)
+            state.error = None if in_recovery else 'Not in recovery'
+        except Exception as error:
+            state.healthy = False
+            state.error = str(error) or type(error).__name__
+
+        state.checked = time()
+
+    async def _check_all(self, config: DbConfig, states: List[ReplicaState]) -> None:
+        await asyncio.gather(*(self._check(config, state) for state in states))
+
+    async def _refresh(self, config: DbConfig, states: List[ReplicaState]) -> None:
+
+        key = self.logical(config)
+
+        if time() - min(state.checked for state in states) < self.settings.health_check_interval:
+            return
+
+        task = self._checks.get(key)
+
+        if task is None:
+            task = self._checks[key] = asyncio.ensure_future(self._check_all(config, states))
+            task.add_done_callback(lambda _: self._checks.pop(key, None))
+
+        #? Only the first check holds up a read, later ones refresh in the background
+        if not any(state.checked for state in states):
+            await asyncio.shield(task)
+
+    async def route(self, config: DbConfig) -> DbConfig:
+
+        states = self._replicas(config)
+
+        #? Reads inside a transaction session must see its own uncommitted writes
+        if not states or transactions.bound() is not None:
+            return config
+
+        await self._refresh(config, states)
+
+        session = Session.current()
+        written = session.written if session is not None else None
+
+        candidates = [state for state in states if state.serves(self.settings.max_lag, written)]
+
+        if not candidates:
+            self._primary += 1
+            return config
+
+        state, = random.choices(candidates, weights=[state.replica.weight for state in candidates])
+
+        self._routed += 1
+
+        return config.model_copy(update={ "server": state.replica.server })
+
+    def stats(self) -> Dict[str, Any]:
+
+        return {
+            "routed": self._routed,
+            "primary": self._primary,
+            "databases": [
+                { "server": server, "database": database, "replicas": [state.describe() for state in states] }
+                for (server, database), states in self._states.items() if states
+            ]
+        }
+
+replicas: Replicas = Replicas(settings.replicas)
@@ -0,0 +1,160 @@
+import json
+from collections import OrderedDict
+from time import monotonic
+from threading import Lock
+from typing import Any, Dict, FrozenSet, Hashable, NamedTuple, Optional, Tuple
+from src.classes.sql.common.SQLClasses import DbConfig, SelectQuery, Table
+from src.classes.sql.common.pool import PoolKey
+from src.classes.sql.common.compiler import compilers
+from src.classes.sql.common.query_cache import QueryShape
+from src.classes.settings import settings
+from src.types.params import Engine
+
+class ResultKey(NamedTuple):
+
+    identity: PoolKey
+    shape: Hashable
+    params: str
+    format: str = 'json'
+
+class ResultEntry(NamedTuple):
+
+    payload: bytes
+    expires: float
+    tables: FrozenSet[str]
+
+class ResultCache():
+
+    def __init__(self, max_bytes: int, max_ttl: float):
+
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+
+        self._lock = Lock()
+        self._entries: OrderedDict[ResultKey, ResultEntry] = OrderedDict()
+        self._bytes: int = 0
+        self._generations: Dict[Tuple[PoolKey, str], int] = {}
+
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+        self._invalidations: int = 0
+
+    @staticmethod
+    def identity(config: DbConfig) -> PoolKey:
+        return PoolKey.from_config('result', config)
+
+    @staticmethod
+    def table_name(table: Table) -> str:
+        return table.qualified()
+
+    @staticmethod
+    def tables_of(query: SelectQuery) -> FrozenSet[str]:
+        return frozenset([ResultCache.table_name(query.table), *(ResultCache.table_name(join.table) for join in query.join)])
+
+    @staticmethod
+    def key(config: DbConfig, query: SelectQuery, response_format: str = 'json', engine: Engine = 'postgres') -> ResultKey:
+
+        #? The shape maps to exactly one statement per engine, so shape plus the parameters it is sent with identify the SQL
+        return ResultKey(
+            ResultCache.identity(config),
+            (engine, *QueryShape.select(query)),
+            json.dumps(compilers[engine].select_params(query), default=str),
+            response_format
+        )
+
+    #region Lookups
+
+    def _generation(self, identity: PoolKey, tables: FrozenSet[str]) -> int:
+        return self._generations.get((identity, '*'), 0) + sum(self._generations.get((identity, table), 0) for table in tables)
+
+    def generation(self, identity: PoolKey, tables: FrozenSet[str]) -> int:
+
+        with self._lock:
+            return self._generation(identity, tables)
+
+    def get(self, key: ResultKey) -> Optional[bytes]:
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is None or entry.expires <= monotonic():
+
+                if entry is not None:
+                    self._remove(key)
+
+                self._misses += 1
+
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+
+            return entry.payload
+
+    def set(self, key: ResultKey, payload: bytes, ttl: float, tables: FrozenSet[str], generation: int) -> None:
+
+        if len(payload) > self.max_bytes:
+            return
+
+        with self._lock:
+
+            #? A write landed while the query ran, its result may already be stale
+            if self._generation(key.identity, tables) != generation:
+                return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = ResultEntry(payload, monotonic() + min(ttl, self.max_ttl), tables)
+            self._bytes += len(payload)
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key: ResultKey) -> None:
+
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.payload)
+
+    #region Invalidation
+
+    def invalidate(self, identity: PoolKey, table: Optional[str] = None) -> int:
+
+        with self._lock:
+
+            generation_key = (identity, table or '*')
+            self._generations[generation_key] = self._generations.get(generation_key, 0) + 1
+
+            stale = [
+                key for key, entry in self._entries.items()
+                if key.identity == identity and (table is None or table in entry.tables)
+            ]
+
+            for key in stale:
+                self._remove(key)
+
+            self._invalidations += len(stale)
+
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+
+        with self._lock:
+
+            lookups = self._hits + self._misses
+
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
+
+result_cache: ResultCache = ResultCache(settings.result_cache.max_bytes, settings.result_cache.max_ttl)
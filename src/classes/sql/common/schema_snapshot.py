@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+
+class SchemaSnapshot():
+
+    #? Rows are sent as arrays, these name their positions once per response
+    FIELDS: Dict[str, List[str]] = {
+        'columns': ['name', 'type', 'nullable', 'default'],
+        'indexes': ['name', 'unique', 'columns'],
+        'foreign_keys': ['name', 'columns', 'references_schema', 'references_table', 'references_columns']
+    }
+
+    @staticmethod
+    def _names(values: Optional[List[Any]]) -> List[str]:
+        return [value['name'] if isinstance(value, dict) else value for value in values or []]
+
+    @staticmethod
+    def _table(table: Dict[str, Any]) -> Dict[str, Any]:
+
+        names = SchemaSnapshot._names
+
+        return {
+            "name": table['name'],
+            "columns": [
+                [column['name'], column['type'], bool(column['nullable']), column.get('default')]
+                for column in table.get('columns') or []
+            ],
+            "primary_key": names(table.get('primary_key')),
+            "indexes": [
+                [index['name'], bool(index['unique']), names(index.get('columns'))]
+                for index in table.get('indexes') or []
+            ],
+            "foreign_keys": [
+                [
+                    foreign_key['name'],
+                    names(foreign_key.get('columns')),
+                    (foreign_key.get('references') or {}).get('schema'),
+                    (foreign_key.get('references') or {}).get('table'),
+                    names((foreign_key.get('references') or {}).get('columns'))
+                ]
+                for foreign_key in table.get('foreign_keys') or []
+            ]
+        }
+
+    @staticmethod
+    def compact(sql_schema: str, tables: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+
+        return {
+            "schema": sql_schema,
+            "fields": SchemaSnapshot.FIELDS,
+            "tables": [SchemaSnapshot._table(table) for table in tables or []]
+        }
@@ -0,0 +1,110 @@
+import asyncio
+from threading import Event, Lock
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+class Flight():
+
+    def __init__(self):
+
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight():
+
+    def __init__(self):
+
+        self._lock = Lock()
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._flights: Dict[Hashable, Flight] = {}
+        self._watchers: Dict[Hashable, List[Callable[[], Awaitable[bool]]]] = {}
+
+        self._leaders: int = 0
+        self._coalesced: int = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]], abandoned: Optional[Callable[[], Awaitable[bool]]] = None) -> T:
+
+        if abandoned is not None:
+            self._watchers.setdefault(key, []).append(abandoned)
+
+        task = self._tasks.get(key)
+
+        if task is None:
+
+            #? The work runs in its own task so a leader whose client disconnects does not cancel the waiters
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: (self._tasks.pop(key, None), self._watchers.pop(key, None)))
+
+            with self._lock:
+                self._leaders += 1
+
+        else:
+
+            with self._lock:
+                self._coalesced += 1
+
+        return await asyncio.shield(task)
+
+    async def abandoned(self, key: Hashable) -> bool:
+
+        watchers = self._watchers.get(key)
+
+        #? Shared work is only worth dropping once every caller waiting on it has gone away
+        if not watchers:
+            return False
+
+        for watcher in list(watchers):
+
+            if not await watcher():
+                return False
+
+        return True
+
+    def run_sync(self, key: Hashable, fn: Callable[[], T]) -> T:
+
+        with self._lock:
+
+            flight = self._flights.get(key)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[key] = Flight()
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+
+            with self._lock:
+                del self._flights[key]
+
+            flight.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+
+        with self._lock:
+            return {
+                "in_flight": len(self._tasks) + len(self._flights),
+                "leaders": self._leaders,
+                "coalesced": self._coalesced
+            }
+
+single_flight: SingleFlight = SingleFlight()
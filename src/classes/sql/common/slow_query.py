@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from threading import Lock, Thread
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from src.classes.formats import RowFormats
+from src.classes.settings import SlowQuerySettings, settings
+
+class SlowQueryLog():
+
+    def __init__(self, slow_settings: SlowQuerySettings):
+
+        self.settings = slow_settings
+
+        self._lock = Lock()
+        self._logger: Optional[logging.Logger] = None
+        self._tasks: Set[asyncio.Future] = set()
+        self._logged: int = 0
+
+    @staticmethod
+    def redact(params: List[Any]) -> List[str]:
+        return [type(value).__name__ for value in params]
+
+    def is_slow(self, duration: float) -> bool:
+        return 0 < self.settings.threshold <= duration
+
+    def _get_logger(self) -> logging.Logger:
+
+        with self._lock:
+
+            #? The file is only created once something is slow
+            if self._logger is None:
+
+                handler = RotatingFileHandler(self.settings.path, maxBytes=self.settings.max_bytes, backupCount=self.settings.backup_count)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+
+                self._logger = logging.getLogger('pysql.slow_queries')
+                self._logger.setLevel(logging.INFO)
+                self._logger.propagate = False
+                self._logger.addHandler(handler)
+
+            self._logged += 1
+
+            return self._logger
+
+    def write(self, request: str, params: List[Any], rows: int, duration: float, plan: Any = None) -> None:
+
+        entry: Dict[str, Any] = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "duration": round(duration, 6),
+            "rows": rows,
+            "sql": ' '.join(request.split()),
+            "params": self.redact(params)
+        }
+
+        if plan is not None:
+            entry["plan"] = plan
+
+        self._get_logger().info(RowFormats.json_bytes(entry).decode())
+
+    def capture(self, request: str, params: List[Any], rows: int, duration: float, explain: Optional[Callable[[], Awaitable[Any]]] = None) -> None:
+
+        if explain is None or not self.settings.explain:
+            self.write(request, params, rows, duration)
+            return
+
+        async def with_plan():
+
+            try:
+                plan = await explain()
+            except Exception as error:
+                plan = { "error": str(error) }
+
+            self.write(request, params, rows, duration, plan)
+
+        #? The plan is read after the answer is sent, the request does not wait for it
+        task = asyncio.ensure_future(with_plan())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def capture_sync(self, request: str, params: List[Any], rows: int, duration: float, explain: Callable[[], Any]) -> None:
+
+        if not self.settings.explain:
+            self.write(request, params, rows, duration)
+            return
+
+        def with_plan():
+
+            try:
+                plan = explain()
+            except Exception as error:
+                plan = { "error": str(error) }
+
+            self.write(request, params, rows, duration, plan)
+
+        Thread(target=with_plan, daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+
+        return {
+            "threshold": self.settings.threshold,
+            "explain": self.settings.explain,
+            "logged": self._logged,
+            "pending_plans": len(self._tasks)
+        }
+
+slow_queries: SlowQueryLog = SlowQueryLog(settings.slow_query)
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+THandle = TypeVar('THandle')
+
+class StatementCache(Generic[THandle]):
+
+    def __init__(self, max_size: int, threshold: int, on_evict: Callable[[THandle], None]):
+
+        self.max_size = max_size
+        self.threshold = threshold
+
+        self._on_evict = on_evict
+        self._handles: OrderedDict[str, THandle] = OrderedDict()
+        self._uses: OrderedDict[str, int] = OrderedDict() #? Executions of statements not prepared yet
+        self._hits: int = 0
+        self._prepares: int = 0
+        self._evictions: int = 0
+
+    def get(self, statement: str) -> Optional[THandle]:
+
+        handle = self._handles.get(statement)
+
+        if handle is not None:
+            self._handles.move_to_end(statement)
+            self._hits += 1
+
+        return handle
+
+    def is_hot(self, statement: str) -> bool:
+
+        if self.max_size <= 0:
+            return False
+
+        uses = self._uses.pop(statement, 0)
+
+        if uses >= 0:
+            uses += 1 #? Rejected statements stay at -1 and are never prepared
+
+        self._uses[statement] = uses
+
+        while len(self._uses) > self.max_size * 4:
+            self._uses.popitem(last=False)
+
+        return uses >= self.threshold
+
+    def reject(self, statement: str) -> None:
+        self._uses[statement] = -1
+
+    def add(self, statement: str, handle: THandle) -> None:
+
+        self._uses.pop(statement, None)
+        self._handles[statement] = handle
+        self._prepares += 1
+
+        while len(self._handles) > self.max_size:
+
+            _, evicted = self._handles.popitem(last=False)
+            self._evictions += 1
+
+            try:
+                self._on_evict(evicted)
+            except Exception:
+                pass
+
+    def handles(self) -> List[THandle]:
+        return list(self._handles.values())
+
+    def clear(self) -> None:
+
+        self._handles.clear()
+        self._uses.clear()
+
+    def stats(self) -> Dict[str, Any]:
+
+        return {
+            "prepared": len(self._handles),
+            "hits": self._hits,
+            "prepares": self._prepares,
+            "evictions": self._evictions
+        }
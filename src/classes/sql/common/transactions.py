@@ -0,0 +1,161 @@
+import asyncio
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+from time import monotonic, time
+from uuid import uuid4
+from typing import Any, Dict, Optional
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.settings import TransactionSettings, settings
+
+class TransactionSessionError(Exception):
+
+    def __init__(self, status: int, detail: str):
+
+        super().__init__(detail)
+
+        self.status = status
+
+class TransactionSession():
+
+    def __init__(self, config: DbConfig, db: Any):
+
+        self.id: str = uuid4().hex
+        self.config = config
+        self.db = db #? Open AsyncPostgres owning the pinned connection
+        self.lock = asyncio.Lock() #? One request at a time may use the connection
+        self.stack = AsyncExitStack()
+        self.created: float = time()
+        self.last_used: float = monotonic()
+
+    def touch(self) -> None:
+        self.last_used = monotonic()
+
+    def describe(self, idle_timeout: float) -> Dict[str, Any]:
+
+        return {
+            "id": self.id,
+            "created": self.created,
+            "idle": round(monotonic() - self.last_used, 3),
+            "idle_timeout": idle_timeout
+        }
+
+class Transactions():
+
+    HEADER: str = 'X-PySQL-Transaction'
+
+    def __init__(self, settings: TransactionSettings):
+
+        self.settings = settings
+        self._sessions: Dict[str, TransactionSession] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+        self._committed: int = 0
+        self._rolled_back: int = 0
+        self._expired: int = 0
+
+    @staticmethod
+    def bind(session_id: Optional[str]) -> None:
+        _bound.set(session_id)
+
+    def bound(self) -> Optional[TransactionSession]:
+
+        session_id = _bound.get()
+
+        if session_id is None:
+            return None
+
+        session = self._sessions.get(session_id)
+
+        if session is None:
+            raise TransactionSessionError(404, 'Transaction session not found or expired')
+
+        return session
+
+    async def begin(self, config: DbConfig, db: Any) -> TransactionSession:
+
+        if len(self._sessions) >= self.settings.max_sessions:
+            raise TransactionSessionError(429, 'Too many open transaction sessions')
+
+        session = TransactionSession(config, db)
+
+        await session.stack.enter_async_context(db)
+
+        try:
+            await db.begin()
+            await db.detach()
+        except BaseException:
+            await session.stack.aclose()
+            raise
+
+        self._sessions[session.id] = session
+
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+        return session
+
+    async def end(self, session_id: str, commit: bool) -> TransactionSession:
+
+        session = self._sessions.pop(session_id, None)
+
+        if session is None:
+            raise TransactionSessionError(404, 'Transaction session not found or expired')
+
+        #? Waits for a request still running on the connection
+        async with session.lock:
+
+            try:
+                await (session.db.commit() if commit else session.db.rollback())
+            finally:
+                await session.stack.aclose()
+
+        if commit:
+            self._committed += 1
+        else:
+            self._rolled_back += 1
+
+        return session
+
+    async def _reap(self) -> None:
+
+        #? Abandoned sessions are rolled back so their connection goes back to the pool
+        while self._sessions:
+
+            await asyncio.sleep(min(self.settings.idle_timeout, 1))
+
+            now = monotonic()
+
+            for session in list(self._sessions.values()):
+
+                if session.lock.locked() or now - session.last_used < self.settings.idle_timeout:
+                    continue
+
+                try:
+                    await self.end(session.id, commit=False)
+                    self._expired += 1
+                except Exception:
+                    pass
+
+    async def close(self) -> None:
+
+        for session_id in list(self._sessions):
+
+            try:
+                await self.end(session_id, commit=False)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+
+        return {
+            "open": len(self._sessions),
+            "max_sessions": self.settings.max_sessions,
+            "committed": self._committed,
+            "rolled_back": self._rolled_back,
+            "expired": self._expired,
+            "sessions": [session.describe(self.settings.idle_timeout) for session in self._sessions.values()]
+        }
+
+_bound: ContextVar[Optional[str]] = ContextVar('pysql_transaction', default=None)
+
+transactions: Transactions = Transactions(settings.transactions)
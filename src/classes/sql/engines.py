@@ -0,0 +1,32 @@
+from typing import Union
+from src.classes.sql.common.SQLClasses import EngineConfig
+from src.classes.sql.async_postgres import AsyncPostgres
+from src.classes.sql.async_sqlserver import AsyncSQLServer
+from src.classes.sql.common.replicas import replicas
+from src.classes.sql.common.transactions import TransactionSessionError, transactions
+from src.types.params import Priority
+
+AsyncEngine = Union[AsyncPostgres, AsyncSQLServer]
+
+class Engines():
+
+    @staticmethod
+    def connect(config: EngineConfig, priority: Priority = 'normal') -> AsyncEngine:
+
+        if config.engine == 'postgres':
+            return AsyncPostgres(config=config.info, priority=priority)
+
+        #? Sessions pin a postgres connection, running elsewhere would silently leave the transaction
+        if transactions.bound() is not None:
+            raise TransactionSessionError(409, f'Transaction sessions are not available on {config.engine}')
+
+        return AsyncSQLServer(config.info, priority=priority)
+
+    @staticmethod
+    async def route(config: EngineConfig) -> EngineConfig:
+
+        #? Replicas are only tracked for postgres
+        if config.engine != 'postgres':
+            return config
+
+        return config.model_copy(update={ "info": await replicas.route(config.info) })
@@ -1,14 +1,311 @@
-from psycopg2 import connect
-from psycopg2.extensions import connection, cursor
-from typing import List, Dict, Any, Tuple, overload, Optional
+import json
+import re
+from psycopg2 import connect, Error as PostgresError
+from psycopg2.extensions import connection, cursor, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from typing import Callable, Iterator, List, Dict, Any, Tuple, overload, Optional
 from src.classes.sql.common.SQLClasses import *
 from src.classes.sql.types import Row, Data
 from src.types.params import ListOrTuple, EncryptValues
+from src.classes.sql.common.pool import ConnectionPool, PoolKey, pools
+from src.classes.sql.common.query_cache import query_cache
+from src.classes.sql.common.compiler import QueryCompiler, compilers
+from src.classes.sql.common.schema_snapshot import SchemaSnapshot
+from src.classes.sql.common.single_flight import single_flight
+from src.classes.formats import RowFormats
+from src.classes.metrics import Timings
+from src.classes.settings import PoolSettings, settings
 from itertools import chain
+from uuid import uuid4
 
-class Postgres():
+class PostgresPool(ConnectionPool[connection]):
+    
+    def __init__(self, pool_settings: PoolSettings, **connect_params: Any):
+        
+        super().__init__(pool_settings)
+        
+        self._connect_params = connect_params
+    
+    def _connect(self) -> connection:
+        
+        new_connection = connect(**self._connect_params)
+        new_connection.autocommit = True
+        
+        return new_connection
+    
+    def _close(self, db_connection: connection) -> None:
+        db_connection.close()
+    
+    def _is_closed(self, db_connection: connection) -> bool:
+        return bool(db_connection.closed)
+    
+    def _ping(self, db_connection: connection) -> bool:
+        
+        with db_connection.cursor() as ping_cursor:
+            ping_cursor.execute('SELECT 1')
+        
+        return True
+    
+    def _reset(self, db_connection: connection) -> bool:
+        
+        transaction_status = db_connection.get_transaction_status()
+        
+        if transaction_status == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        
+        if transaction_status != TRANSACTION_STATUS_IDLE:
+            db_connection.rollback()
+        
+        if not db_connection.autocommit:
+            db_connection.autocommit = True
+        
+        return True
+    
+    def _unprepare(self, db_connection: connection, handle: str) -> None:
+        
+        if db_connection.autocommit:
+            with db_connection.cursor() as deallocate_cursor:
+                deallocate_cursor.execute(f'DEALLOCATE {handle}')
+
+class PostgresQueries():
+    
+    DIALECT: str = 'postgres'
+    compiler: QueryCompiler = compilers['postgres']
+    MAX_PARAMS: int = 65535 #? Bind parameters per statement in the wire protocol
+    
+    _PLACEHOLDER = re.compile(r'%([s%])')
+    
+    TABLES_QUERY: str = """
+            SELECT table_name
+            FROM information_schema.tables
+            WHERE table_schema = %s AND table_type = 'BASE TABLE';
+        """
+    
+    COLUMNS_QUERY: str = """
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = %s AND table_name = %s
+            ORDER BY ordinal_position
+            """
+    
+    #? Whole schema in one round-trip: tables, columns, primary keys, indexes and foreign keys
+    SCHEMA_QUERY: str = """
+            SELECT coalesce(json_agg(json_build_object(
+                'name', c.relname,
+                'columns', (
+                    SELECT coalesce(json_agg(json_build_object(
+                        'name', a.attname,
+                        'type', format_type(a.atttypid, a.atttypmod),
+                        'nullable', NOT a.attnotnull,
+                        'default', pg_get_expr(d.adbin, d.adrelid)
+                    ) ORDER BY a.attnum), '[]')
+                    FROM pg_attribute a
+                    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+                    WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+                ),
+                'primary_key', (
+                    SELECT coalesce(json_agg(a.attname ORDER BY k.n), '[]')
+                    FROM pg_index i
+                    CROSS JOIN unnest(i.indkey::int2[]) WITH ORDINALITY k(attnum, n)
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                    WHERE i.indrelid = c.oid AND i.indisprimary
+                ),
+                'indexes', (
+                    SELECT coalesce(json_agg(json_build_object(
+                        'name', ic.relname,
+                        'unique', i.indisunique,
+                        'columns', (
+                            SELECT coalesce(json_agg(a.attname ORDER BY k.n), '[]')
+                            FROM unnest(i.indkey::int2[]) WITH ORDINALITY k(attnum, n)
+                            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                        )
+                    ) ORDER BY ic.relname), '[]')
+                    FROM pg_index i
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    WHERE i.indrelid = c.oid
+                ),
+                'foreign_keys', (
+                    SELECT coalesce(json_agg(json_build_object(
+                        'name', con.conname,
+                        'columns', (
+                            SELECT json_agg(a.attname ORDER BY k.n)
+                            FROM unnest(con.conkey) WITH ORDINALITY k(attnum, n)
+                            JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+                        ),
+                        'references', json_build_object(
+                            'schema', rn.nspname,
+                            'table', rc.relname,
+                            'columns', (
+                                SELECT json_agg(a.attname ORDER BY k.n)
+                                FROM unnest(con.confkey) WITH ORDINALITY k(attnum, n)
+                                JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+                            )
+                        )
+                    ) ORDER BY con.conname), '[]')
+                    FROM pg_constraint con
+                    JOIN pg_class rc ON rc.oid = con.confrelid
+                    JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+                    WHERE con.conrelid = c.oid AND con.contype = 'f'
+                )
+            ) ORDER BY c.relname), '[]')
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s AND c.relkind IN ('r', 'p');
+        """
+    
+    @staticmethod
+    def _timeout_options() -> Dict[str, str]:
+        
+        #? The default timeout rides on the connection startup, only per-request overrides cost a round-trip
+        if settings.timeout.statement > 0:
+            return { "options": f'-c statement_timeout={int(settings.timeout.statement * 1000)}' }
+        
+        return {}
+    
+    @staticmethod
+    def _dump_column(column: Column) -> str:
+        
+        as_column: str = ''
+        
+        if column.rename:
+            as_column: str = f'as {column.rename}'
+        
+        return f'{column.name} {as_column}'
+    
+    def _dump_columns(self, columns: List[Column]):
+        
+        new_columns = list(map(lambda column: self._dump_column(column), columns))
+        
+        return new_columns
+    
+    @staticmethod
+    def _dump_schematic_object(schematic_object: SchematicObject) -> str:
+        
+        return f"{f'{schematic_object.sql_schema}.' if schematic_object.sql_schema else ''}{schematic_object.name}"
+    
+    @staticmethod
+    def _numbered_placeholders(query: str) -> str:
+        
+        counter = iter(range(1, query.count('%s') + 1))
+        
+        return PostgresQueries._PLACEHOLDER.sub(
+            lambda match: '%' if match.group(1) == '%' else f'${next(counter)}',
+            query
+        )
+    
+    @staticmethod
+    def _dump_table_columns(all_columns: List[Row]) -> List[Dict[str, str]]:
+        
+        return [
+            {
+                "name": str(column[0]),
+                "type": str(column[1])
+            }
+            for column in all_columns
+        ]
+    
+    def _compile_insert(self, query: InsertQuery) -> Tuple[str, List[Any]]:
+        return self.compiler.insert(query)
+    
+    def _compile_upsert(self, query: UpsertQuery, rows: List[ListOrTuple]) -> Tuple[str, List[Any]]:
+        
+        updated = query.updated()
+        
+        conflict_action = f"DO UPDATE SET {', '.join(f'{column} = EXCLUDED.{column}' for column in updated)}" if updated else 'DO NOTHING'
+        
+        output_query = f'RETURNING {", ".join(self._dump_columns(query.output))}' if query.output else ''
+        
+        value_query = ', '.join(f'({", ".join("%s" for _ in query.columns)})' for _ in rows)
+        
+        request = f"""
+        INSERT INTO {self._dump_schematic_object(query.table)} ({', '.join(query.columns)})
+        VALUES {value_query}
+        ON CONFLICT ({', '.join(query.conflict)}) {conflict_action}
+        {output_query};
+        """
+        
+        return request, list(chain(*rows))
+    
+    def _build_bulk_update(self, query: BulkUpdateQuery) -> str:
+        
+        table = self._dump_schematic_object(query.table)
+        
+        #? Rows travel as one json parameter typed by the table row, so chunks never hit parameter limits
+        return f"""
+        UPDATE {table} AS target
+        SET {', '.join(f'{column} = source.{column}' for column in query.columns())}
+        FROM json_populate_recordset(NULL::{table}, %s) AS source
+        WHERE {' AND '.join(f'target.{key} = source.{key}' for key in query.keys)};
+        """
+    
+    def _build_bulk_delete(self, query: BulkDeleteQuery) -> str:
+        
+        table = self._dump_schematic_object(query.table)
+        
+        return f"""
+        DELETE FROM {table} AS target
+        USING json_populate_recordset(NULL::{table}, %s) AS source
+        WHERE {' AND '.join(f'target.{key} = source.{key}' for key in query.keys)};
+        """
+    
+    def _compile_copy(self, query: BulkInsertQuery, columns: List[str]) -> str:
+        
+        options = f"FORMAT csv, HEADER {'true' if query.header else 'false'}" if query.format == 'csv' else 'FORMAT text'
+        
+        #? Without named columns the rows fill the table columns in order
+        target = f" ({', '.join(columns)})" if columns else ''
+        
+        return f"COPY {self._dump_schematic_object(query.table)}{target} FROM STDIN ({options})"
+    
+    #? Compiled text is cached by query shape, only the parameters are rebuilt per call
+    
+    def _compile_select(self, query: SelectQuery) -> Tuple[str, List[Any]]:
+        return self.compiler.select(query)
+    
+    def _compile_update(self, query: UpdateQuery) -> Tuple[str, List[Any]]:
+        return self.compiler.update(query)
+    
+    def _compile_delete(self, query: DeleteQuery) -> Tuple[str, List[Any]]:
+        return self.compiler.delete(query)
+    
+    def _compile_bulk_update(self, query: BulkUpdateQuery, rows: List[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        
+        request = query_cache.get(
+            (self.DIALECT, 'bulk_update', query.table.model_dump_json(), tuple(query.keys), tuple(query.columns())),
+            lambda: self._build_bulk_update(query)
+        )
+        
+        return request, [RowFormats.json_bytes(rows).decode()]
+    
+    def _compile_bulk_delete(self, query: BulkDeleteQuery, rows: List[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        
+        request = query_cache.get(
+            (self.DIALECT, 'bulk_delete', query.table.model_dump_json(), tuple(query.keys)),
+            lambda: self._build_bulk_delete(query)
+        )
+        
+        return request, [RowFormats.json_bytes(rows).decode()]
+    
+    def _compile_call(self, query: ExecQuery) -> Tuple[str, List[Any]]:
+        
+        params_values = ', '.join(f'{key} => %s' for key in query.params.keys()) if query.params else ''
+        
+        return f"""
+            CALL {self._dump_schematic_object(query.procedure)}({params_values});
+            """, list(query.params.values())
+    
+    def _compile_perform(self, query: FuncQuery) -> Tuple[str, List[Any]]:
+        
+        params_values = ', '.join(f'{key} => %s' for key in query.params.keys()) if query.params else ''
+        
+        return f"""
+            PERFORM {self._dump_schematic_object(query.func)}({params_values});
+            """, list(query.params.values())
+
+class Postgres(PostgresQueries):
     
     _connection: connection
+    _pool: PostgresPool
+    _key: PoolKey
     
     def __init__(
         self,
@@ -23,19 +320,69 @@ class Postgres():
     ):
         
         if config:
+            server = config.server
             database = config.database
             user = config.uid
             password = config.pwd
             encrypt = config.encrypt
         
-        self._connection = connect(
-            dbname=database,
-            user=user,
-            password=password,
-            host=server,
-            port=port,
-            sslmode=encrypt
+        key = PoolKey.from_config(
+            'postgres',
+            DbConfig(
+                server=f'{server}:{port}',
+                database=database,
+                uid=user,
+                pwd=password,
+                encrypt=encrypt
+            )
+        )
+        
+        self._key = key
+        self._pool = pools.get(
+            key,
+            lambda: PostgresPool(
+                settings.pool,
+                dbname=database,
+                user=user,
+                password=password,
+                host=server,
+                port=port,
+                sslmode=encrypt,
+                **self._timeout_options()
+            )
         )
+        
+        with Timings.phase('connect'):
+            self._connection = self._pool.acquire()
+        
+        self._timeout = config.statement_timeout if config else None
+        
+        if self._timeout:
+            self.execute("SELECT set_config('statement_timeout', %s, false)", (str(int(self._timeout * 1000)),)).close()
+    
+    def __enter__(self) -> 'Postgres':
+        return self
+    
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        
+        db_connection = self.__dict__.pop('_connection', None)
+        
+        if db_connection is not None:
+            
+            if self._timeout and not db_connection.closed:
+                db_connection.cursor().execute('RESET statement_timeout')
+            
+            self._pool.release(db_connection)
+    
+    def cancel(self) -> None:
+        
+        db_connection = self.__dict__.get('_connection')
+        
+        if db_connection is not None:
+            db_connection.cancel()
     
     @staticmethod
     def _serialize_rows(cursor: cursor) -> List[Dict]:
@@ -47,60 +394,56 @@ class Postgres():
             column[0]
             for column in cursor.description
         ]
-
-        result = [dict(zip(column_names, row)) for row in cursor.fetchall()]
+        
+        with Timings.phase('fetch'):
+            rows = cursor.fetchall()
+        
+        Timings.count_rows(len(rows))
+        
+        with Timings.phase('serialize'):
+            result = [dict(zip(column_names, row)) for row in rows]
 
         return result
     
-    def _where_to_text(self, where: Where) -> str:
-        return f"{where.to_column.name} {where.comparation} ?"
-    
-    def _wheres_to_text(self, wheres: List[Where]|List[Having], params: List[Any]) -> str:
+    def _prepared(self, db_cursor: cursor, query: str, params_count: int) -> str:
+        
+        statements = self._pool.statements(self._connection)
         
-        text: str = ''
+        name = statements.get(query)
         
-        cantity = len(wheres)
+        if name is None:
             
-        for i in range(cantity):
-            where = wheres[i]
+            #? PREPARE only runs outside transactions so a failure never aborts one
+            if not self._connection.autocommit or not statements.is_hot(query):
+                return query
             
-            text += f" {self._where_to_text(where)} {where.joiner if i < cantity-1 else ''}"
-            params.append(where.value)
-        
-        return text
-    
-    @staticmethod
-    def _dump_column(column: Column) -> str:
-        
-        as_column: str = ''
-        
-        if column.rename:
-            as_column: str = f'as {column.rename}'
+            name = f'pysql_{uuid4().hex}'
+            
+            try:
+                db_cursor.execute(f'PREPARE {name} AS {self._numbered_placeholders(query)}')
+            except PostgresError:
+                statements.reject(query)
+                return query
+            
+            statements.add(query, name)
         
-        return f'{column.name} {as_column}'
+        return f"EXECUTE {name}({', '.join('%s' for _ in range(params_count))})" if params_count else f'EXECUTE {name}'
     
-    def _dump_columns(self, columns: List[Column]):
-        
-        new_columns = list(map(lambda column: self._dump_column(column), columns))
+    def execute(self, query: str, vars: ListOrTuple = (), prepare: bool = False) -> cursor:
         
-        return new_columns
-    
-    @staticmethod
-    def _dump_schematic_object(schematic_object: SchematicObject) -> str:
+        db_cursor = self._connection.cursor()
         
-        return f"{f'{schematic_object.sql_schema}.' if schematic_object.sql_schema else ''}{schematic_object.name}"
-    
-    def execute(self, query: str, vars: ListOrTuple = ()) -> cursor:
+        if prepare:
+            query = self._prepared(db_cursor, query, len(vars))
         
-        db_cursor = self._connection.cursor()
-
-        db_cursor.execute(query, vars)
+        with Timings.phase('execute'):
+            db_cursor.execute(query, vars)
             
         return db_cursor
     
-    def fetch(self, query: str, vars: ListOrTuple = ()) -> List[Row]:
+    def fetch(self, query: str, vars: ListOrTuple = (), prepare: bool = False) -> List[Row]:
         
-        cursor = self.execute(query, vars)
+        cursor = self.execute(query, vars, prepare)
         
         try:
             return cursor.fetchall() if cursor.description else []
@@ -109,170 +452,134 @@ class Postgres():
     
     def tables(self, schema: SchemaBody = SchemaBody()) -> List[Row]:
         
-        return self.fetch("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = %s AND table_type = 'BASE TABLE';
-        """, (schema.sql_schema,))
+        return self.fetch(self.TABLES_QUERY, (schema.sql_schema,))
     
     def columns(self, query: ColumnsQuery) -> List[Dict[str, str]]:
         
         all_columns = self.fetch(
-            """
-            SELECT column_name, data_type
-            FROM information_schema.columns
-            WHERE table_schema = %s AND table_name = %s
-            ORDER BY ordinal_position
-            """,
+            self.COLUMNS_QUERY,
             (query.table.sql_schema, query.table.name)
         )
         
-        return [
-            {
-                "name": str(column[0]),
-                "type": str(column[1])
-            }
-            for column in all_columns
-        ]
-        
-    def select(self, query: SelectQuery) -> Data:
-        
-        params = []
-        
-        select_columns: str = '*'
+        return self._dump_table_columns(all_columns)
         
-        if query.columns:
-            select_columns = ', '.join(self._dump_columns(query.columns))
+    def schema(self, schema: SchemaBody = SchemaBody()) -> Dict[str, Any]:
         
-        select_join: str = ''
+        snapshot = self.fetch(self.SCHEMA_QUERY, (schema.sql_schema,))
         
-        if query.join:
-            get_join = lambda join: join.Get()
-            
-            select_join = ' '.join(list(map(get_join, query.join)))
+        return SchemaSnapshot.compact(schema.sql_schema, snapshot[0][0])
         
-        request: str = f"""
-        SELECT {select_columns}
-        FROM {self._dump_schematic_object(query.table)} {query.table.subname or ''}
-        {select_join}
-        """
-        
-        if query.where:
-            request += f' where {self._wheres_to_text(query.where, params)}'
+    def select(self, query: SelectQuery) -> Data:
         
-        if query.order_by:
-            order_methods = ['asc', 'desc']
-            
-            order_columns = ', '.join(self._dump_columns(query.order_by.columns))
-            
-            request += f' order by {order_columns} {order_methods[query.order_by.desc]}'
+        request, params = self._compile_select(query)
         
-        if query.group_by:
-            
-            group_columns = ', '.join(self._dump_columns(query.group_by.columns))
-            
-            request += f' group by {group_columns}'
+        #? Identical selects running at the same time on other threads share this execution
+        return single_flight.run_sync(
+            (self._key, request, json.dumps(params, default=str)),
+            lambda: self._serialize_rows(self.execute(request, params, prepare=True))
+        )
+    
+    def select_rows(self, query: SelectQuery) -> Tuple[List[str], List[Row]]:
         
-        if query.having:
-            request += f' having {self._wheres_to_text(query.having, params)}'
+        #? Plain tuples, without building a dict per row
+        db_cursor = self.execute(*self._compile_select(query), prepare=True)
         
-        if query.offset:
-            jump_rows = f'offset {query.offset.max_row}' if query.offset.max_row else ''
-            
-            request += f' LIMIT {query.offset.min_row} {jump_rows}'
+        with Timings.phase('fetch'):
+            rows = db_cursor.fetchall()
         
-        request.replace('None', 'null')
+        Timings.count_rows(len(rows))
         
-        request += ';'
+        return [column[0] for column in db_cursor.description], rows
+    
+    def stream(self, query: SelectQuery, batch_size: int = settings.stream.batch_size) -> Iterator[Tuple[List[str], List[Row]]]:
         
-        cursor = self.execute(request, params)
+        request, params = self._compile_select(query)
         
-        answer = self._serialize_rows(cursor)
+        #? Named cursors are declared inside a transaction, the pool restores autocommit on release
+        self._connection.autocommit = False
         
-        return answer
+        try:
+            with self._connection.cursor(name=f'pysql_{uuid4().hex}') as db_cursor:
+                
+                db_cursor.itersize = batch_size
+                db_cursor.execute(request, params)
+                
+                rows = db_cursor.fetchmany(batch_size)
+                column_names = [column[0] for column in db_cursor.description]
+                
+                #? The first batch is sent even when empty so encoders can write headers
+                yield column_names, rows
+                
+                while rows := db_cursor.fetchmany(batch_size):
+                    yield column_names, rows
+        finally:
+            self._connection.rollback()
+            self._connection.autocommit = True
     
     def insert(self, query: InsertQuery) -> List[Row]:
         
-        table_columns: str = ''
+        answer = self.fetch(*self._compile_insert(query))
         
-        if query.columns:
-            
-            columns = ', '.join(query.columns)
-            
-            table_columns = f'({columns})'
+        return answer
+    
+    def update(self, query: UpdateQuery) -> List[Row]:
         
-        output_query: str = ''
+        return self.fetch(*self._compile_update(query), prepare=True)
+    
+    def delete(self, query: DeleteQuery) -> List[Row]:
         
-        if query.output:
-            output_columns = ', '.join(self._dump_columns(query.output))
-            
-            output_query = f'RETURNING {output_columns}'
+        return self.fetch(*self._compile_delete(query), prepare=True)
+    
+    def _bulk_apply(self, compile: Callable[[Any, List[Dict[str, Any]]], Tuple[str, List[Any]]], query: KeyedRows) -> int:
         
-        value_query: str = ', '.join(
-            f'({", ".join("%s" for _ in range(len(new_row)))})'
-            for new_row in query.values
-        )
+        affected = 0
         
-        request = f"""
-        INSERT INTO {self._dump_schematic_object(query.table)} {table_columns}
-        VALUES {value_query}
-        {output_query};
-        """
+        #? Every chunk commits together, the pool restores autocommit on release
+        self._connection.autocommit = False
         
-        answer = self.fetch(request, list(chain(*query.values)))
+        try:
+            for rows in query.chunks(settings.bulk.chunk_size):
+                
+                db_cursor = self.execute(*compile(query, rows), prepare=True)
+                affected += db_cursor.rowcount
+                db_cursor.close()
+            
+            self._connection.commit()
+        finally:
+            self._connection.rollback()
+            self._connection.autocommit = True
         
-        return answer
+        return affected
     
-    def update(self, query: UpdateQuery) -> List[Row]:
-        
-        set_text = ', '.join(
-            f"{key} = %s"
-            for key in query.column_values.keys()
-        )
+    def upsert(self, query: UpsertQuery) -> List[Row]:
         
-        return_columns = [column.name for column in query.output]
+        answer: List[Row] = []
         
-        params = [*query.column_values.values(), *return_columns]
+        self._connection.autocommit = False
         
-        joined_conditions = f' WHERE {self._wheres_to_text(query.where, params)}' if query.where else ''
-        
-        return_query = f'RETURNING {", ".join(return_columns)}' if return_columns else ''
-        
-        request = f"""
-        UPDATE {self._dump_schematic_object(query.table)}
-        SET {set_text}
-        {joined_conditions}
-        {return_columns};
-        """
+        try:
+            for rows in query.chunks(max(1, min(settings.bulk.chunk_size, self.MAX_PARAMS // len(query.columns)))):
+                answer.extend(self.fetch(*self._compile_upsert(query, rows)))
+            
+            self._connection.commit()
+        finally:
+            self._connection.rollback()
+            self._connection.autocommit = True
         
-        return self.fetch(request, params)
+        return answer
     
-    def delete(self, query: DeleteQuery) -> List[Row]:
+    def bulk_update(self, query: BulkUpdateQuery) -> int:
         
-        params = []
-        
-        joined_conditions = f" WHERE {self._wheres_to_text(query.conditions, params)}" if query.conditions else ''
+        return self._bulk_apply(self._compile_bulk_update, query)
+    
+    def bulk_delete(self, query: BulkDeleteQuery) -> int:
         
-        return self.fetch(f"DELETE FROM {self._dump_schematic_object(query.table)} {joined_conditions};", params)
+        return self._bulk_apply(self._compile_bulk_delete, query)
     
     def call(self, query: ExecQuery):
         
-        params_values = ', '.join(f'{key} => %s' for key in query.params.keys()) if query.params else ''
-        
-        self.fetch(
-            f"""
-            CALL {self._dump_schematic_object(query.procedure)}({params_values});
-            """,
-            list(query.params.values())
-        )
+        self.fetch(*self._compile_call(query))
     
     def perform(self, query: FuncQuery) -> List[Row]:
         
-        params_values = ', '.join(f'{key} => %s' for key in query.params.keys()) if query.params else ''
-        
-        return self.fetch(
-            f"""
-            PERFORM {self._dump_schematic_object(query.func)}({params_values});
-            """,
-            list(query.params.values())
-        )
\ No newline at end of file
+        return self.fetch(*self._compile_perform(query))
\ No newline at end of file
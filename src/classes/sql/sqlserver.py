@@ -1,29 +1,137 @@
+import json
+from time import perf_counter
+from pyodbc import Connection, Cursor
+from typing import Any, Dict, Iterator, List, Tuple
 from src.classes.sql.common.database import Database
 from src.classes.sql.common.SQLClasses import *
-from src.classes.sql.types import Data
+from src.classes.sql.common.schema_snapshot import SchemaSnapshot
+from src.classes.sql.types import Data, Row
+from src.classes.sql.common.compiler import QueryCompiler, compilers
+from src.types.params import ListOrTuple
+from src.classes.sql.common.slow_query import slow_queries
+from src.classes.metrics import Timings
 
 class SQLServer(Database):
     
+    DRIVER: str = '{ODBC Driver 17 for SQL Server}'
+    
+    compiler: QueryCompiler = compilers['sqlserver']
+    
+    #? Whole schema in one round-trip, returned as a single JSON document
+    SCHEMA_QUERY: str = """
+        SELECT (
+            SELECT
+                t.name AS [name],
+                JSON_QUERY((
+                    SELECT
+                        c.name AS [name],
+                        CASE
+                            WHEN ty.name IN ('varchar', 'char', 'varbinary', 'binary')
+                                THEN ty.name + '(' + IIF(c.max_length = -1, 'max', CAST(c.max_length AS varchar(10))) + ')'
+                            WHEN ty.name IN ('nvarchar', 'nchar')
+                                THEN ty.name + '(' + IIF(c.max_length = -1, 'max', CAST(c.max_length / 2 AS varchar(10))) + ')'
+                            WHEN ty.name IN ('decimal', 'numeric')
+                                THEN ty.name + '(' + CAST(c.precision AS varchar(10)) + ',' + CAST(c.scale AS varchar(10)) + ')'
+                            ELSE ty.name
+                        END AS [type],
+                        c.is_nullable AS [nullable],
+                        dc.definition AS [default]
+                    FROM sys.columns c
+                    JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+                    LEFT JOIN sys.default_constraints dc ON dc.object_id = c.default_object_id
+                    WHERE c.object_id = t.object_id
+                    ORDER BY c.column_id
+                    FOR JSON PATH, INCLUDE_NULL_VALUES
+                )) AS [columns],
+                JSON_QUERY((
+                    SELECT col.name AS [name]
+                    FROM sys.indexes i
+                    JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+                    JOIN sys.columns col ON col.object_id = ic.object_id AND col.column_id = ic.column_id
+                    WHERE i.object_id = t.object_id AND i.is_primary_key = 1
+                    ORDER BY ic.key_ordinal
+                    FOR JSON PATH
+                )) AS [primary_key],
+                JSON_QUERY((
+                    SELECT
+                        i.name AS [name],
+                        i.is_unique AS [unique],
+                        JSON_QUERY((
+                            SELECT col.name AS [name]
+                            FROM sys.index_columns ic
+                            JOIN sys.columns col ON col.object_id = ic.object_id AND col.column_id = ic.column_id
+                            WHERE ic.object_id = i.object_id AND ic.index_id = i.index_id AND ic.is_included_column = 0
+                            ORDER BY ic.key_ordinal
+                            FOR JSON PATH
+                        )) AS [columns]
+                    FROM sys.indexes i
+                    WHERE i.object_id = t.object_id AND i.type > 0
+                    ORDER BY i.name
+                    FOR JSON PATH
+                )) AS [indexes],
+                JSON_QUERY((
+                    SELECT
+                        fk.name AS [name],
+                        JSON_QUERY((
+                            SELECT col.name AS [name]
+                            FROM sys.foreign_key_columns fkc
+                            JOIN sys.columns col ON col.object_id = fkc.parent_object_id AND col.column_id = fkc.parent_column_id
+                            WHERE fkc.constraint_object_id = fk.object_id
+                            ORDER BY fkc.constraint_column_id
+                            FOR JSON PATH
+                        )) AS [columns],
+                        rs.name AS [references.schema],
+                        rt.name AS [references.table],
+                        JSON_QUERY((
+                            SELECT col.name AS [name]
+                            FROM sys.foreign_key_columns fkc
+                            JOIN sys.columns col ON col.object_id = fkc.referenced_object_id AND col.column_id = fkc.referenced_column_id
+                            WHERE fkc.constraint_object_id = fk.object_id
+                            ORDER BY fkc.constraint_column_id
+                            FOR JSON PATH
+                        )) AS [references.columns]
+                    FROM sys.foreign_keys fk
+                    JOIN sys.tables rt ON rt.object_id = fk.referenced_object_id
+                    JOIN sys.schemas rs ON rs.schema_id = rt.schema_id
+                    WHERE fk.parent_object_id = t.object_id
+                    ORDER BY fk.name
+                    FOR JSON PATH
+                )) AS [foreign_keys]
+            FROM sys.tables t
+            JOIN sys.schemas s ON s.schema_id = t.schema_id
+            WHERE s.name = ?
+            ORDER BY t.name
+            FOR JSON PATH, INCLUDE_NULL_VALUES
+        )
+    """
+    
     def __init__(self, config: DbConfig, autocommit: bool = True):
         super().__init__(
             config=config,
-            driver="{ODBC Driver 17 for SQL Server}",
+            driver=self.DRIVER,
             autocommit=autocommit
         )
     
-    def tables(self) -> list[str]:
+    def tables(self, schema: SchemaBody = SchemaBody(sql_schema='dbo')) -> list[str]:
         
         tables = [
             row['TABLE_NAME'] 
             for row in self._serialize_rows(
                 self.execute(
-                    "exec sp_tables @table_owner='dbo'"
+                    "exec sp_tables @table_owner=?",
+                    [schema.sql_schema]
                 )
             )
         ]
 
         return tables
     
+    def schema(self, schema: SchemaBody = SchemaBody(sql_schema='dbo')) -> Dict[str, Any]:
+        
+        snapshot = self.execute(self.SCHEMA_QUERY, [schema.sql_schema]).fetchone()[0]
+        
+        return SchemaSnapshot.compact(schema.sql_schema, json.loads(snapshot) if snapshot else [])
+    
     def columns(self, query: ColumnsQuery) -> list[dict[str, str]]:
         
         cursor = self._connection.cursor()
@@ -59,103 +167,153 @@ class SQLServer(Database):
             for column in all_columns
         ]
     
-    def select(self, query: SelectQuery) -> Data:
+    def _compile_select(self, query: SelectQuery) -> Tuple[str, List[Any]]:
+        return self.compiler.select(query)
+    
+    @staticmethod
+    def _showplan(connection: Connection, request: str, params: List[Any]) -> str:
         
-        params = []
+        cursor = connection.cursor()
         
-        select_columns: str = '*'
+        #? With SHOWPLAN_XML on the statement is compiled but never run
+        try:
+            cursor.execute('set showplan_xml on')
+            
+            try:
+                cursor.execute(request, params)
+                
+                return cursor.fetchone()[0]
+            finally:
+                cursor.execute('set showplan_xml off')
+        finally:
+            cursor.close()
+    
+    def _side_explain(self, request: str, params: List[Any]) -> str:
         
-        if query.columns:
-            select_columns = ', '.join(self._dump_columns(query.columns))
+        connection = self._pool.acquire()
         
-        select_join: str = ''
+        try:
+            return self._showplan(connection, request, params)
+        finally:
+            self._pool.release(connection)
+    
+    def _watch(self, request: str, params: List[Any], rows: int, started: float) -> None:
         
-        if query.join:
-            get_join = lambda join: join.Get()
-            
-            select_join = ' '.join(list(map(get_join, query.join)))
+        duration = perf_counter() - started
         
-        request: str = f"""select {select_columns}
-            from {self._dump_table(query.table)} {query.table.subname or ''}
-            {select_join}
-            """
+        if slow_queries.is_slow(duration):
+            slow_queries.capture_sync(request, params, rows, duration, lambda: self._side_explain(request, params))
+    
+    def explain(self, query: SelectQuery) -> str:
         
-        if query.where:
-            request += f' where {self._wheres_to_text(query.where, params)}'
+        return self._showplan(self._connection, *self._compile_select(query))
+    
+    def select(self, query: SelectQuery) -> Data:
         
-        if query.order_by:
-            order_methods = ['asc', 'desc']
-            
-            order_columns = ', '.join(self._dump_columns(query.order_by.columns))
-            
-            request += f' order by {order_columns} {order_methods[query.order_by.desc]}'
+        request, params = self._compile_select(query)
+        started = perf_counter()
         
-        if query.group_by:
-            group_columns = ', '.join(self._dump_columns(query.group_by.columns))
-            
-            request += f' group by {group_columns}'
+        cursor = self.execute(request, params)
+        
+        answer = self._serialize_rows(cursor)
         
-        if query.having:
-            request += f' having {self._wheres_to_text(query.having, params)}'
+        self._watch(request, params, len(answer), started)
         
-        if query.offset:
-            request += f" offset {query.offset.min_row} rows fetch next {query.offset.max_row} rows only"
+        return answer
+    
+    def select_rows(self, query: SelectQuery) -> Tuple[List[str], List[Row]]:
         
-        request.replace('None', 'null')
+        request, params = self._compile_select(query)
+        started = perf_counter()
         
         cursor = self.execute(request, params)
         
-        answer = self._serialize_rows(cursor)
+        columns = [column[0] for column in cursor.description]
         
-        print(answer)
+        with Timings.phase('fetch'):
+            rows = [tuple(row) for row in cursor.fetchall()]
         
-        return answer
+        Timings.count_rows(len(rows))
+        
+        self._watch(request, params, len(rows), started)
+        
+        return columns, rows
     
-    def insert(self, query: InsertQuery):
+    def stream(self, query: SelectQuery, batch_size: int) -> Iterator[Tuple[List[str], List[Row]]]:
         
-        table_columns = ''
+        cursor = self.execute(*self._compile_select(query))
         
-        if query.columns:
-            columns = ', '.join(query.columns)
-            table_columns = f'({columns})'
+        columns = [column[0] for column in cursor.description]
         
-        query_params = ', '.join('?' for _ in range(len(query.values)))
+        #? The first batch is sent even when empty so encoders can write headers
+        rows = cursor.fetchmany(batch_size)
+        Timings.count_rows(len(rows))
         
-        output_query = ''
+        yield columns, [tuple(row) for row in rows]
         
-        if query.output:
-            output_columns = ', '.join(self._dump_columns(query.output))
-            output_query = f"OUTPUT {output_columns}"
+        #? fetchmany keeps one batch in memory, the driver pulls the rest as they are read
+        while rows := cursor.fetchmany(batch_size):
+            Timings.count_rows(len(rows))
+            yield columns, [tuple(row) for row in rows]
+    
+    def insert(self, query: InsertQuery) -> Cursor:
+        return self.execute(*self.compiler.insert(query))
+    
+    def update(self, query: UpdateQuery) -> Cursor:
         
-        request = f"""insert into {self._dump_table(query.table)} {table_columns}
-        {output_query}
-        values ({query_params})"""
+        request, params = self.compiler.update(query)
+        started = perf_counter()
         
-        print(request)
-        print(query.values)
+        cursor = self.execute(request, params)
+        
+        self._watch(request, params, cursor.rowcount, started)
         
-        return self.execute(request, query.values)
+        return cursor
+    
+    def delete(self, query: DeleteQuery) -> Cursor:
+        return self.execute(*self.compiler.delete(query))
     
-    def update(self, query: UpdateQuery):
+    def _merge(self, table: Table, keys: List[str], columns: List[str], rows: List[ListOrTuple], actions: str) -> Cursor:
         
-        params = list(query.column_values.values())
+        #? Without holdlock two merges of a missing key both take the insert branch and one fails on the duplicate
+        values = ', '.join(f"({', '.join('?' for _ in columns)})" for _ in rows)
         
-        set_text = ', '.join(
-            f"{key} = ?"
-            for key in query.column_values.keys()
+        return self.execute(
+            f"""merge {self._dump_table(table)} with (holdlock) as target
+            using (values {values}) as source ({', '.join(columns)})
+            on {' and '.join(f'target.{key} = source.{key}' for key in keys)}
+            {actions};""",
+            [value for row in rows for value in row]
         )
+    
+    def bulk_update(self, query: BulkUpdateQuery, rows: List[Dict[str, Any]]) -> int:
+        
+        columns = list(rows[0].keys())
+        set_text = ', '.join(f'{column} = source.{column}' for column in query.columns())
         
-        joined_conditions = f' where {self._wheres_to_text(query.where, params)}' if query.where else ''
+        cursor = self._merge(query.table, query.keys, columns, [[row[column] for column in columns] for row in rows], f'when matched then update set {set_text}')
         
-        return self.execute(f"update {query.table.name} set {set_text} {joined_conditions}", params)
+        return cursor.rowcount
     
-    def delete(self, query: DeleteQuery):
+    def bulk_delete(self, query: BulkDeleteQuery, rows: List[Dict[str, Any]]) -> int:
         
-        params = []
+        cursor = self._merge(query.table, query.keys, query.keys, [[row[key] for key in query.keys] for row in rows], 'when matched then delete')
         
-        joined_conditions = f" where {self._wheres_to_text(query.conditions, params)}" if query.conditions else ''
+        return cursor.rowcount
+    
+    def upsert(self, query: UpsertQuery, rows: List[ListOrTuple]) -> Cursor:
+        
+        updated = query.updated()
+        
+        actions = [
+            f"when matched then update set {', '.join(f'{column} = source.{column}' for column in updated)}" if updated else '',
+            f"when not matched then insert ({', '.join(query.columns)}) values ({', '.join(f'source.{column}' for column in query.columns)})"
+        ]
+        
+        if query.output:
+            actions.append(f"output {', '.join(f'inserted.{column.name}' for column in query.output)}")
         
-        return self.execute(f"delete from {query.table.name} {joined_conditions}", params)
+        return self._merge(query.table, query.conflict, query.columns, rows, '\n            '.join(filter(None, actions)))
     
     def procedure(self, query: ExecQuery):
         
@@ -163,8 +321,14 @@ class SQLServer(Database):
             {', '.join(f"@{key} = ?" for key in query.params.keys())}
         '''
         
-        print(to_execute)
-        print(query.params.values())
+        return self.execute(
+            to_execute,
+            list(query.params.values())
+        )
+    
+    def perform(self, query: FuncQuery):
+        
+        to_execute = f'''select {self._dump_table(query.func)}({', '.join('?' for _ in query.params.keys())})'''
         
         return self.execute(
             to_execute,
@@ -1 +1 @@
-from src.functions.dependencies import get_db_params
\ No newline at end of file
+from src.functions.dependencies import get_db_params, get_engine_config, get_postgres_engine, get_response_format, get_bulk_insert_query
\ No newline at end of file
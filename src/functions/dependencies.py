@@ -1,7 +1,8 @@
-from fastapi import Depends, Query
-from typing import Annotated
-from src.classes.sql.common.SQLClasses import DbConfig, EngineConfig
-from src.types.params import EncryptValues
+from fastapi import Depends, HTTPException, Query, Request, status
+from typing import Annotated, List
+from src.classes.sql.common.SQLClasses import DbConfig, EngineConfig, BulkInsertQuery, Table
+from src.types.params import Engine, EncryptValues, Format, BulkFormat
+from src.classes.formats import RowFormats
 
 def get_db_params(
     server: str = Query(..., description='Database Server'),
@@ -9,6 +10,7 @@ def get_db_params(
     uid: str = Query(..., description='User Name'),
     pwd: str = Query(..., description='User Password'),
     encrypt: EncryptValues = Query('require', description='Data encryptation'),
+    statement_timeout: float|None = Query(None, gt=0, description='Seconds a statement may run before it is cancelled'),
 ) -> DbConfig:
     
     return DbConfig(
@@ -16,5 +18,51 @@ def get_db_params(
         database=database,
         uid=uid,
         pwd=pwd,
-        encrypt=encrypt
+        encrypt=encrypt,
+        statement_timeout=statement_timeout
+    )
+
+def get_engine_config(
+    engine: Engine = Query('postgres', description='Database engine'),
+    params: DbConfig = Depends(get_db_params),
+) -> EngineConfig:
+    
+    return EngineConfig(engine=engine, info=params)
+
+def get_postgres_engine(
+    engine: Engine = Query('postgres', description='Database engine, only postgres is available here'),
+) -> Engine:
+    
+    #? Jobs, fan-out and transaction sessions hold postgres connections, another engine must not be silently ignored
+    if engine != 'postgres':
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_CONTENT, f'Not available on {engine}')
+    
+    return engine
+
+def get_response_format(
+    request: Request,
+    response_format: Format|None = Query(None, alias='format', description='Response format, negotiated from Accept when missing'),
+) -> Format:
+    
+    response_format = response_format or RowFormats.negotiate(request.headers.get('accept', ''))
+    
+    if not RowFormats.available(response_format):
+        raise HTTPException(status.HTTP_406_NOT_ACCEPTABLE, f'{response_format} responses need pyarrow installed')
+    
+    return response_format
+
+def get_bulk_insert_query(
+    request: Request,
+    table: str = Query(..., description='Target table'),
+    sql_schema: str = Query('public', description='Target table schema'),
+    columns: List[str] = Query([], description='Target columns, taken from the CSV header or first NDJSON record when empty'),
+    body_format: BulkFormat|None = Query(None, alias='format', description='Body format, negotiated from Content-Type when missing'),
+    header: bool = Query(True, description='CSV body starts with a header line'),
+) -> BulkInsertQuery:
+    
+    return BulkInsertQuery(
+        table=Table(name=table, sql_schema=sql_schema),
+        columns=columns,
+        format=body_format or RowFormats.negotiate_body(request.headers.get('content-type', '')) or 'csv',
+        header=header
     )
\ No newline at end of file
@@ -4,4 +4,12 @@ Engine = Literal['postgres', 'sqlserver']
 
 ListOrTuple = List[Any]|Tuple[Any, ...]
 
-EncryptValues = Literal['disable', 'allow', 'prefer', 'require', 'verify-full']
\ No newline at end of file
+EncryptValues = Literal['disable', 'allow', 'prefer', 'require', 'verify-full']
+
+Format = Literal['json', 'ndjson', 'csv', 'compact', 'columnar', 'arrow']
+
+BulkFormat = Literal['csv', 'ndjson']
+
+Priority = Literal['high', 'normal', 'low']
+
+SpoolFormat = Literal['ndjson', 'csv', 'arrow']
\ No newline at end of file
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from typing import Any, Coroutine, List
+from src.classes.sql.common.SQLClasses import DbConfig
+from src.classes.sql.common.admission import Admission, AdmissionRejectedError, Gate
+from src.classes.sql.common.pool import PoolKey
+from src.classes.settings import AdmissionSettings
+
+def run(work: Coroutine[Any, Any, Any]) -> Any:
+    return asyncio.run(work)
+
+def gate(max_concurrency: int = 1, max_queue: int = 10, queue_timeout: float = 1) -> Gate:
+    return Gate(AdmissionSettings(max_concurrency=max_concurrency, max_queue=max_queue, queue_timeout=queue_timeout))
+
+def test_admits_up_to_the_limit_without_waiting():
+
+    async def scenario() -> None:
+
+        limited = gate(max_concurrency=2)
+
+        assert await limited.acquire('normal') == 0
+        assert await limited.acquire('normal') == 0
+        assert limited.stats()['active'] == 2
+
+    run(scenario())
+
+def test_release_hands_the_slot_to_the_most_urgent_waiter():
+
+    async def scenario() -> List[str]:
+
+        limited = gate()
+        order: List[str] = []
+
+        await limited.acquire('normal')
+
+        async def wait(name: str, priority: str) -> None:
+
+            await limited.acquire(priority)
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait('low', 'low')), asyncio.create_task(wait('high', 'high'))]
+
+        await asyncio.sleep(0)
+
+        limited.release()
+        await asyncio.sleep(0)
+        limited.release()
+
+        await asyncio.gather(*waiters)
+
+        assert limited.stats()['active'] == 1
+
+        return order
+
+    assert run(scenario()) == ['high', 'low']
+
+def test_sheds_with_429_when_the_queue_is_full():
+
+    async def scenario() -> None:
+
+        limited = gate(max_queue=1)
+
+        await limited.acquire('normal')
+        waiter = asyncio.create_task(limited.acquire('normal'))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            await limited.acquire('normal')
+
+        assert rejected.value.status == 429
+        assert limited.stats()['rejected'] == 1
+
+        waiter.cancel()
+
+    run(scenario())
+
+def test_sheds_with_503_when_the_wait_times_out():
+
+    async def scenario() -> None:
+
+        limited = gate(queue_timeout=0.01)
+
+        await limited.acquire('normal')
+
+        with pytest.raises(AdmissionRejectedError) as rejected:
+            await limited.acquire('normal')
+
+        assert rejected.value.status == 503
+        assert limited.stats()['timeouts'] == 1
+        assert limited.stats()['queued'] == 0
+
+        #? The expired waiter must not swallow the slot
+        limited.release()
+        assert limited.stats()['active'] == 0
+
+    run(scenario())
+
+def test_admit_releases_the_slot_on_errors():
+
+    async def scenario() -> None:
+
+        admission = Admission(AdmissionSettings(max_concurrency=1))
+        key = PoolKey.from_config('postgres', DbConfig(server='db1', database='app', uid='reader', pwd='secret', encrypt='disable'))
+
+        with pytest.raises(RuntimeError):
+
+            async with admission.admit(key):
+                raise RuntimeError('statement failed')
+
+        assert admission.stats()[0]['active'] == 0
+
+    run(scenario())
+
+def test_disabled_admission_never_queues():
+
+    async def scenario() -> None:
+
+        admission = Admission(AdmissionSettings(max_concurrency=0))
+        key = PoolKey.from_config('postgres', DbConfig(server='db1', database='app', uid='reader', pwd='secret', encrypt='disable'))
+
+        async with admission.admit(key):
+
+            async with admission.admit(key):
+                assert admission.stats() == []
+
+    run(scenario())
@@ -0,0 +1,119 @@
+from typing import Any, Dict
+from src.classes.sql.common.SQLClasses import DeleteQuery, InsertQuery, SelectQuery, UpdateQuery
+from src.classes.sql.common.compiler import compilers
+from src.classes.sql.common.keyset import Keyset
+from src.classes.sql.common.query_cache import query_cache
+
+postgres = compilers['postgres']
+sqlserver = compilers['sqlserver']
+
+def where(column: str, value: Any, comparation: str = '=', joiner: str = '') -> Dict[str, Any]:
+    return { "to_column": { "name": column }, "comparation": comparation, "value": value, "joiner": joiner }
+
+def select(**body: Any) -> SelectQuery:
+    return SelectQuery.model_validate({ "table": { "name": "orders" }, **body })
+
+PAGE = select(
+    columns=[{ "name": "id" }, { "name": "total", "rename": "amount" }],
+    where=[where('status', 'open', joiner='and'), where('total', 10, '>')],
+    order_by={ "columns": [{ "name": "id" }], "desc": True },
+    offset={ "min_row": 20, "max_row": 10 }
+)
+
+SEEK = select(
+    columns=[{ "name": "created" }, { "name": "id" }],
+    seek={ "columns": [{ "name": "created" }, { "name": "id" }], "size": 50, "after": Keyset.encode(['2024-01-01', 7]) }
+)
+
+#region Select
+
+def test_postgres_select_page():
+
+    assert postgres.select(PAGE) == (
+        'SELECT id, total as amount\nFROM public.orders\nWHERE (status = %s and total > %s)\nORDER BY id DESC\nLIMIT %s OFFSET %s',
+        ['open', 10, 10, 20]
+    )
+
+def test_sqlserver_select_page():
+
+    assert sqlserver.select(PAGE) == (
+        'SELECT id, total as amount\nFROM public.orders\nWHERE (status = ? and total > ?)\nORDER BY id DESC\noffset ? rows fetch next ? rows only',
+        ['open', 10, 20, 10]
+    )
+
+def test_offset_without_limit():
+
+    query = select(offset={ "min_row": 5 })
+
+    assert postgres.select(query) == ('SELECT *\nFROM public.orders\nOFFSET %s', [5])
+    assert sqlserver.select(query) == ('SELECT *\nFROM public.orders\norder by (select null) offset ? rows', [5])
+
+def test_postgres_seek_compares_rows():
+
+    assert postgres.select(SEEK) == (
+        'SELECT created, id\nFROM public.orders\nWHERE (created, id) > (%s, %s)\nORDER BY created ASC, id ASC\nLIMIT %s',
+        ['2024-01-01', 7, 50]
+    )
+
+def test_sqlserver_seek_expands_comparison():
+
+    assert sqlserver.select(SEEK) == (
+        'SELECT created, id\nFROM public.orders\nWHERE ((created > ?) or (created = ? and id > ?))\nORDER BY created ASC, id ASC\noffset 0 rows fetch next ? rows only',
+        ['2024-01-01', '2024-01-01', 7, 50]
+    )
+
+def test_first_seek_page_has_no_key_filter():
+
+    query = select(seek={ "columns": [{ "name": "id" }], "size": 10 })
+
+    assert postgres.select(query) == ('SELECT *\nFROM public.orders\nORDER BY id ASC\nLIMIT %s', [10])
+
+def test_select_text_is_cached_by_shape():
+
+    query = select(columns=[{ "name": "cached" }], where=[where('id', 1)])
+    before = query_cache.stats()
+
+    postgres.select(query)
+    request, params = postgres.select(select(columns=[{ "name": "cached" }], where=[where('id', 2)]))
+
+    after = query_cache.stats()
+
+    assert (after['misses'] - before['misses'], after['hits'] - before['hits']) == (1, 1)
+    assert (request, params) == ('SELECT cached\nFROM public.orders\nWHERE (id = %s)', [2])
+
+#region Writes
+
+INSERT = InsertQuery.model_validate({
+    "table": { "name": "orders" },
+    "columns": ["a", "b"],
+    "values": [[1, 2], [3, 4]],
+    "output": [{ "name": "id" }]
+})
+
+def test_insert_returns_output():
+
+    assert postgres.insert(INSERT) == ('INSERT INTO public.orders (a, b)\nVALUES (%s, %s), (%s, %s)\nRETURNING id', [1, 2, 3, 4])
+    assert sqlserver.insert(INSERT) == ('INSERT INTO public.orders (a, b)\noutput inserted.id\nVALUES (?, ?), (?, ?)', [1, 2, 3, 4])
+
+def test_insert_text_is_reused_across_values():
+
+    other = INSERT.model_copy(update={ "values": [[5, 6], [7, 8]] })
+
+    request, params = postgres.insert(other)
+
+    assert request == postgres.insert(INSERT)[0]
+    assert params == [5, 6, 7, 8]
+
+def test_update():
+
+    query = UpdateQuery.model_validate({ "table": { "name": "orders" }, "column_values": { "a": 1 }, "where": [where('id', 3)] })
+
+    assert postgres.update(query) == ('UPDATE public.orders\nSET a = %s\nWHERE id = %s', [1, 3])
+    assert sqlserver.update(query) == ('UPDATE public.orders\nSET a = ?\nWHERE id = ?', [1, 3])
+
+def test_delete():
+
+    query = DeleteQuery.model_validate({ "table": { "name": "orders", "sql_schema": "" }, "conditions": [where('id', 3)] })
+
+    assert postgres.delete(query) == ('DELETE FROM orders\nWHERE id = %s', [3])
+    assert sqlserver.delete(query) == ('DELETE FROM orders\nWHERE id = ?', [3])
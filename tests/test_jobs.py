@@ -0,0 +1,36 @@
+import asyncio
+import os
+import pytest
+from typing import Any, AsyncIterator, List
+from src.classes.sql.common.jobs import Jobs
+from src.classes.settings import JobSettings
+
+pyarrow = pytest.importorskip('pyarrow')
+
+class SpooledJob():
+
+    rows: int = 0
+    bytes: int = 0
+    format: str = 'arrow'
+
+async def batches(*pages: List[tuple]) -> AsyncIterator[Any]:
+
+    for rows in pages:
+        yield ['id', 'note', 'score'], rows
+
+def test_arrow_spool_widens_columns_that_started_null(tmp_path):
+
+    path = os.path.join(tmp_path, 'job.arrow')
+    job = SpooledJob()
+
+    pages = [[(1, None, 1), (2, None, 2)], [(3, 'x', 2.5), (4, None, None)], [(5, None, None)]]
+
+    asyncio.run(Jobs(JobSettings(path=str(tmp_path)))._spool_arrow(job, batches(*pages), path))
+
+    with pyarrow.ipc.open_stream(path) as reader:
+        table = reader.read_all()
+
+    assert [(field.name, str(field.type)) for field in table.schema] == [('id', 'int64'), ('note', 'string'), ('score', 'double')]
+    assert table.column('note').to_pylist() == [None, None, 'x', None, None]
+    assert os.listdir(tmp_path) == ['job.arrow']
+    assert job.bytes == os.path.getsize(path)
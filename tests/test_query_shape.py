@@ -0,0 +1,131 @@
+import pytest
+from typing import Any, Dict
+from src.classes.sql.common.SQLClasses import DbConfig, InsertQuery, SelectQuery
+from src.classes.sql.common.keyset import Keyset
+from src.classes.sql.common.query_cache import QueryCache, QueryShape
+from src.classes.sql.common.result_cache import ResultCache
+
+CONFIG = DbConfig(server='db1', database='app', uid='reader', pwd='secret', encrypt='disable')
+
+def select(**changes: Any) -> SelectQuery:
+
+    body: Dict[str, Any] = {
+        "table": { "name": "orders", "subname": "o" },
+        "join": [{
+            "table": { "name": "customers", "subname": "c" },
+            "on": { "table_column": { "name": "id" }, "other_table": { "name": "o" }, "other_table_column": { "name": "customer_id" } }
+        }],
+        "columns": [{ "name": "o.id" }, { "name": "c.name", "rename": "customer" }],
+        "where": [{ "to_column": { "name": "o.status" }, "value": "open" }],
+        "order_by": { "columns": [{ "name": "o.id" }] },
+        "offset": { "min_row": 0, "max_row": 10 }
+    }
+
+    return SelectQuery.model_validate({ **body, **changes })
+
+#region Shapes
+
+def test_select_shape_ignores_values():
+
+    other = select(where=[{ "to_column": { "name": "o.status" }, "value": "closed" }], offset={ "min_row": 40, "max_row": 20 })
+
+    assert QueryShape.select(select()) == QueryShape.select(other)
+
+@pytest.mark.parametrize('changes', [
+    { "columns": [{ "name": "o.id" }] },
+    { "columns": [{ "name": "o.id" }, { "name": "c.name", "rename": "name" }] },
+    { "where": [{ "to_column": { "name": "o.status" }, "value": "open", "comparation": "<>" }] },
+    { "order_by": { "columns": [{ "name": "o.id" }], "desc": True } },
+    { "offset": { "min_row": 0 } },
+    { "offset": None },
+    { "seek": { "columns": [{ "name": "o.id" }], "size": 10 } },
+    { "join": [] }
+])
+def test_select_shape_follows_structure(changes: Dict[str, Any]):
+    assert QueryShape.select(select()) != QueryShape.select(select(**changes))
+
+def test_seek_shape_tells_first_page_apart():
+
+    first = select(seek={ "columns": [{ "name": "o.id" }], "size": 10 })
+    following = select(seek={ "columns": [{ "name": "o.id" }], "size": 10, "after": Keyset.encode([10]) })
+
+    assert QueryShape.select(first) != QueryShape.select(following)
+
+def insert(values: list) -> InsertQuery:
+    return InsertQuery.model_validate({ "table": { "name": "orders" }, "columns": ["a", "b"], "values": values })
+
+def test_insert_shape_keys_on_row_count_and_width():
+
+    assert QueryShape.insert(insert([[1, 2], [3, 4]])) == QueryShape.insert(insert([[5, 6], [7, 8]]))
+    assert QueryShape.insert(insert([[1, 2], [3, 4]]))[-2:] == (2, 2)
+    assert QueryShape.insert(insert([[1, 2]])) != QueryShape.insert(insert([[1, 2], [3, 4]]))
+
+def test_query_cache_evicts_least_recently_used():
+
+    cache = QueryCache(2)
+
+    cache.get('a', lambda: 'A')
+    cache.get('b', lambda: 'B')
+    cache.get('a', lambda: 'unused')
+    cache.get('c', lambda: 'C')
+
+    assert cache.get('a', lambda: 'rebuilt') == 'A'
+    assert cache.get('b', lambda: 'rebuilt') == 'rebuilt'
+    assert cache.stats()['evictions'] == 2
+
+#region Result keys
+
+def test_result_key_is_stable():
+    assert ResultCache.key(CONFIG, select()) == ResultCache.key(CONFIG, select())
+
+@pytest.mark.parametrize('other', [
+    lambda: ResultCache.key(CONFIG, select(offset={ "min_row": 10, "max_row": 10 })),
+    lambda: ResultCache.key(CONFIG, select(), 'compact'),
+    lambda: ResultCache.key(CONFIG, select(), engine='sqlserver'),
+    lambda: ResultCache.key(CONFIG.model_copy(update={ "pwd": "other" }), select()),
+    lambda: ResultCache.key(CONFIG.model_copy(update={ "database": "other" }), select())
+])
+def test_result_key_separates_answers(other):
+    assert ResultCache.key(CONFIG, select()) != other()
+
+def test_result_key_uses_compiled_parameters():
+
+    #? SQL Server sends the offset before the row count, Postgres the other way round
+    assert ResultCache.key(CONFIG, select()).params == '["open", 10, 0]'
+    assert ResultCache.key(CONFIG, select(), engine='sqlserver').params == '["open", 0, 10]'
+
+def test_tables_of_includes_joins():
+    assert ResultCache.tables_of(select()) == frozenset({ 'public.orders', 'public.customers' })
+
+#region Keyset tokens
+
+def test_keyset_token_round_trip():
+    assert Keyset.decode(Keyset.encode(['2024-01-01', 7])) == ['2024-01-01', 7]
+
+@pytest.mark.parametrize('token', ['not base64!', Keyset.encode({ "a": 1 })])
+def test_keyset_rejects_invalid_tokens(token: str):
+
+    with pytest.raises(ValueError):
+        Keyset.decode(token)
+
+def test_next_token_stops_on_short_page():
+
+    rows = [{ "id": 1 }, { "id": 2 }]
+
+    assert Keyset.next_token(['id'], 2, rows) == Keyset.encode([2])
+    assert Keyset.next_token(['id'], 3, rows) is None
+
+def test_seek_needs_a_key_column():
+
+    with pytest.raises(ValueError):
+        select(seek={ "columns": [], "size": 10 })
+
+@pytest.mark.parametrize('columns', [[{ "name": "o.created" }], [{ "name": "o.id", "rename": "order_id" }]])
+def test_seek_keys_must_be_selected(columns: list):
+
+    with pytest.raises(ValueError):
+        select(columns=columns, seek={ "columns": [{ "name": "o.id" }], "size": 10 })
+
+@pytest.mark.parametrize('columns', [[], [{ "name": "o.*" }], [{ "name": "o.id" }, { "name": "total" }]])
+def test_seek_keys_selected_or_implied(columns: list):
+    assert select(columns=columns, seek={ "columns": [{ "name": "o.id" }], "size": 10 }).seek is not None
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier, Event
+from time import sleep
+from typing import Any, List
+from src.classes.sql.common.single_flight import SingleFlight
+
+#region Sync
+
+def test_run_sync_coalesces_concurrent_callers():
+
+    flight = SingleFlight()
+    started = Event()
+    release = Event()
+    calls: List[int] = []
+
+    def work() -> str:
+
+        calls.append(1)
+        started.set()
+        release.wait(5)
+
+        return 'rows'
+
+    with ThreadPoolExecutor(3) as threads:
+
+        leader = threads.submit(flight.run_sync, 'key', work)
+        started.wait(5)
+
+        followers = [threads.submit(flight.run_sync, 'key', work) for _ in range(2)]
+
+        #? Followers only count once they joined the flight
+        while flight.stats()['coalesced'] < 2:
+            sleep(0.001)
+
+        release.set()
+
+        assert [future.result(5) for future in (leader, *followers)] == ['rows'] * 3
+
+    assert calls == [1]
+    assert flight.stats() == { "in_flight": 0, "leaders": 1, "coalesced": 2 }
+
+def test_run_sync_shares_the_error():
+
+    flight = SingleFlight()
+    barrier = Barrier(2)
+
+    def fail() -> Any:
+        raise RuntimeError('statement failed')
+
+    def call() -> Any:
+
+        barrier.wait(5)
+
+        return flight.run_sync('key', fail)
+
+    with ThreadPoolExecutor(2) as threads:
+
+        futures = [threads.submit(call) for _ in range(2)]
+
+        for future in futures:
+
+            with pytest.raises(RuntimeError):
+                future.result(5)
+
+    assert flight.stats()['in_flight'] == 0
+
+def test_run_sync_runs_again_after_the_flight_lands():
+
+    flight = SingleFlight()
+
+    assert flight.run_sync('key', lambda: 1) == 1
+    assert flight.run_sync('key', lambda: 2) == 2
+    assert flight.stats()['leaders'] == 2
+
+#region Async
+
+def test_run_coalesces_concurrent_callers():
+
+    async def scenario() -> List[str]:
+
+        flight = SingleFlight()
+        calls: List[int] = []
+
+        async def work() -> str:
+
+            calls.append(1)
+            await asyncio.sleep(0.01)
+
+            return 'rows'
+
+        answers = await asyncio.gather(*(flight.run('key', work) for _ in range(3)))
+
+        assert calls == [1]
+        assert flight.stats() == { "in_flight": 0, "leaders": 1, "coalesced": 2 }
+
+        return answers
+
+    assert asyncio.run(scenario()) == ['rows'] * 3